@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import os
+import time
+import numpy as np
+from auv_core.analytics import AXES, analyze, by_move, run_from_mission_log, run_from_telemetry
+from auv_core.telemetry import load_telemetry
+
+# Columns of the reports, the axis metrics with their format
+METRICS = [
+    ('rise', 'rise s', '{:.2f}'),
+    ('overshoot', 'overshoot', '{:.0%}'),
+    ('settling', 'settling s', '{:.2f}'),
+    ('steady_state_error', 'sse', '{:+.3f}'),
+    ('rms', 'rms', '{:.3f}'),
+    ('oscillation', 'osc Hz', '{:.2f}'),
+    ('amplitude', 'osc amp', '{:.3f}'),
+]
+
+def load_run(path):
+    # Run directory of node_recorder or .npz log of simulate_mission.py
+    if os.path.isdir(path):
+        return run_from_telemetry(load_telemetry(path))
+    with np.load(path) as log:
+        return run_from_mission_log({key: log[key] for key in log.files})
+
+def cell(value, form, width=11):
+    text = '-' if value is None or (isinstance(value, float) and math.isnan(value)) else form.format(value)
+    return f'{text:>{width}s}'
+
+def print_run(label, segments):
+    print(f'\n{label}')
+    print(f'  {"start s":>8s} {"move":10s} {"dur s":>6s} {"sat":>6s} {"duty":>6s} {"std":>6s} {"peak":>6s}  {"axis":6s}' + ''.join(f'{title:>11s}' for _, title, _ in METRICS))
+    for segment in segments:
+        head = f'  {segment["start"]:8.1f} {segment["move"]:10s} {segment["duration"]:6.1f} {cell(segment["saturation"], "{:.1%}", 6)} {cell(segment["duty"], "{:.0%}", 6)} {cell(segment["duty_std"], "{:.0%}", 6)} {cell(segment["duty_peak"], "{:.0%}", 6)}'
+        for i, axis in enumerate(AXES):
+            metrics = segment['axes'][axis]
+            print((head if i == 0 else ' ' * len(head)) + f'  {axis:6s}' + ''.join(cell(metrics[key], form) for key, _, form in METRICS))
+
+def print_comparison(labels, summaries, moves):
+    # One column per run, rows where no run has a value are left out
+    width = max(11, max(len(label) for label in labels) + 2)
+    print(f'\n{"":24s}' + ''.join(f'{label:>{width}s}' for label in labels))
+    for move in moves:
+        pooled = [summary.get(move) for summary in summaries]
+        durations = ''.join(cell(entry['duration'] if entry else None, '{:.0f} s', width) for entry in pooled)
+        print(f'{move:24s}' + durations)
+        rows = [('saturation', lambda entry: entry['saturation'], '{:.1%}'), ('duty', lambda entry: entry['duty'], '{:.0%}')]
+        for axis in AXES:
+            for key, title, form in METRICS:
+                rows.append((f'{axis} {title}', lambda entry, axis=axis, key=key: entry['axes'][axis][key], form))
+        for title, value, form in rows:
+            values = [value(entry) if entry else None for entry in pooled]
+            if all(v is None or math.isnan(v) for v in values):
+                continue
+            print(f'  {title:22s}' + ''.join(cell(v, form, width) for v in values))
+
+def main():
+    parser = argparse.ArgumentParser(description='Step response, oscillation and thruster saturation of every move segment of recorded runs')
+    parser.add_argument('runs', nargs='+', help='run directories of node_recorder or .npz logs of simulate_mission.py')
+    parser.add_argument('-l', '--labels', nargs='*', help='names of the runs in the comparison, e.g. the gain sets')
+    parser.add_argument('--moves', nargs='*', help='only report these moves, e.g. forward camera yaw_left')
+    parser.add_argument('--pwm-min', type=float, default=1000, help='PWM taken as saturated at or below')
+    parser.add_argument('--pwm-max', type=float, default=2000, help='PWM taken as saturated at or above')
+    parser.add_argument('--min-step', nargs='*', default=[], metavar='AXIS=VALUE', help='smallest set point change taken as a step, e.g. depth=0.2 yaw=10')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the comparison of the moves')
+    parser.add_argument('-o', '--output', help='save the report of every segment and move to this .json file')
+    args = parser.parse_args()
+
+    labels = args.labels or [os.path.basename(os.path.normpath(path)) for path in args.runs]
+    if len(labels) != len(args.runs):
+        parser.error('give one label per run')
+    min_step = {axis: float(value) for axis, value in (item.split('=') for item in args.min_step)}
+
+    start = time.perf_counter()
+    reports = []
+    for path in args.runs:
+        segments = analyze(load_run(path), args.pwm_min, args.pwm_max, min_step)
+        if args.moves:
+            segments = [segment for segment in segments if segment['move'] in args.moves]
+        reports.append({'segments': segments, 'moves': by_move(segments)})
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        for label, report in zip(labels, reports):
+            print_run(label, report['segments'])
+
+    # Moves in the order they first appear
+    moves = list(dict.fromkeys(move for report in reports for move in report['moves']))
+    print_comparison(labels, [report['moves'] for report in reports], moves)
+    print(f'\n{len(args.runs)} runs analyzed in {elapsed:.2f} s')
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({label: report for label, report in zip(labels, reports)}, file, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+# ROS-free core of the control, navigation and guidance nodes, the nodes only
+# convert messages and publish the outputs
+from .clock import ManualClock, monotonic_clock
+from .control import CONTROL_DEFAULTS, ControlCore, ControlOutputs
+from .navigation import NavigationCore
+from .guidance import GuidanceCore, GuidanceOutputs
+from .simulator import Simulator
+from .mission import SimulatedMission
@@ -0,0 +1,205 @@
+import itertools
+import numpy as np
+
+# Pseudo-inverses are computed once per geometry and shared between every allocator
+_pinv_cache = {}
+
+def cached_pinv(key, matrix):
+    inverse = _pinv_cache.get(key)
+    if inverse is None:
+        inverse = np.linalg.pinv(matrix)
+        inverse.setflags(write=False)
+        _pinv_cache[key] = inverse
+    return inverse
+
+class AllocationEngine():
+    def __init__(self, key, matrix):
+        self.key = key
+        self.matrix = np.array(matrix, dtype=float)
+        self.pinv = cached_pinv(key, self.matrix)
+
+        # Preallocated buffers, the returned thrust array is reused on the next solve
+        self.wrench = np.zeros(self.matrix.shape[0])
+        self.thrust = np.zeros(self.matrix.shape[1])
+        self.residual = np.zeros(self.matrix.shape[0])
+        self.clipped = np.zeros(self.matrix.shape[1])
+        self.fixed = np.zeros(self.matrix.shape[1])
+
+        # Thrusters are addressed by bit masks, bit i is column i
+        self.bits = 1 << np.arange(self.matrix.shape[1])
+        self.full_mask = (1 << self.matrix.shape[1]) - 1
+
+        # Inverse used for the thrusters that are currently enabled
+        self.enabled = self.full_mask
+        self.active = self.pinv
+
+    def columns(self, mask):
+        return (mask & self.bits) != 0
+
+    def inverse(self, mask):
+        # Pseudo-inverse using only the thrusters in the mask, the others get zero thrust
+        if mask == self.full_mask:
+            return self.pinv
+        return cached_pinv(self.key + (mask,), self.matrix * self.columns(mask))
+
+    def precompute(self, max_failures):
+        # Cache the inverse of every mask with up to max_failures thrusters removed
+        for count in range(1, max_failures + 1):
+            for failed in itertools.combinations(range(self.matrix.shape[1]), count):
+                self.inverse(self.full_mask & ~int(np.sum(self.bits[list(failed)])))
+
+    def set_enabled(self, mask):
+        # Disabled thrusters get zero thrust, the others take over their share of the wrench
+        self.enabled = mask & self.full_mask
+        self.active = self.inverse(self.enabled)
+
+    def solve(self, wrench, mask=None):
+        # A mask leaves out more thrusters than the disabled ones for this solve only
+        self.wrench[:] = wrench
+        np.dot(self.active if mask is None else self.inverse(mask & self.enabled), self.wrench, out=self.thrust)
+        return self.thrust
+
+    def solve_bounded(self, wrench, lower, upper, mask=None):
+        # Fix saturated thrusters at their limit and give the remaining wrench to the others.
+        # Every set of saturated thrusters has its own cached inverse.
+        self.wrench[:] = wrench
+        self.fixed[:] = 0
+        free = self.enabled if mask is None else mask & self.enabled
+        np.dot(self.inverse(free), self.wrench, out=self.thrust)
+
+        for _ in range(self.matrix.shape[1]):
+            np.clip(self.thrust, lower, upper, out=self.clipped)
+            saturated = int(np.dot(self.clipped != self.thrust, self.bits)) & free
+            if not saturated:
+                break
+
+            free &= ~saturated
+            self.fixed[self.columns(saturated)] = self.clipped[self.columns(saturated)]
+            if not free:
+                self.thrust[:] = self.fixed
+                break
+
+            np.dot(self.matrix, self.fixed, out=self.residual)
+            np.subtract(self.wrench, self.residual, out=self.residual)
+            np.dot(self.inverse(free), self.residual, out=self.thrust)
+            self.thrust += self.fixed
+
+        return np.clip(self.thrust, lower, upper, out=self.thrust)
+
+class DPRController(AllocationEngine): # Depth Pitch Roll
+    def __init__(self, Lx, Ly):
+        self.Lx = Lx
+        self.Ly = Ly
+
+        # Control matrix A
+        A = np.array([
+            [ Ly, -Ly,  Ly, -Ly],  # Roll contributions
+            [ Lx,  Lx, -Lx, -Lx],  # Pitch contributions
+            [  1,   1,   1,   1]   # Depth contributions
+        ])
+
+        super().__init__(('dpr', Lx, Ly), A)
+        self.A = self.matrix
+
+    def control(self, control_depth, control_pitch, control_roll):
+        self.wrench[0] = control_depth
+        self.wrench[1] = control_pitch
+        self.wrench[2] = control_roll
+        np.dot(self.active, self.wrench, out=self.thrust)
+        return self.thrust
+
+class SSYController(AllocationEngine): # Surge Sway Yaw
+    def __init__(self, d):
+        self.d = d
+        self.sqrt2 = np.sqrt(2)
+
+        M = np.array([
+            [-1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, -1/self.sqrt2],
+            [1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2],
+            [d/2, -d/2, -d/2, d/2],
+            [1, -1, 1, -1]  # Kontribusi untuk momen yaw
+        ])
+
+        super().__init__(('ssy', d), M)
+        self.M = self.matrix
+
+    def control(self, Fx, Fy, tau):
+        # Vektor gaya yang diinginkan, tau dimasukkan ke koordinat keempat
+        self.wrench[0] = Fx
+        self.wrench[1] = Fy
+        self.wrench[2] = 0
+        self.wrench[3] = tau
+        np.dot(self.active, self.wrench, out=self.thrust)
+        return self.thrust
+
+# Thrusters 1-4 are driven from SSYController columns [1, 0, 3, 2] and thrusters 9, 10
+# mirror thrusters 1, 2. Thrusters 5-8 are driven from DPRController columns [2, 1, 0, 3].
+HORIZONTAL = np.array([0, 1, 2, 3, 8, 9])
+SSY_COLUMNS = np.array([1, 0, 3, 2, 1, 0])
+VERTICAL = np.array([4, 5, 6, 7])
+DPR_COLUMNS = np.array([2, 1, 0, 3])
+# Pre calibration offsets of thrusters 5-8 are taken from DPRController columns in order
+DPR_OFFSET_COLUMNS = np.array([0, 1, 2, 3])
+
+# PWM = 1500 + PWM_SIGN * (PWM_SCALE * thrust - offset)
+PWM_SIGN = np.array([-1, -1, -1, -1, 1, -1, 1, -1, -1, -1], dtype=float)
+PWM_SCALE = np.array([500, 500, 500, 500, 1, 1, 1, 1, 500, 500], dtype=float)
+
+class ThrusterAllocator(AllocationEngine): # All ten thrusters
+    def __init__(self, Lx, Ly, d):
+        A = DPRController(Lx, Ly).A
+        M = SSYController(d).M
+
+        # Wrench (Fx, Fy, Fz, Mx, My, Mz) in the units the split controllers take.
+        # DPRController rows are fed (depth, pitch, roll), so they land on (Fz, My, Mx).
+        # The third SSYController row is the sway row scaled, it is not a separate axis.
+        B = np.zeros((6, 10))
+        B[np.ix_([0, 1, 5], HORIZONTAL)] = M[np.ix_([0, 1, 3], SSY_COLUMNS)]
+        B[np.ix_([2, 4, 3], VERTICAL)] = A[:, DPR_COLUMNS]
+
+        super().__init__(('thruster', Lx, Ly, d), B)
+
+    def allocate(self, wrench, mask=None):
+        # Thrust per thruster 1-10 in the same units as the split controller outputs. Unlike
+        # the split controllers, where thrusters 9 and 10 repeat the thrust of 1 and 2, the
+        # wrench is met as asked, e.g. forward gives 2/3 of the split surge.
+        return self.solve(wrench, mask)
+
+# Thrusters 9 and 10, idled in the sway and yaw moves
+MIRRORED_MASK = 0b1100000000
+
+# Thrusters 1-10 that drive each SSYController and DPRController column
+SSY_THRUSTERS = HORIZONTAL[SSY_COLUMNS[:4]]
+DPR_THRUSTERS = VERTICAL[DPR_COLUMNS]
+
+def thruster_mask(thrusters, mask):
+    # Column bit mask of an allocator driving the given thrusters, from a mask of thrusters 1-10
+    return int(np.dot((mask >> thrusters) & 1, 1 << np.arange(len(thrusters))))
+
+def split_to_thrusters(thrust_surge_sway_yaw, thrust_depth_pitch_roll, out, dpr_columns=DPR_COLUMNS):
+    out[HORIZONTAL] = np.take(thrust_surge_sway_yaw, SSY_COLUMNS)
+    out[VERTICAL] = np.take(thrust_depth_pitch_roll, dpr_columns)
+    return out
+
+def thrust_to_pwm(thrust, offset, pwm_min, pwm_max, out, calibration=None, gain=1.0):
+    np.multiply(PWM_SCALE, thrust, out=out)
+    out -= offset
+    out *= PWM_SIGN
+    out *= gain
+    out += 1500
+    # Measured thrust curves turn the linear PWM into the PWM that gives that share of thrust
+    if calibration is not None:
+        calibration.linearize(out, out)
+    return np.clip(out, pwm_min, pwm_max, out=out)
+
+def thrust_bounds(offset, pwm_min, pwm_max, lower, upper, calibration=None, gain=1.0):
+    # Thrust range of each thruster that keeps its PWM inside [pwm_min, pwm_max], through
+    # the same gain and thrust curves as thrust_to_pwm
+    if calibration is not None:
+        pwm_min = calibration.delinearize(pwm_min)
+        pwm_max = calibration.delinearize(pwm_max)
+    low = (offset + PWM_SIGN * (pwm_min - 1500) / gain) / PWM_SCALE
+    high = (offset + PWM_SIGN * (pwm_max - 1500) / gain) / PWM_SCALE
+    np.minimum(low, high, out=lower)
+    np.maximum(low, high, out=upper)
+    return lower, upper
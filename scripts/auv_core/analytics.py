@@ -0,0 +1,290 @@
+from types import SimpleNamespace
+import numpy as np
+from .tuning import SETTLING_BAND
+
+# Axes of the sensor, set_point and error topics of node_navigation and node_control
+AXES = ['depth', 'roll', 'pitch', 'yaw']
+
+# Smallest set point change taken as a step, m and degrees
+MIN_STEP = {'depth': 0.1, 'roll': 2.0, 'pitch': 2.0, 'yaw': 5.0}
+
+# Fractions of the step between which the rise time is taken
+RISE = (0.1, 0.9)
+
+# Last fraction of a step or hold that gives the steady state error
+TAIL = 0.1
+
+# Shortest segment the oscillation frequency is taken of, s
+MIN_OSCILLATION = 4.0
+
+def hold(times, values, at, fill):
+    # Latest of the samples at every time of at, fill before the first sample
+    index = np.searchsorted(times, at, side='right') - 1
+    held = np.asarray(values)[np.maximum(index, 0)]
+    held = np.where((index >= 0).reshape((-1,) + (1,) * (held.ndim - 1)), held, fill)
+    return held
+
+def wrap_yaw(measured, target):
+    # Yaw as the set point plus the shortest way to it, a step across north stays a step
+    return target + (measured - target + 180) % 360 - 180
+
+def run_from_telemetry(run):
+    # Run directory of node_recorder, measured values of the sensor topic against the
+    # set_point held at every sensor message, moves of the move topic
+    sensor, set_point, move, pwm = run['sensor'], run['set_point'], run['move'], run['pwm_actuator']
+    time = np.asarray(sensor.time)
+    measured = np.column_stack([getattr(sensor, axis) for axis in AXES]).astype(float)
+    target = hold(set_point.time, np.column_stack([getattr(set_point, axis) for axis in AXES]).astype(float), time, np.nan)
+
+    codes = np.asarray(move.move)
+    changes = np.flatnonzero(np.diff(codes, prepend=-1))
+    names = move.codes.get('move', np.array([]))
+    return SimpleNamespace(
+        time=time,
+        measured=measured,
+        target=target,
+        pwm_time=np.asarray(pwm.time),
+        pwm=np.column_stack([getattr(pwm, 'thruster_%d' % (i + 1)) for i in range(10)]).astype(float),
+        move_time=np.asarray(move.time)[changes],
+        move=[str(names[code]) for code in codes[changes]],
+    )
+
+def run_from_mission_log(log):
+    # Log of scripts/simulate_mission.py, true depth and attitude, roll and pitch are held at 0
+    time = log['time']
+    attitude = log['attitude']
+    zero = np.zeros(len(time))
+    codes = log['move']
+    changes = np.flatnonzero(np.diff(codes, prepend=-2))
+    return SimpleNamespace(
+        time=time,
+        measured=np.column_stack([log['position'][:, 2], attitude[:, 0], attitude[:, 1], attitude[:, 2]]),
+        target=np.column_stack([log['set_point'][:, 0], zero, zero, log['set_point'][:, 1]]),
+        pwm_time=time,
+        pwm=log['pwm'],
+        move_time=time[changes],
+        move=[str(log['moves'][code]) if code >= 0 else 'none' for code in codes[changes]],
+    )
+
+def segment_bounds(time, move_time):
+    # First and past the last row of every move segment in a stream
+    starts = np.searchsorted(time, move_time)
+    return starts, np.append(starts[1:], len(time))
+
+def segment_sums(values, starts, ends):
+    # Sums over rows of every segment, empty segments included
+    total = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    return total[ends] - total[starts]
+
+def step_metrics(time, measured, target, starts, min_step):
+    # Every window runs from a set point change or the start of a segment to the next one.
+    # Rise time, overshoot and settling time are only taken of windows starting with a step,
+    # all arrays are per window.
+    n = len(time)
+    ends = np.append(starts[1:], n)
+    window = np.repeat(np.arange(len(starts)), ends - starts)
+    index = np.arange(n)
+    time_end = np.append(time, np.nan)
+
+    start_value = measured[starts]
+    step = target[starts] - start_value
+    before = target[np.maximum(starts - 1, 0)]
+    is_step = (starts > 0) & (np.abs(target[starts] - before) >= min_step) & (np.abs(step) > 0)
+    step = np.where(is_step, step, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        progress = (measured - start_value[window]) / step[window]
+        low = np.minimum.reduceat(np.where(progress >= RISE[0], index, n), starts)
+        high = np.minimum.reduceat(np.where(progress >= RISE[1], index, n), starts)
+        rise = np.where(high < ends, time_end[high] - time_end[low], np.nan)
+        overshoot = np.maximum(np.fmax.reduceat(progress, starts) - 1, 0)
+
+        outside = np.maximum.reduceat(np.where(np.abs(progress - 1) > SETTLING_BAND, index, -1), starts)
+        settled = np.maximum(outside + 1, starts)
+        settling = np.where(is_step & (settled < ends), time_end[settled] - time[starts], np.nan)
+
+    tail = index >= (ends - np.ceil(TAIL * (ends - starts)).astype(int))[window]
+    error = measured - target
+    tail_error = np.add.reduceat(np.where(tail, error, 0), starts) / np.add.reduceat(tail, starts)
+    return SimpleNamespace(
+        start=time[starts],
+        is_step=is_step,
+        step=step,
+        rise=rise,
+        overshoot=np.where(is_step, overshoot, np.nan),
+        settling=settling,
+        steady_state_error=tail_error,
+    )
+
+def oscillation(time, error, min_duration=MIN_OSCILLATION):
+    # Strongest frequency of the error of a segment and its amplitude, the error is
+    # resampled to its median rate and windowed before the FFT, columns are axes
+    columns = error.shape[1]
+    if len(time) < 16 or time[-1] - time[0] < min_duration:
+        return np.full(columns, np.nan), np.full(columns, np.nan)
+    dt = np.median(np.diff(time))
+    if dt <= 0:
+        return np.full(columns, np.nan), np.full(columns, np.nan)
+    grid = np.arange(time[0], time[-1], dt)
+    resampled = np.column_stack([np.interp(grid, time, error[:, i]) for i in range(columns)])
+    resampled -= resampled.mean(axis=0)
+    window = np.hanning(len(grid))
+    spectrum = np.abs(np.fft.rfft(resampled * window[:, None], axis=0))
+    frequencies = np.fft.rfftfreq(len(grid), dt)
+    if len(frequencies) < 3:
+        return np.full(columns, np.nan), np.full(columns, np.nan)
+    # Peak between the bins around the largest one, fitted by a parabola
+    peak = np.clip(np.argmax(spectrum[1:], axis=0) + 1, 1, len(frequencies) - 2)
+    columns = np.arange(columns)
+    left, middle, right = spectrum[peak - 1, columns], spectrum[peak, columns], spectrum[peak + 1, columns]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.nan_to_num(0.5 * (left - right) / (left - 2 * middle + right))
+    offset = np.clip(offset, -0.5, 0.5)
+    amplitude = middle - 0.25 * (left - right) * offset
+    frequency = frequencies[peak] + offset * (frequencies[1] - frequencies[0])
+    return np.where(middle > 0, frequency, np.nan), 2 * amplitude / window.sum()
+
+def pwm_stats(pwm, starts, ends, pwm_min=1000, pwm_max=2000, tolerance=1):
+    # Duty is the command as a fraction of full thrust either way of 1500. A row is
+    # saturated when any thruster is at a limit, a thruster at 0 is not armed yet.
+    rows = (ends - starts).astype(float)
+    armed = pwm > 0
+    duty = np.where(armed, np.abs(pwm - 1500) / 500, 0)
+    saturated = armed & ((pwm <= pwm_min + tolerance) | (pwm >= pwm_max - tolerance))
+    safe = np.minimum(starts, max(len(pwm) - 1, 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        any_saturated = segment_sums(saturated.any(axis=1).astype(float), starts, ends) / rows
+        thruster_saturated = segment_sums(saturated.astype(float), starts, ends) / rows[:, None]
+        thruster_duty = segment_sums(duty, starts, ends) / rows[:, None]
+        square = segment_sums(duty ** 2, starts, ends) / rows[:, None]
+        peak = np.maximum.reduceat(duty, safe, axis=0) if len(pwm) else np.zeros((len(starts), 10))
+    peak = np.where(rows[:, None] > 0, peak, np.nan)
+    return SimpleNamespace(
+        rows=rows,
+        saturation=any_saturated,
+        thruster_saturation=thruster_saturated,
+        duty=thruster_duty.mean(axis=1),
+        thruster_duty=thruster_duty,
+        duty_std=np.sqrt(np.maximum(square - thruster_duty ** 2, 0)).mean(axis=1),
+        duty_peak=peak.max(axis=1),
+    )
+
+def analyze(run, pwm_min=1000, pwm_max=2000, min_step=None):
+    # Report of every move segment of a run, rows without a set point yet are left out
+    min_step = dict(MIN_STEP, **(min_step or {}))
+    valid = ~np.isnan(run.target).any(axis=1)
+    time, measured, target = run.time[valid], run.measured[valid], run.target[valid]
+    if not len(time):
+        return []
+    measured[:, 3] = wrap_yaw(measured[:, 3], target[:, 3])
+    error = measured - target
+
+    # Rows before the first move are a segment of their own
+    first = min(time[0], run.pwm_time[0]) if len(run.pwm_time) else time[0]
+    last = max(time[-1], run.pwm_time[-1]) if len(run.pwm_time) else time[-1]
+    move_time, move = np.asarray(run.move_time, dtype=float), list(run.move)
+    if not len(move_time) or move_time[0] > first:
+        move_time = np.insert(move_time, 0, first)
+        move = ['none'] + move
+    bounds = np.append(np.maximum(move_time, first), last)
+
+    starts, ends = segment_bounds(time, move_time)
+    pwm_starts, pwm_ends = segment_bounds(run.pwm_time, move_time)
+    pwm = pwm_stats(run.pwm, pwm_starts, pwm_ends, pwm_min, pwm_max)
+    rows = (ends - starts).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rms = np.sqrt(segment_sums(error ** 2, starts, ends) / rows[:, None])
+
+    # Steps of every axis, windows start at the segments and at set point changes
+    steps = {}
+    for i, axis in enumerate(AXES):
+        changes = np.flatnonzero(np.abs(np.diff(target[:, i], prepend=target[0, i])) >= min_step[axis])
+        windows = np.unique(np.concatenate([[0], starts[starts < len(time)], changes]))
+        metrics = step_metrics(time, measured[:, i], target[:, i], windows, min_step[axis])
+        metrics.segment = np.searchsorted(starts, windows, side='right') - 1
+        steps[axis] = metrics
+
+    segments = []
+    for k, name in enumerate(move):
+        if rows[k] == 0 and pwm.rows[k] == 0:
+            continue
+        frequency, amplitude = oscillation(time[starts[k]:ends[k]], error[starts[k]:ends[k]])
+        axes = {}
+        for i, axis in enumerate(AXES):
+            metrics = steps[axis]
+            mine = metrics.segment == k
+            taken = mine & metrics.is_step
+            axes[axis] = {
+                'steps': int(taken.sum()),
+                'rise': nanmean(metrics.rise[taken]),
+                'overshoot': nanmean(metrics.overshoot[taken]),
+                'settling': nanmean(metrics.settling[taken]),
+                'steady_state_error': nanmean(metrics.steady_state_error[mine]),
+                'rms': float(rms[k, i]),
+                'oscillation': float(frequency[i]),
+                'amplitude': float(amplitude[i]),
+            }
+        segments.append({
+            'move': name,
+            'start': float(bounds[k]),
+            'duration': float(bounds[k + 1] - bounds[k]),
+            'rows': int(rows[k]),
+            'saturation': float(pwm.saturation[k]),
+            'thruster_saturation': pwm.thruster_saturation[k].tolist(),
+            'duty': float(pwm.duty[k]),
+            'duty_std': float(pwm.duty_std[k]),
+            'duty_peak': float(pwm.duty_peak[k]),
+            'thruster_duty': pwm.thruster_duty[k].tolist(),
+            'axes': axes,
+        })
+    return segments
+
+def nanmean(values):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else float('nan')
+
+def by_move(segments):
+    # Segments of the same move pooled, weighted by their duration and their steps
+    moves = {}
+    for segment in segments:
+        moves.setdefault(segment['move'], []).append(segment)
+
+    summary = {}
+    for move, pooled in moves.items():
+        duration = np.array([segment['duration'] for segment in pooled])
+        weight = duration / duration.sum() if duration.sum() > 0 else np.full(len(pooled), 1 / len(pooled))
+        entry = {
+            'segments': len(pooled),
+            'duration': float(duration.sum()),
+            'saturation': float(np.nansum(weight * [segment['saturation'] for segment in pooled])),
+            'duty': float(np.nansum(weight * [segment['duty'] for segment in pooled])),
+            'duty_peak': float(np.nanmax([segment['duty_peak'] for segment in pooled])),
+            'axes': {},
+        }
+        for axis in AXES:
+            metrics = [segment['axes'][axis] for segment in pooled]
+            counts = np.array([metric['steps'] for metric in metrics], dtype=float)
+
+            def stepped(key):
+                # Mean over the steps of the segments where the metric was reached
+                values = np.array([metric[key] for metric in metrics])
+                taken = (counts > 0) & ~np.isnan(values)
+                return float(np.sum(counts[taken] * values[taken]) / counts[taken].sum()) if taken.any() else float('nan')
+
+            rms = np.array([metric['rms'] for metric in metrics])
+            # The oscillation of the segment where it is strongest
+            amplitude = np.array([metric['amplitude'] for metric in metrics])
+            strongest = int(np.nanargmax(amplitude)) if not np.isnan(amplitude).all() else None
+            entry['axes'][axis] = {
+                'steps': int(counts.sum()),
+                'rise': stepped('rise'),
+                'overshoot': stepped('overshoot'),
+                'settling': stepped('settling'),
+                'steady_state_error': nanmean([metric['steady_state_error'] for metric in metrics]),
+                'rms': float(np.sqrt(np.nansum(weight * rms ** 2))),
+                'oscillation': metrics[strongest]['oscillation'] if strongest is not None else float('nan'),
+                'amplitude': metrics[strongest]['amplitude'] if strongest is not None else float('nan'),
+            }
+        summary[move] = entry
+    return summary
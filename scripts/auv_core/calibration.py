@@ -0,0 +1,115 @@
+import numpy as np
+
+THRUSTERS = 10
+
+def deadband_edges(pwm, thrust):
+    # PWM where the thrust leaves zero on the reverse and on the forward side
+    first = np.argmax(thrust >= 0)
+    last = len(thrust) - 1 - np.argmax(thrust[::-1] <= 0)
+    lower = pwm[first] if first == 0 else np.interp(0, thrust[first - 1:first + 1], pwm[first - 1:first + 1])
+    upper = pwm[last] if last == len(thrust) - 1 else np.interp(0, thrust[last:last + 2], pwm[last:last + 2])
+    return lower, upper
+
+def thrust_to_pwm_curve(thrusts, pwm, thrust):
+    # Invert one thrust curve, zero thrust sits in the middle of the deadband and any
+    # other thrust jumps straight to the deadband edge
+    lower, upper = deadband_edges(pwm, thrust)
+    reverse = thrust < 0
+    forward = thrust > 0
+
+    curve = np.full(len(thrusts), 1500.0)
+    negative = thrusts < 0
+    positive = thrusts > 0
+    curve[negative] = np.interp(thrusts[negative], np.append(thrust[reverse], 0), np.append(pwm[reverse], lower))
+    curve[positive] = np.interp(thrusts[positive], np.insert(thrust[forward], 0, 0), np.insert(pwm[forward], 0, upper))
+    return curve
+
+class ThrusterCalibration():
+    def __init__(self, tables, resolution=0.001):
+        self.pwm_tables = [np.asarray(table['pwm'], dtype=float) for table in tables]
+        self.thrust_tables = [np.asarray(table['thrust'], dtype=float) for table in tables]
+        self.rows = np.arange(len(tables))
+
+        # Largest reverse and forward thrust of every thruster
+        self.max_reverse = np.array([-thrust.min() for thrust in self.thrust_tables])
+        self.max_forward = np.array([thrust.max() for thrust in self.thrust_tables])
+
+        # Forward table: PWM for thrusts on one uniform grid shared by all thrusters,
+        # zero thrust is a grid point so the deadband stays centered
+        steps = np.arange(-np.ceil(self.max_reverse.max() / resolution), np.ceil(self.max_forward.max() / resolution) + 1)
+        self.thrust_start = steps[0] * resolution
+        self.thrust_step = resolution
+        thrusts = steps * resolution
+        self.forward = np.array([thrust_to_pwm_curve(thrusts, pwm, thrust) for pwm, thrust in zip(self.pwm_tables, self.thrust_tables)])
+
+        # Reverse table: thrust for every microsecond from 1000 to 2000
+        self.pwm_start = 1000
+        self.pwm_step = 1
+        pwms = np.arange(1000, 2001, dtype=float)
+        self.reverse = np.array([np.interp(pwms, pwm, thrust) for pwm, thrust in zip(self.pwm_tables, self.thrust_tables)])
+
+    def lookup(self, table, start, step, value, out):
+        # Linear interpolation of every thruster in its own row of a dense table
+        position = np.clip((value - start) / step, 0, table.shape[1] - 1)
+        index = np.minimum(position.astype(int), table.shape[1] - 2)
+        fraction = position - index
+        np.multiply(table[self.rows, index], 1 - fraction, out=out)
+        out += table[self.rows, index + 1] * fraction
+        return out
+
+    def to_pwm(self, thrust, out=None):
+        out = np.empty(len(self.rows)) if out is None else out
+        return self.lookup(self.forward, self.thrust_start, self.thrust_step, thrust, out)
+
+    def to_thrust(self, pwm, out=None):
+        out = np.empty(len(self.rows)) if out is None else out
+        return self.lookup(self.reverse, self.pwm_start, self.pwm_step, pwm, out)
+
+    def linearize(self, pwm, out=None):
+        # Treat a linear PWM command as a fraction of full thrust in its direction and
+        # return the PWM that produces that thrust, 1000 and 2000 stay where they are
+        command = (np.asarray(pwm, dtype=float) - 1500) / 500
+        thrust = command * np.where(command > 0, self.max_forward, self.max_reverse)
+        return self.to_pwm(thrust, out)
+
+    def delinearize(self, pwm, out=None):
+        # Linear PWM command that linearize turns into this PWM, inside the deadband 1500
+        thrust = self.to_thrust(np.asarray(pwm, dtype=float))
+        out = np.empty(len(self.rows)) if out is None else out
+        np.divide(thrust, np.where(thrust > 0, self.max_forward, self.max_reverse), out=out)
+        out *= 500
+        out += 1500
+        return out
+
+def load_calibration(param):
+    # One table per thruster, thruster_1 ... thruster_10 fall back to the default table
+    tables = [param.get('thruster_%d' % (i + 1), param.get('default')) for i in range(THRUSTERS)]
+    return ThrusterCalibration(tables, param.get('resolution', 0.001))
+
+class VoltageCompensator():
+    def __init__(self, nominal_voltage, exponent, time_constant, max_factor):
+        self.nominal_voltage = nominal_voltage
+        self.exponent = exponent
+        self.time_constant = time_constant
+        self.max_factor = max_factor
+
+        self.voltage = nominal_voltage
+        self.factor = 1.0
+        self.last_stamp = None
+
+    def update(self, voltage, stamp):
+        # Ignore readings of a disconnected or resetting power sensor
+        if not voltage > 0:
+            return self.factor
+
+        # Exponential smoothing with a time constant, the sensor rate is not fixed
+        if self.last_stamp is None:
+            self.voltage = voltage
+        else:
+            dt = max(stamp - self.last_stamp, 0)
+            self.voltage += (voltage - self.voltage) * dt / (self.time_constant + dt)
+        self.last_stamp = stamp
+
+        # Thrust at a fixed PWM drops with voltage, scale the command back up
+        self.factor = min(max((self.nominal_voltage / self.voltage) ** self.exponent, 1 / self.max_factor), self.max_factor)
+        return self.factor
@@ -0,0 +1,20 @@
+import time
+
+# A clock is any callable that returns the time in seconds, e.g. rospy.get_time in the nodes
+
+def monotonic_clock():
+    return time.monotonic()
+
+class ManualClock():
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, dt):
+        self.time += dt
+        return self.time
+
+    def set(self, time):
+        self.time = time
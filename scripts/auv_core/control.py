@@ -0,0 +1,701 @@
+import logging
+import threading
+import numpy as np
+from .clock import monotonic_clock
+from .calibration import VoltageCompensator, load_calibration
+from .scheduler import DoubleBuffer, PeriodStats
+from .pid import CascadedDepthController, PIDBank
+from .estimation import AlphaBetaFilter, TrimEstimator
+from .mpc import DPRPredictiveController
+from .gain_schedule import GainSchedule, apply_gains
+from .allocation import DPRController, SSYController, ThrusterAllocator, HORIZONTAL, VERTICAL, SSY_THRUSTERS, DPR_THRUSTERS, DPR_OFFSET_COLUMNS, MIRRORED_MASK, thruster_mask, split_to_thrusters, thrust_bounds, thrust_to_pwm
+
+logger = logging.getLogger(__name__)
+
+# Parameters of ControlCore, node_control reads each one as a private parameter
+CONTROL_DEFAULTS = {
+    # Seconds after pre calibration before the thrusters start
+    'arming_duration': 1,
+    # split: DPR and SSY controllers, unified: one 6-DOF solve for all ten thrusters. Split
+    # thrusters 9 and 10 repeat 1 and 2, so with them running split gives 1.5 times the
+    # surge and yaw asked for (and some yaw with sway), unified gives the wrench as asked.
+    'allocation': 'split',
+    # Redistribute thrust over the other thrusters when some of them saturate
+    'saturation_aware': False,
+    # Bit i enables thruster i + 1
+    'thruster_enable_mask': 0b1111111111,
+    # Thrust against PWM tables, see config/thruster_calibration.yaml
+    'thruster_calibration': None,
+    # Scale the PWM command with the battery voltage sag, thrust ~ voltage ^ exponent
+    'battery_compensation': False,
+    'battery_nominal_voltage': 25.0,
+    'battery_exponent': 1.2,
+    'battery_time_constant': 5.0,
+    'battery_max_factor': 1.3,
+    # Control loop rate in Hz, 0 runs the loop on every is_start message instead
+    'control_rate': 0,
+    'heartbeat_timeout': 1.0,
+    # legacy: one PID object per axis, bank: depth, pitch, roll and yaw in one PIDBank with
+    # anti-windup, output limits and a derivative filter. For four axes the bank is slower
+    # than the PID objects, NumPy call overhead dominates (pid_bank against pid in scripts/benchmark.py).
+    'pid_mode': 'legacy',
+    # Output limit of the bank, one value or one per axis (depth, pitch, roll, yaw), None for none
+    'pid_output_limit': None,
+    'pid_derivative_filter': 0.0,
+    # PID gains [kp, ki, kd] per axis (depth, pitch, roll, yaw) instead of the ones below,
+    # see scripts/tune_pid.py
+    'pid_gains': None,
+    # position: depth PID on the error, cascade: position loop on the error feeding a
+    # vertical velocity loop that runs on every depth sample
+    'depth_mode': 'position',
+    'depth_position_gain': 2.0,
+    'depth_max_velocity': 0.3,
+    'depth_velocity_gains': [400, 50],
+    'depth_velocity_output_limit': 500,
+    'depth_filter_gains': [0.5, 0.1],
+    # PID gains per move mode and depth band, see config/gain_schedule.yaml
+    'gain_schedule': None,
+    # Seconds to blend from the old gains to the new ones after a switch
+    'gain_transition': 1.0,
+    # pid: PID outputs into DPRController, mpc: predictive controller on the vertical thrusts
+    'dpr_mode': 'pid',
+    # Linear model per axis (depth, pitch, roll): error acceleration = -gain * output - damping * rate
+    'mpc_model_gain': [0.002, 0.05, 0.05],
+    'mpc_model_damping': [1.0, 2.0, 2.0],
+    'mpc_period': 0.1,
+    'mpc_horizon': 20,
+    # Weights of (depth, pitch, roll, depth rate, pitch rate, roll rate) and of the thrusts
+    'mpc_state_weight': [1e4, 1, 1, 1e2, 0.1, 0.1],
+    'mpc_input_weight': 1e-4,
+    # Most solver iterations per step, the solve stops once no thrust moves by more than
+    # mpc_tolerance (us of PWM)
+    'mpc_iterations': 100,
+    'mpc_tolerance': 0.5,
+    'mpc_filter_gains': [0.5, 0.1],
+    # Matrices are loaded from this file when it was made with the same parameters
+    'mpc_cache': None,
+    # Learn net buoyancy, pitch and roll trim and drag online (same model as the MPC) and
+    # add the outputs that hold them to the depth, pitch and roll outputs
+    'trim_estimation': False,
+    'trim_forgetting': 0.995,
+    'trim_covariance': 100.0,
+    'trim_output_limit': 200,
+    # Yaw torque while moving forward, pid: from the yaw error, tau: the tau of guidance as
+    # a fixed torque like node_control_last
+    'forward_yaw': 'pid',
+    # Output stage: slew rate (us/s, 0 off), change deadband (us) and keepalive (s, 0 every tick)
+    'pwm_slew_rate': 0,
+    'pwm_deadband': 0,
+    'pwm_keepalive': 0,
+}
+
+# Moves that steer with the yaw PID
+YAW_MOVES = ('left', 'right', 'forward', 'last', 'yaw_right', 'yaw_left')
+# Moves that idle thrusters 9 and 10
+SWAY_MOVES = ('left', 'right', 'yaw_right', 'yaw_left')
+
+class ControlOutputs():
+    # Outputs of ControlCore, these do nothing, node_control publishes them
+    def pwm(self, pwm):
+        pass
+
+    def dive(self, dive):
+        pass
+
+    def battery_compensation(self, gain):
+        pass
+
+class PID():
+    def __init__(self, kp, ki, kd, clock=monotonic_clock):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_max = 80
+        self.clock = clock
+
+        self.proportional = 0
+        self.integral = 0
+        self.derivative = 0
+
+        self.start_time = self.clock()
+        self.last_time = 0
+        self.last_error = 0
+
+    def __call__(self, error):
+        dt = self.clock() - (self.last_time if self.last_time is not None else self.start_time)
+        d_error = error - self.last_error
+
+        self.proportional = self.kp * error
+        self.integral += -self.ki * error * dt
+        self.derivative = self.kd * d_error / dt
+
+        # if self.integral > self.integral_max:
+        #     self.integral = self.integral_max
+        # elif self.integral < -self.integral_max:
+        #     self.integral = -self.integral_max
+
+        self.last_error = error
+        self.last_time = self.clock()
+
+        return self.proportional + self.integral + self.derivative
+
+class ThrusterMovement():
+    def __init__(self, clock=monotonic_clock, send=None, slew_rate=0, deadband=0, keepalive=0):
+        self.clock = clock
+        self.send = send
+        self.pwm = np.full(10, 1500.0)
+
+        # Slew rate in us per second (0 disables it). PWM is only sent when a channel
+        # moved more than the deadband or the keepalive passed, keepalive 0 sends every tick.
+        self.slew_rate = slew_rate
+        self.deadband = deadband
+        self.keepalive = keepalive
+
+        # PWM after the slew rate limit and the last PWM sent
+        self.output = np.full(10, 1500.0)
+        self.published = np.full(10, 1500.0)
+        self.last_time = None
+        self.last_publish_time = None
+
+        # Statistics counters
+        self.ticks = 0
+        self.sent = 0
+        self.slewed = 0
+
+    def apply(self, thrusters, pwm):
+        # Take the given thrusters from a PWM array of all ten thrusters
+        self.pwm[thrusters] = pwm[thrusters]
+
+    def idle(self, thrusters):
+        self.pwm[thrusters] = 1500
+
+    def stop(self):
+        # Stopping is not slew rate limited
+        self.pwm[:] = 1500
+        self.output[:] = 1500
+
+    def publish(self):
+        stamp = self.clock()
+        self.ticks += 1
+
+        if self.slew_rate > 0 and self.last_time is not None:
+            step = self.slew_rate * max(stamp - self.last_time, 0)
+            if np.any(np.abs(self.pwm - self.output) > step):
+                self.slewed += 1
+            np.clip(self.pwm, self.output - step, self.output + step, out=self.output)
+        else:
+            self.output[:] = self.pwm
+        self.last_time = stamp
+
+        changed = np.max(np.abs(self.output - self.published)) > self.deadband
+        expired = self.last_publish_time is None or stamp - self.last_publish_time >= self.keepalive
+        if changed or expired:
+            self.published[:] = self.output
+            self.last_publish_time = stamp
+            self.sent += 1
+            if self.send is not None:
+                self.send(self.output)
+        return changed or expired
+
+class ControlCore():
+    def __init__(self, config=None, clock=monotonic_clock, outputs=None):
+        self.config = dict(CONTROL_DEFAULTS, **(config or {}))
+        for key, value in self.config.items():
+            setattr(self, 'param_' + key, value)
+        self.clock = clock
+        self.outputs = outputs if outputs is not None else ControlOutputs()
+
+        self.is_start = False
+        self.move = "stop"
+        self.boot_time = 0
+        self.start_time = 0
+        self.object_type = ""
+        self.x_difference = 0
+        self.tau = 0
+        self.ssyController = SSYController(1)
+        self.dprController = DPRController(0.5, 0.5)
+        self.thrusterAllocator = ThrusterAllocator(0.5, 0.5, 1)
+
+        self.movement = ThrusterMovement(self.clock, self.outputs.pwm, self.param_pwm_slew_rate, self.param_pwm_deadband, self.param_pwm_keepalive)
+        self.movement.stop()
+
+        self.pid_depth = PID(1800, 0, 200, self.clock)
+        # self.pid_depth = PID(1700, 0, 200, self.clock)
+
+        self.pid_roll = PID(15, 0, 0, self.clock)
+
+        # self.pid_pitch = PID(15, 0, 7, self.clock)
+        self.pid_pitch = PID(40, 0, 7, self.clock)
+
+        self.pid_sway = PID(6, 0, 0, self.clock)
+
+        self.pid_yaw = PID(10, 0, 1, self.clock)
+
+        self.pid_camera = PID(1, 0, 0, self.clock)
+
+        # Same gains as the PID objects above, the yaw error wraps around at 360 degrees
+        self.pids = (self.pid_depth, self.pid_pitch, self.pid_roll, self.pid_yaw)
+        self.pid_bank = PIDBank([pid.kp for pid in self.pids], [pid.ki for pid in self.pids], [pid.kd for pid in self.pids], self.param_pid_output_limit, self.param_pid_derivative_filter, wrap=[0, 0, 0, 360])
+
+        if self.param_pid_gains is not None:
+            gains = np.array([self.pid_bank.kp, self.pid_bank.ki, self.pid_bank.kd])
+            apply_gains(gains, self.param_pid_gains)
+            self.set_gains(gains)
+
+        # The gains above are the defaults of the schedule. Axes named in pid_gains replace the
+        # default of the schedule, its modes and depth bands still apply on top.
+        self.gainSchedule = None
+        if self.param_gain_schedule is not None:
+            schedule = self.param_gain_schedule
+            if self.param_pid_gains is not None:
+                default = {key: value for key, value in (schedule.get('default') or {}).items() if key not in self.param_pid_gains}
+                schedule = dict(schedule, default=default)
+            self.gainSchedule = GainSchedule(schedule, self.pid_bank.kp, self.pid_bank.ki, self.pid_bank.kd, self.param_gain_transition)
+        self.depth = 0
+        self.error_axes = np.zeros(4)
+        self.set_point_axes = np.zeros(4)
+
+        self.depthController = CascadedDepthController(self.param_depth_position_gain, self.param_depth_max_velocity, *self.param_depth_velocity_gains, self.param_depth_velocity_output_limit)
+        self.heaveEstimator = AlphaBetaFilter(*self.param_depth_filter_gains)
+        self.output_depth = 0
+        self.output_pitch = 0
+        self.output_roll = 0
+        # The wrench and thrust are solved from the error, the depth sensor and the object
+        # difference inputs while the PWM update reads the same wrench, thrust and bounds
+        # buffers. Reentrant, the predictive solve and the PWM update go through
+        # control_depth_pitch_roll.
+        self.dpr_lock = threading.RLock()
+
+        self.dprPredictive = None
+        if self.param_dpr_mode == 'mpc':
+            self.dprPredictive = DPRPredictiveController(self.dprController.A, self.param_mpc_model_gain, self.param_mpc_model_damping, self.param_mpc_period, self.param_mpc_horizon, self.param_mpc_state_weight, self.param_mpc_input_weight, self.param_mpc_iterations, self.param_mpc_cache, self.param_mpc_tolerance)
+        self.errorRateFilters = [AlphaBetaFilter(*self.param_mpc_filter_gains) for _ in range(3)]
+        self.error_rates = np.zeros(3)
+        self.error_stamp = 0
+
+        # Feed-forward of depth, pitch and roll, stays zero without the estimator
+        self.trimEstimator = None
+        self.feed_forward = np.zeros(3)
+        if self.param_trim_estimation:
+            self.trimEstimator = TrimEstimator(self.param_mpc_model_gain, self.param_trim_forgetting, self.param_trim_covariance, self.param_trim_output_limit)
+            self.feed_forward = self.trimEstimator.feed_forward
+        self.applied_outputs = np.zeros(3)
+        # The depth, pitch and roll outputs went to the thrusters with the last PWM published,
+        # not before the first is_start, while pre calibrating or arming, or after a heartbeat stop
+        self.outputs_applied = False
+
+        # The predictive controller handles depth itself, without the cascaded velocity loop
+        self.is_depth_cascade = self.param_depth_mode == 'cascade' and self.dprPredictive is None
+        # Depth and battery voltage are only needed by these modes
+        self.uses_arduino_sensor = self.param_battery_compensation or self.is_depth_cascade
+
+        self.is_armed = False
+        self.is_pre_calibrating = False
+        self.dive = False
+
+        self.thrust_depth_pitch_roll = [0,0,0,0]
+        self.offset_depth_pitch_roll = [0,0,0,0]
+        self.thrust_surge_sway_yaw = [0,0,0,0]
+        self.offset_surge_sway_yaw = [0,0,0,0]
+
+        # Wrench (Fx, Fy, Fz, Mx, My, Mz), thrust, offset and PWM of thrusters 1-10
+        self.wrench = np.zeros(6)
+        self.thrust = np.zeros(10)
+        self.offset = np.zeros(10)
+        self.pwm = np.full(10, 1500.0)
+        self.thrust_min = np.zeros(10)
+        self.thrust_max = np.zeros(10)
+
+        # Thrusters 9 and 10 are held at neutral until constrain_pwm gives them a range
+        self.constrain_pwm_min = 1500
+        self.constrain_pwm_max = 1500
+        self.pwm_min = np.full(10, 1000.0)
+        self.pwm_max = np.full(10, 2000.0)
+        self.pwm_min[HORIZONTAL[4:]] = self.constrain_pwm_min
+        self.pwm_max[HORIZONTAL[4:]] = self.constrain_pwm_max
+
+        # Every single and double thruster failure gets its inverse at startup
+        self.ssyController.precompute(2)
+        self.dprController.precompute(2)
+        self.thrusterAllocator.precompute(2)
+        self.set_thruster_enable_mask(self.param_thruster_enable_mask)
+
+        self.calibration = None
+        if self.param_thruster_calibration is not None:
+            self.calibration = load_calibration(self.param_thruster_calibration)
+
+        # Latest error (depth, pitch, roll, yaw) handed from set_error to the control tick
+        self.error_buffer = DoubleBuffer(4)
+        self.error_snapshot = np.zeros(4)
+        self.error_version = 0
+        self.is_arming = False
+        self.last_is_start = None
+        self.loop_stats = PeriodStats(1.0 / self.param_control_rate if self.param_control_rate > 0 else 0)
+
+        self.voltageCompensator = VoltageCompensator(self.param_battery_nominal_voltage, self.param_battery_exponent, self.param_battery_time_constant, self.param_battery_max_factor)
+        self.pwm_gain = 1.0
+
+    def constrain(self, value, _min, _max):
+        return min(max(value, _min), _max)
+
+    def pre_calibrate(self):
+        self.depthController.reset()
+        for errorRateFilter in self.errorRateFilters:
+            errorRateFilter.reset()
+        if self.trimEstimator is not None:
+            self.trimEstimator.restart()
+
+        if self.param_allocation == 'unified':
+            self.offset[:] = self.thrusterAllocator.allocate(self.wrench, self.unified_mask())
+            return
+
+        self.offset_surge_sway_yaw[0] = self.thrust_surge_sway_yaw[0]
+        self.offset_surge_sway_yaw[1] = self.thrust_surge_sway_yaw[1]
+        self.offset_surge_sway_yaw[2] = self.thrust_surge_sway_yaw[2]
+        self.offset_surge_sway_yaw[3] = self.thrust_surge_sway_yaw[3]
+
+        self.offset_depth_pitch_roll[0] = self.thrust_depth_pitch_roll[0]
+        self.offset_depth_pitch_roll[1] = self.thrust_depth_pitch_roll[1]
+        self.offset_depth_pitch_roll[2] = self.thrust_depth_pitch_roll[2]
+        self.offset_depth_pitch_roll[3] = self.thrust_depth_pitch_roll[3]
+
+    def is_in_range(self, start_time, end_time):
+        return (self.boot_time > start_time and end_time is None) or (start_time) < self.boot_time < (end_time)
+
+    def get_offset(self, offset):
+        return offset if not self.is_pre_calibrating else 0
+
+    def unified_mask(self):
+        # Thrusters 9 and 10 are left out of the unified solve while they are idled or
+        # constrain_pwm holds them at 1500, the others make up their share
+        if self.move in SWAY_MOVES or self.constrain_pwm_min == self.constrain_pwm_max:
+            return ~MIRRORED_MASK
+        return None
+
+    def control_surge_sway_yaw(self, Fx, Fy, tau):
+        with self.dpr_lock:
+            if self.param_allocation == 'unified':
+                self.wrench[0] = Fx
+                self.wrench[1] = Fy
+                self.wrench[5] = tau
+            else:
+                self.thrust_surge_sway_yaw = self.ssyController.control(Fx, Fy, tau)
+
+    def control_depth_pitch_roll(self, depth, pitch, roll):
+        with self.dpr_lock:
+            if self.param_allocation == 'unified':
+                self.wrench[2] = depth
+                self.wrench[3] = roll
+                self.wrench[4] = pitch
+            else:
+                self.thrust_depth_pitch_roll = self.dprController.control(depth, pitch, roll)
+
+    def allocate_saturation_aware(self):
+        # Thrust limits come from the PWM limits, thrusters 9 and 10 only follow thrusters 1 and 2
+        # in the split controllers, so their constrain_pwm ramp only limits the unified solve
+        thrust_bounds(self.get_offset(self.offset), self.pwm_min, self.pwm_max, self.thrust_min, self.thrust_max, self.calibration, self.pwm_gain)
+
+        if self.param_allocation == 'unified':
+            self.thrust[:] = self.thrusterAllocator.solve_bounded(self.wrench, self.thrust_min, self.thrust_max, self.unified_mask())
+            return
+
+        self.thrust_surge_sway_yaw = self.ssyController.solve_bounded(self.ssyController.wrench, self.thrust_min[SSY_THRUSTERS], self.thrust_max[SSY_THRUSTERS])
+        self.thrust_depth_pitch_roll = self.dprController.solve_bounded(self.dprController.wrench, self.thrust_min[DPR_THRUSTERS], self.thrust_max[DPR_THRUSTERS])
+        split_to_thrusters(self.thrust_surge_sway_yaw, self.thrust_depth_pitch_roll, self.thrust)
+
+    def update_pwm(self):
+        # Map the thrust of all ten thrusters to PWM at once
+        with self.dpr_lock:
+            if self.param_allocation != 'unified':
+                split_to_thrusters(self.offset_surge_sway_yaw, self.offset_depth_pitch_roll, self.offset, DPR_OFFSET_COLUMNS)
+
+            if self.param_saturation_aware:
+                self.allocate_saturation_aware()
+            elif self.param_allocation == 'unified':
+                self.thrust[:] = self.thrusterAllocator.allocate(self.wrench, self.unified_mask())
+            else:
+                split_to_thrusters(self.thrust_surge_sway_yaw, self.thrust_depth_pitch_roll, self.thrust)
+
+            thrust_to_pwm(self.thrust, self.get_offset(self.offset), self.pwm_min, self.pwm_max, self.pwm, self.calibration, self.pwm_gain)
+            self.pwm[self.thruster_disabled] = 1500
+
+    def set_thruster_enable_mask(self, mask):
+        # Switch every allocator to the inverse without the disabled thrusters
+        self.thruster_enable_mask = mask
+        self.thruster_disabled = ((mask >> np.arange(10)) & 1) == 0
+        with self.dpr_lock:
+            self.thrusterAllocator.set_enabled(mask)
+            self.ssyController.set_enabled(thruster_mask(SSY_THRUSTERS, mask))
+            self.dprController.set_enabled(thruster_mask(DPR_THRUSTERS, mask))
+
+            # Solve the last wrench again so the change applies on the next PWM update
+            self.thrust_surge_sway_yaw = self.ssyController.solve(self.ssyController.wrench)
+            self.thrust_depth_pitch_roll = self.dprController.solve(self.dprController.wrench)
+
+    def surface(self):
+        self.movement.idle(HORIZONTAL)
+
+    def surge_yaw(self):
+        self.movement.apply(HORIZONTAL, self.pwm)
+
+    def sway_yaw(self):
+        self.movement.apply(HORIZONTAL[:4], self.pwm)
+        self.movement.idle(HORIZONTAL[4:])
+
+    def depth_pitch_roll(self):
+        self.movement.apply(VERTICAL, self.pwm)
+
+    def stabilize_depth_pitch_roll(self, output_depth, output_pitch, output_roll):
+        logger.debug("set depth")
+        if self.dprPredictive is not None:
+            self.stabilize_depth_pitch_roll_predictive()
+            return
+        self.output_depth = output_depth + self.feed_forward[0]
+        self.output_pitch = output_pitch + self.feed_forward[1]
+        self.output_roll = output_roll + self.feed_forward[2]
+        self.control_depth_pitch_roll(self.output_depth, self.output_pitch, -(self.output_roll))
+
+    def stabilize_depth_pitch_roll_predictive(self):
+        # The PWM limits of the vertical thrusters bound the thrusts of the whole horizon,
+        # a disabled thruster stays at 1500
+        with self.dpr_lock:
+            offset = self.get_offset(self.offset)
+            thrust_bounds(offset, self.pwm_min, self.pwm_max, self.thrust_min, self.thrust_max, self.calibration, self.pwm_gain)
+            self.thrust_min[self.thruster_disabled] = np.broadcast_to(offset, 10)[self.thruster_disabled]
+            self.thrust_max[self.thruster_disabled] = np.broadcast_to(offset, 10)[self.thruster_disabled]
+
+            thrust = self.dprPredictive.control(self.error_axes[:3], self.error_rates, self.thrust_min[DPR_THRUSTERS], self.thrust_max[DPR_THRUSTERS])
+            self.output_depth, self.output_pitch, self.output_roll = self.dprPredictive.output
+            self.control_depth_pitch_roll(self.output_depth, self.output_pitch, -(self.output_roll))
+
+            # Split allocation takes the bounded thrusts as they are
+            if self.param_allocation != 'unified':
+                self.thrust_depth_pitch_roll = thrust
+
+    def stabilize_depth_velocity(self, depth, stamp):
+        # Inner depth loop, pitch and roll keep their outputs from the last error
+        velocity = self.heaveEstimator.update(depth, stamp)
+        self.output_depth = self.depthController.update(velocity, stamp) + self.feed_forward[0]
+        self.control_depth_pitch_roll(self.output_depth, self.output_pitch, -(self.output_roll))
+
+    def stabilize_surge_yaw_camera(self, error):
+        logger.info("Stabilize with camera")
+        self.t_yaw = np.interp(self.pid_camera(error), [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(0, 1, self.t_yaw)
+
+    def stabilize_surge_yaw(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        if self.param_forward_yaw == 'tau':
+            self.control_surge_sway_yaw(0, 2.5, self.tau)
+            return
+        self.control_surge_sway_yaw(0, 2.5, self.t_yaw)
+        # self.control_surge_sway_yaw(0, 2, 0) # Tanpa Yaw (Darurat)
+
+    def stabilize_surge_yaw_last(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(0, 2.5, 0) # Tanpa Yaw (Darurat)
+
+    def stabilize_sway_yaw_left(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(4, 1, self.t_yaw)
+
+    def stabilize_sway_yaw_right(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(-4, 1, self.t_yaw)
+
+    def stabilize_yaw_right(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(0, 0, 0.75)
+
+    def stabilize_yaw_left(self, output_yaw):
+        self.t_yaw = np.interp(output_yaw, [-500, 500], [-3, 3])
+        self.control_surge_sway_yaw(0, 0, -0.75)
+
+    def set_gains(self, gains):
+        kp, ki, kd = gains
+        self.pid_bank.set_gains(kp, ki, kd)
+        for i, pid in enumerate(self.pids):
+            pid.kp = kp[i]
+            pid.ki = ki[i]
+            pid.kd = kd[i]
+
+    def set_move(self, move):
+        self.move = move
+        # Start blending to the gains of the new move right away
+        if self.gainSchedule is not None:
+            self.set_gains(self.gainSchedule.update(self.move, self.depth, self.clock()))
+
+    def set_object_difference(self, object_type, x_difference):
+        self.object_type = object_type
+        self.x_difference = x_difference
+        if self.move == "camera":
+            self.stabilize_surge_yaw_camera(self.x_difference)
+
+    def set_tau(self, tau):
+        self.tau = tau
+
+    def set_thruster_enable(self, mask):
+        if mask != self.thruster_enable_mask:
+            logger.warning('Thruster enable mask %s', format(mask, '010b'))
+            self.set_thruster_enable_mask(mask)
+
+    # Depth and battery voltage
+    def set_arduino_sensor(self, depth, loadvoltage):
+        stamp = self.clock()
+        if self.is_depth_cascade:
+            self.stabilize_depth_velocity(depth, stamp)
+            # Without the control timer the PWM is sent on is_start, the inner loop is sent
+            # here so it acts at the depth sensor rate
+            if self.param_control_rate == 0 and self.outputs_applied:
+                with self.dpr_lock:
+                    self.step()
+                    self.movement.publish()
+        if self.param_battery_compensation:
+            self.pwm_gain = self.voltageCompensator.update(loadvoltage, stamp)
+            self.outputs.battery_compensation(self.pwm_gain)
+
+    def set_constrain_pwm(self, constrain_pwm):
+        self.constrain_pwm_min = constrain_pwm
+        self.constrain_pwm_max = (1500 - constrain_pwm)+1500
+        self.pwm_min[HORIZONTAL[4:]] = self.constrain_pwm_min
+        self.pwm_max[HORIZONTAL[4:]] = self.constrain_pwm_max
+
+    def control_error(self, error_depth, error_pitch, error_roll, error_yaw, stamp):
+        self.error_axes[:] = (error_depth, error_pitch, error_roll, error_yaw)
+        self.error_stamp = stamp
+        if self.gainSchedule is not None:
+            # Depth band from the depth set point and the depth error
+            self.depth = self.set_point_axes[0] - error_depth
+            self.set_gains(self.gainSchedule.update(self.move, self.depth, stamp))
+
+        if self.dprPredictive is not None or self.trimEstimator is not None:
+            for i, errorRateFilter in enumerate(self.errorRateFilters):
+                self.error_rates[i] = errorRateFilter.update(self.error_axes[i], stamp)
+
+        # The outputs of the last step drove the thrusters up to this error, errors while the
+        # outputs were not sent are skipped
+        if self.trimEstimator is not None:
+            if self.outputs_applied:
+                self.applied_outputs[:] = (self.output_depth, self.output_pitch, self.output_roll)
+                self.trimEstimator.update(self.error_rates, self.applied_outputs, stamp)
+            else:
+                self.trimEstimator.restart()
+
+        if self.param_pid_mode == 'bank':
+            output_depth, output_pitch, output_roll, output_yaw = self.pid_bank.update(self.error_axes, stamp, self.set_point_axes)
+        else:
+            output_depth = self.pid_depth(error_depth)
+            output_pitch = self.pid_pitch(error_pitch)
+            output_roll = self.pid_roll(error_roll)
+            # The yaw PID only runs in the moves that use it, as in the legacy node
+            output_yaw = self.pid_yaw(error_yaw) if self.move in YAW_MOVES else 0
+
+        if self.is_depth_cascade:
+            self.depthController.set_position_error(error_depth)
+            output_depth = self.depthController.output
+
+        self.stabilize_depth_pitch_roll(output_depth, output_pitch, output_roll)
+        if self.move == "left":
+            self.stabilize_sway_yaw_left(output_yaw)
+        elif self.move == "right":
+            self.stabilize_sway_yaw_right(output_yaw)
+        elif self.move == "forward":
+            self.stabilize_surge_yaw(output_yaw)
+        elif self.move == "last":
+            self.stabilize_surge_yaw_last(output_yaw)
+        elif self.move == "yaw_right":
+            self.stabilize_yaw_right(output_yaw)
+        elif self.move == "yaw_left":
+            self.stabilize_yaw_left(output_yaw)
+
+    def set_set_point(self, depth, pitch, roll, yaw):
+        # Set point part of each error, depth error is set point - depth and the
+        # angle errors are angle - set point
+        self.set_point_axes[:] = (depth, -pitch, -roll, -yaw)
+
+    def set_error(self, depth, pitch, roll, yaw, stamp=None):
+        # Stamp of the sensor reading behind the error, the PID bank takes its dt from it.
+        # Errors without one are stamped on arrival.
+        stamp = self.clock() if stamp is None else stamp
+        if self.param_control_rate > 0:
+            self.error_buffer.write((depth, pitch, roll, yaw), stamp)
+        else:
+            self.control_error(depth, pitch, roll, yaw, stamp)
+
+    def stabilize(self):
+
+        if not self.is_start:
+            self.start_time = self.clock()
+            self.is_start = True
+
+        self.boot_time = self.clock() - self.start_time
+        self.update_pwm()
+
+        if self.is_in_range(1,5):
+            logger.info("Set Depth")
+        if self.move == "forward" or self.move == "camera" or self.move == "last":
+            #print("Surge Yaw")
+            self.surge_yaw()
+        elif self.move in SWAY_MOVES:
+            self.depth_pitch_roll()
+            self.sway_yaw()
+        elif self.move == "surface":
+            self.surface()
+
+        self.depth_pitch_roll()
+
+    def step(self):
+        # Condition for pre calibrating
+        if not self.is_pre_calibrating:
+            self.stabilize()
+        else:
+            self.start_time = self.clock()
+            self.pre_calibrate()
+            self.movement.stop()
+
+    def set_is_start(self, is_start):
+        self.is_pre_calibrating = not is_start
+        self.last_is_start = self.clock()
+
+        # Wait for a secs to await sensor value changes / spikes after pre calibrating
+        self.is_arming = not self.is_pre_calibrating and self.start_time + self.param_arming_duration > self.clock()
+        if self.is_arming:
+            logger.info('READY TO DIVE...')
+            self.outputs.dive(True)
+            self.outputs_applied = False
+            return
+        self.outputs.dive(False)
+
+        # The control tick steps and publishes at its own rate
+        if self.param_control_rate > 0:
+            return
+
+        with self.dpr_lock:
+            self.step()
+            self.movement.publish()
+        self.outputs_applied = not self.is_pre_calibrating
+
+    def tick(self, period=None, lateness=None):
+        # One run of the fixed rate control loop, period and lateness of the timer if known
+        if period is not None:
+            self.loop_stats.add(period, lateness)
+
+        # Run the controllers once for every new error
+        version, stamp = self.error_buffer.read(self.error_snapshot)
+        if version != self.error_version:
+            self.error_version = version
+            self.control_error(*self.error_snapshot, stamp)
+
+        # Nothing is published before guidance starts or while arming
+        if self.last_is_start is None or self.is_arming:
+            return
+
+        # Stop the thrusters when guidance stops sending is_start
+        stopped = self.clock() - self.last_is_start > self.param_heartbeat_timeout
+        if stopped:
+            self.movement.stop()
+        else:
+            self.step()
+
+        self.movement.publish()
+        self.outputs_applied = not stopped and not self.is_pre_calibrating
@@ -0,0 +1,101 @@
+import numpy as np
+
+class AlphaBetaFilter():
+    def __init__(self, alpha, beta):
+        self.alpha = alpha
+        self.beta = beta
+
+        self.position = 0.0
+        self.velocity = 0.0
+        self.last_time = None
+
+    def reset(self):
+        self.velocity = 0.0
+        self.last_time = None
+
+    def update(self, measurement, stamp):
+        # The first sample and repeated stamps only set the position
+        if self.last_time is None or stamp <= self.last_time:
+            if self.last_time is None:
+                self.position = measurement
+                self.last_time = stamp
+            return self.velocity
+
+        dt = stamp - self.last_time
+        self.last_time = stamp
+
+        # Predict with constant velocity, correct with the residual
+        self.position += self.velocity * dt
+        residual = measurement - self.position
+        self.position += self.alpha * residual
+        self.velocity += self.beta * residual / dt
+        return self.velocity
+
+class RecursiveLeastSquares():
+    def __init__(self, parameters, forgetting, covariance, max_covariance=1e6):
+        self.forgetting = forgetting
+        self.max_covariance = max_covariance
+        self.initial_covariance = np.eye(len(parameters)) * covariance
+
+        self.parameters = np.array(parameters, dtype=float)
+        self.covariance = self.initial_covariance.copy()
+
+        # Preallocated buffers and the views used for the outer product
+        self.regressor = np.zeros(len(parameters))
+        self.projected = np.zeros(len(parameters))
+        self.gain = np.zeros(len(parameters))
+        self.step = np.zeros(len(parameters))
+        self.correction = np.zeros(self.covariance.shape)
+        self.gain_column = self.gain[:, None]
+        self.projected_row = self.projected[None, :]
+
+    def reset(self):
+        self.covariance[:] = self.initial_covariance
+
+    def update(self, measurement):
+        # Fill self.regressor first, the update works in the buffers above and makes no
+        # temporary arrays, only scalars
+        np.dot(self.covariance, self.regressor, out=self.projected)
+        np.multiply(self.projected, 1 / (self.forgetting + np.dot(self.regressor, self.projected)), out=self.gain)
+        np.multiply(self.gain, measurement - np.dot(self.parameters, self.regressor), out=self.step)
+        self.parameters += self.step
+
+        # Forgetting only while the covariance is bounded, so it does not blow up without excitation
+        np.multiply(self.gain_column, self.projected_row, out=self.correction)
+        self.covariance -= self.correction
+        if np.trace(self.covariance) < self.max_covariance:
+            self.covariance /= self.forgetting
+        return self.parameters
+
+class TrimEstimator():
+    def __init__(self, gain, forgetting, covariance, output_limit):
+        # Error acceleration of each axis = -gain * output + bias - drag * rate, the gain is known
+        # and the bias (net buoyancy, pitch and roll trim) and the linear drag are learned
+        self.gain = np.array(gain, dtype=float)
+        self.output_limit = output_limit
+        self.axes = [RecursiveLeastSquares([0.0, 0.0], forgetting, covariance) for _ in self.gain]
+
+        self.last_rate = np.zeros(len(self.gain))
+        self.feed_forward = np.zeros(len(self.gain))
+        self.last_time = None
+
+    def restart(self):
+        # Skip the next sample, the thrusters were not driven by the outputs in between
+        self.last_time = None
+
+    def update(self, rate, output, stamp):
+        # Output is what was applied since the last sample, it explains the change of rate
+        if self.last_time is not None and stamp > self.last_time:
+            dt = stamp - self.last_time
+            for i, axis in enumerate(self.axes):
+                axis.regressor[0] = dt
+                axis.regressor[1] = -self.last_rate[i] * dt
+                bias, drag = axis.update(rate[i] - self.last_rate[i] + self.gain[i] * output[i] * dt)
+
+                # Output that holds the bias, the PID is left with the rest
+                self.feed_forward[i] = min(max(bias / self.gain[i], -self.output_limit), self.output_limit)
+
+        if self.last_time is None or stamp > self.last_time:
+            self.last_time = stamp
+            self.last_rate[:] = rate
+        return self.feed_forward
@@ -0,0 +1,71 @@
+import numpy as np
+
+AXES = ('depth', 'pitch', 'roll', 'yaw')
+
+def apply_gains(gains, entry):
+    # Entry maps an axis name to [kp, ki, kd], axes that are not named keep their gains
+    for axis, values in (entry or {}).items():
+        if axis in AXES:
+            gains[:, AXES.index(axis)] = values
+
+class GainSchedule():
+    def __init__(self, table, kp, ki, kd, transition=0.0, resolution=0.05):
+        # Gains of every (move mode, depth band) cell, moves without their own entry use 'default'
+        modes = table.get('modes') or {}
+        default = table.get('default') or {}
+        self.modes = ['default'] + sorted(mode for mode in modes if mode != 'default')
+        self.mode_index = {mode: i for i, mode in enumerate(self.modes)}
+
+        # Depth band b holds depth_bands[b - 1] <= depth < depth_bands[b], the bands are
+        # metres below the surface
+        edges = np.asarray(table.get('depth_bands', []), dtype=float)
+        bands = len(edges) + 1
+
+        base = np.array([kp, ki, kd], dtype=float)
+        apply_gains(base, default)
+        self.gains = np.empty((len(self.modes), bands, 3, len(AXES)))
+        for i, mode in enumerate(self.modes):
+            entry = modes.get(mode) or {}
+            for band in range(bands):
+                gains = base.copy()
+                apply_gains(gains, (default.get('bands') or [{}] * bands)[band])
+                apply_gains(gains, entry)
+                apply_gains(gains, (entry.get('bands') or [{}] * bands)[band])
+                self.gains[i, band] = gains
+        self.gains.setflags(write=False)
+
+        # Band of every depth cell, a depth is looked up without searching the edges
+        self.resolution = resolution
+        cells = np.arange(0, (edges.max() if len(edges) else 0) + 2 * resolution, resolution)
+        self.band_lut = np.searchsorted(edges, cells, side='right')
+
+        # Gains are blended linearly from the old cell to the new one over the transition time
+        self.transition = transition
+        self.key = (0, 0)
+        self.start = self.gains[self.key].copy()
+        self.target = self.gains[self.key]
+        self.current = self.gains[self.key].copy()
+        self.switch_time = None
+
+    def index(self, mode, depth):
+        # Depth of the sensor, z up and negative underwater like the depth set point
+        cell = min(max(int(-depth / self.resolution), 0), len(self.band_lut) - 1)
+        return self.mode_index.get(mode, 0), self.band_lut[cell]
+
+    def update(self, mode, depth, stamp):
+        key = self.index(mode, depth)
+        if key != self.key:
+            # Start from the gains in use, a switch in the middle of a blend stays continuous
+            self.start[:] = self.current
+            self.target = self.gains[key]
+            self.key = key
+            self.switch_time = stamp
+
+        fraction = 1.0
+        if self.transition > 0 and self.switch_time is not None:
+            fraction = min(max((stamp - self.switch_time) / self.transition, 0.0), 1.0)
+
+        np.subtract(self.target, self.start, out=self.current)
+        self.current *= fraction
+        self.current += self.start
+        return self.current
@@ -0,0 +1,166 @@
+import logging
+import math
+from types import SimpleNamespace
+from .clock import monotonic_clock
+
+logger = logging.getLogger(__name__)
+
+class GuidanceOutputs():
+    # Outputs of GuidanceCore, these do nothing, node_guidance_last publishes them
+    def is_start(self, is_start):
+        pass
+
+    def set_point(self, set_point):
+        pass
+
+    def move(self, move):
+        pass
+
+    def tau(self, tau):
+        pass
+
+    def constrain_pwm(self, constrain_pwm):
+        pass
+
+# Timed moves of node_guidance_last, seconds after the delay. tau is published with the
+# move and a step with until_flag stops when that flag arrives (3 starts the bucket search).
+MISSION_STEPS = [
+    {'start': 3, 'end': 22, 'move': 'forward', 'tau': -0.0483}, # 20 detik
+    {'start': 23, 'end': 27, 'move': 'yaw_left'}, # 4 detik
+    {'start': 28, 'end': 31, 'move': 'forward', 'tau': -0.0483}, # 3 detik
+    {'start': 32, 'end': 35, 'move': 'yaw_right'}, # 3 detik
+    {'start': 36, 'end': 80, 'move': 'forward', 'tau': -0.05, 'until_flag': 3}, # 20 detik
+]
+
+# Mission of node_guidance_last
+class GuidanceCore():
+    def __init__(self, delay, duration, clock=monotonic_clock, outputs=None, set_point=None, steps=None):
+        self.clock = clock
+        self.outputs = outputs if outputs is not None else GuidanceOutputs()
+        self.param_delay = delay
+        self.param_duration = duration
+        self.steps = steps if steps is not None else MISSION_STEPS
+
+        self.is_start = False
+        self.boot_time = 0
+        self.start_time = 0
+        self.bucket = False
+        self.bucket_detected = False
+        self.flag = 0
+        self.yaw = -101
+        self.dive = False
+        self.object_type = ""
+        self.x_difference = 0
+
+        self.start = 0
+        self.elapsed_time = 0
+        self.delay = 3
+        self.start_delay = False
+
+        # Filled in place, node_guidance_last passes its SetPoint
+        self.set_point = set_point if set_point is not None else SimpleNamespace(roll=0, pitch=0, yaw=0, sway=0, depth=0)
+        self.set_point.roll = 0 #y
+        self.set_point.pitch = 0 #x
+        self.set_point.yaw = self.yaw
+        self.set_point.depth = -0.25
+        self.towards_bucket = False
+
+    def set_heading(self, heading):
+        # Change yaw set point from the given value
+        logger.info('Set Yaw %s', heading)
+        self.set_point.yaw = heading
+
+    def set_object_difference(self, object_type, x_difference):
+        self.object_type = object_type
+        self.x_difference = x_difference
+
+    def set_dive(self, dive):
+        self.dive = dive
+
+    def set_flag(self, flag):
+        self.flag = flag
+
+    def set_bucket(self, bucket):
+        self.bucket = bucket
+        if self.bucket:
+            self.bucket_detected = True
+
+    def is_in_range(self, start_time, end_time):
+        return (self.boot_time > start_time + self.param_delay and end_time is None) or (start_time + self.param_delay) < self.boot_time < (end_time + self.param_delay)
+
+    def update_elapsed_time(self):
+        # Ticks of the 1 s rospy.Timer the node sampled the surface delay with, the first
+        # one a second after the delay started
+        if self.start_delay:
+            self.elapsed_time = math.floor(self.clock() - self.start)
+
+    def stop_auv(self):
+        # Stop AUV
+        logger.info('STOP')
+        self.outputs.is_start(False)
+
+    def start_auv(self):
+        # Start AUV mission
+        self.outputs.set_point(self.set_point)
+        self.outputs.is_start(True)
+
+        if not self.dive:
+
+            for step in self.steps:
+                if self.is_in_range(step['start'], step['end']) and self.flag != step.get('until_flag'):
+                    logger.info(step['move'])
+                    self.outputs.move(step['move'])
+                    if step.get('tau') is not None:
+                        self.outputs.tau(step['tau'])
+
+            if self.flag == 3 and self.bucket_detected == False:
+                if self.object_type == "Bucket":
+                    logger.info("Centering Bucket")
+                    self.outputs.move("camera")
+                    self.towards_bucket = True
+                elif self.towards_bucket == False:
+                    logger.info("Search for Bucket")
+                    self.outputs.move("right")
+
+            if self.bucket_detected == True:
+                logger.info("Surface")
+                self.outputs.move("surface")
+                self.update_elapsed_time()
+                if self.start_delay == False:
+                    self.start = self.clock()
+                    self.start_delay = True
+                elif self.elapsed_time < self.delay:
+                    # The node read each tick just after it, so its elapsed_time <= delay
+                    # held until the tick at delay seconds
+                    pass
+                else:
+                    self.set_point.depth = 0.2
+
+            # Ramp the constrain PWM of thrusters 9 and 10 from 1500 down to 1400
+            for second in range(6, 16):
+                if self.is_in_range(second, second + 1):
+                    self.outputs.constrain_pwm(1500 - (second - 6) * 10)
+            if self.is_in_range(16, None):
+                self.outputs.constrain_pwm(1400)
+
+    def set_is_start(self, is_start):
+        if is_start:
+            # Set start time
+            if not self.is_start:
+                self.start_time = self.clock()
+                self.is_start = True
+
+            # Generate boot time
+            self.boot_time = self.clock() - self.start_time
+
+            # Wait for a secs to tell other nodes (accumulator & control) to calibrate
+            if self.boot_time < self.param_delay:
+                logger.info('STARTING...')
+                self.outputs.is_start(False)
+                return
+
+            # Timer condition
+            if self.boot_time < self.param_duration if self.param_duration >= 0 else True:
+                self.start_auv()
+            else:
+                self.stop_auv()
@@ -0,0 +1,388 @@
+import math
+import numpy as np
+from .allocation import DPRController, HORIZONTAL, PWM_SCALE, VERTICAL, split_to_thrusters
+from .simulator import GRAVITY, SIMULATOR_DEFAULTS, thruster_geometry, thruster_thrust
+
+# Streams of a recorded run and their values: pwm_actuator, depth of /rosserial/sensor,
+# roll and pitch of /imu (degrees) and /filterYaw (degrees)
+STREAMS = {'pwm': 10, 'depth': 1, 'attitude': 2, 'yaw': 1}
+
+# Columns of the resampled grid
+TIME = 0
+PWM = slice(1, 11)
+DEPTH, ROLL, PITCH, YAW = 11, 12, 13, 14
+GRID_COLUMNS = 15
+STREAM_COLUMNS = {'pwm': PWM, 'depth': slice(DEPTH, DEPTH + 1), 'attitude': slice(ROLL, PITCH + 1), 'yaw': slice(YAW, YAW + 1)}
+
+# Identified axes: grid column, body axis of the simulator (surge, sway, heave, roll, pitch,
+# yaw), thrusters that drive it and whether a restoring moment pulls it back to level
+IDENTIFIED_AXES = {
+    'depth': (DEPTH, 2, VERTICAL, False),
+    'roll': (ROLL, 3, VERTICAL, True),
+    'pitch': (PITCH, 4, VERTICAL, True),
+    'yaw': (YAW, 5, HORIZONTAL, False),
+}
+
+# Largest condition number of the normal equations, with every column scaled to unit
+# length, that the fit takes as identified
+MAX_CONDITION = 1e4
+
+# Chunks a stream buffer may grow to while another stream lags behind
+MAX_GROWTH = 16
+
+def imu_angles(x, y, z, w):
+    # Roll and pitch in degrees as node_accumulator computes them from /imu, of one
+    # orientation or of arrays of them
+    roll = np.degrees(np.arctan2(2.0 * (y * z + w * x), w * w - x * x - y * y + z * z))
+    pitch = np.degrees(np.arcsin(np.clip(-2.0 * (x * z - w * y), -1.0, 1.0)))
+    return roll, pitch
+
+class StreamBuffer():
+    # Preallocated samples of one stream between two flushes
+    def __init__(self, capacity, width):
+        self.stamps = np.empty(capacity)
+        self.values = np.empty((capacity, width))
+        self.count = 0
+
+    def room(self):
+        return len(self.stamps) - self.count
+
+    def grow(self, size):
+        self.stamps = np.concatenate([self.stamps[:self.count], np.empty(size)])
+        self.values = np.concatenate([self.values[:self.count], np.empty((size, self.values.shape[1]))])
+
+    def append(self, stamps, values):
+        n = len(stamps)
+        self.stamps[self.count:self.count + n] = stamps
+        self.values[self.count:self.count + n] = values
+        self.count += n
+
+    def keep_after(self, horizon):
+        # Drop the samples the grid is done with, the last one before the horizon still
+        # holds its value for the next grid points
+        first = max(np.searchsorted(self.stamps[:self.count], horizon, side='right') - 1, 0)
+        kept = self.count - first
+        self.stamps[:kept] = self.stamps[first:self.count]
+        self.values[:kept] = self.values[first:self.count]
+        self.count = kept
+
+class SystemIdentification():
+    # Heave, roll, pitch and yaw dynamics with the thrust of every thruster, fitted by least
+    # squares over a run of any length. Streams are resampled on a fixed rate grid in chunks
+    # and every chunk only adds to the normal equations, so memory does not grow with the run.
+    #
+    # acceleration = sum(gain_i * wrench_i) - damping * rate - quadratic_damping * rate * |rate|
+    #                - stiffness * sin(angle) + offset
+    # where wrench_i is the nominal wrench of thruster i on the axis from its PWM.
+    def __init__(self, simulator_config=None, rate=20.0, span=2, chunk_size=4096, max_age=0.2):
+        self.config = dict(SIMULATOR_DEFAULTS, **(simulator_config or {}))
+        self.geometry = thruster_geometry(self.config['lever_x'], self.config['lever_y'], self.config['yaw_arm'])
+        self.rate = rate
+        self.span = span
+        self.chunk_size = chunk_size
+        self.max_age = max_age
+        # Savitzky-Golay filters of the value, rate and acceleration of the middle row from a
+        # quadratic over 2 * span + 1 rows, the thrust is smoothed like the signals
+        k = np.arange(-span, span + 1, dtype=float)
+        value_filter, rate_filter, curve_filter = np.linalg.pinv(np.vander(k, 3, increasing=True))
+        self.value_filter = value_filter
+        self.rate_filter = rate_filter * rate
+        self.acceleration_filter = 2 * curve_filter * rate ** 2
+
+        self.buffers = {stream: StreamBuffer(chunk_size, width) for stream, width in STREAMS.items()}
+        self.latest_stamp = -math.inf
+        # Intervals and seconds of every stream over all runs, the source rate the grid may not exceed
+        self.stream_intervals = {stream: 0 for stream in STREAMS}
+        self.stream_seconds = {stream: 0.0 for stream in STREAMS}
+        self.new_run()
+
+        # Normal equations of every axis
+        self.thrusters = {}
+        self.normal = {}
+        self.moment = {}
+        self.energy = {}
+        self.total = {}
+        self.samples = {}
+        for axis, (_, body, thrusters, restoring) in IDENTIFIED_AXES.items():
+            self.thrusters[axis] = thrusters[self.geometry[body, thrusters] != 0]
+            size = len(self.thrusters[axis]) + 3 + restoring
+            self.normal[axis] = np.zeros((size, size))
+            self.moment[axis] = np.zeros(size)
+            self.energy[axis] = 0.0
+            self.total[axis] = 0.0
+            self.samples[axis] = 0
+
+    def new_run(self):
+        # Streams of another recorded run, the normal equations keep the runs before it
+        if self.latest_stamp > -math.inf:
+            self.flush()
+        for buffer in self.buffers.values():
+            buffer.count = 0
+        self.latest_stamp = -math.inf
+        self.grid_start = None
+        self.grid_index = 0
+        # Last rows of the previous chunk, the derivatives of a row need its neighbours
+        self.tail = np.empty((0, GRID_COLUMNS))
+        self.tail_valid = np.empty(0, dtype=bool)
+
+        # /filterYaw wraps at 180 degrees, it is unwrapped as it arrives
+        self.yaw_raw = None
+        self.yaw = 0.0
+        self.last_stream_stamp = {stream: None for stream in STREAMS}
+
+    def unwrap_yaw(self, yaw):
+        yaw = np.asarray(yaw, dtype=float).ravel()
+        if self.yaw_raw is None:
+            self.yaw_raw = self.yaw = yaw[0]
+        steps = (np.diff(yaw, prepend=self.yaw_raw) + 180) % 360 - 180
+        unwrapped = self.yaw + np.cumsum(steps)
+        self.yaw_raw = yaw[-1]
+        self.yaw = unwrapped[-1]
+        return unwrapped[:, None]
+
+    def add(self, stream, stamps, values):
+        # Samples of one stream in time order, a single sample or arrays of them
+        stamps = np.atleast_1d(np.asarray(stamps, dtype=float))
+        values = np.asarray(values, dtype=float).reshape(len(stamps), STREAMS[stream])
+        if len(stamps) == 0:
+            return
+        if stream == 'yaw':
+            values = self.unwrap_yaw(values)
+
+        last = self.last_stream_stamp[stream]
+        self.stream_intervals[stream] += len(stamps) - (last is None)
+        self.stream_seconds[stream] += stamps[-1] - (stamps[0] if last is None else last)
+        self.last_stream_stamp[stream] = stamps[-1]
+
+        buffer = self.buffers[stream]
+        for start in range(0, len(stamps), self.chunk_size // 2):
+            piece = slice(start, start + self.chunk_size // 2)
+            n = len(stamps[piece])
+            if buffer.room() < n:
+                # Up to where every stream is known. A fast stream that runs ahead of a slow one
+                # keeps its samples in a larger buffer, the rows past the slow stream would be
+                # left out for want of its samples. Only a stream that went silent for
+                # MAX_GROWTH chunks lets the grid run on to the latest sample.
+                self.flush(min(b.stamps[b.count - 1] for b in self.buffers.values() if b.count))
+                if buffer.room() < n and len(buffer.stamps) < MAX_GROWTH * self.chunk_size:
+                    buffer.grow(max(n, len(buffer.stamps)))
+                elif buffer.room() < n:
+                    self.flush(self.latest_stamp)
+            buffer.append(stamps[piece], values[piece])
+            self.latest_stamp = max(self.latest_stamp, stamps[piece][-1])
+
+    def flush(self, horizon=None):
+        # Resample every stream with a zero order hold on the grid points before the horizon
+        if horizon is None:
+            horizon = self.latest_stamp + 0.5 / self.rate
+        if self.grid_start is None and all(buffer.count for buffer in self.buffers.values()):
+            self.grid_start = max(buffer.stamps[0] for buffer in self.buffers.values())
+        if self.grid_start is not None:
+            end = int(math.ceil((horizon - self.grid_start) * self.rate))
+            while self.grid_index < end:
+                ticks = np.arange(self.grid_index, min(end, self.grid_index + self.chunk_size))
+                self.grid_index = ticks[-1] + 1
+                self.resample(self.grid_start + ticks / self.rate)
+        for buffer in self.buffers.values():
+            buffer.keep_after(horizon)
+
+    def resample(self, grid):
+        rows = np.empty((len(grid), GRID_COLUMNS))
+        valid = np.ones(len(grid), dtype=bool)
+        rows[:, TIME] = grid
+        for stream, buffer in self.buffers.items():
+            stamps = buffer.stamps[:buffer.count]
+            index = np.searchsorted(stamps, grid, side='right') - 1
+            held = np.maximum(index, 0)
+            rows[:, STREAM_COLUMNS[stream]] = buffer.values[held]
+            valid &= (index >= 0) & (grid - stamps[held] <= self.max_age)
+        self.process(rows, valid)
+
+    def process(self, rows, valid):
+        rows = np.concatenate([self.tail, rows])
+        valid = np.concatenate([self.tail_valid, valid])
+        s = self.span
+        if len(rows) <= 2 * s:
+            self.tail, self.tail_valid = rows, valid
+            return
+        self.tail, self.tail_valid = rows[-2 * s:], valid[-2 * s:]
+
+        # Rate and acceleration of the middle row of every window from a quadratic fit over
+        # the window (Savitzky-Golay), a row counts when its whole window is valid
+        window = np.lib.stride_tricks.sliding_window_view(valid, 2 * s + 1).all(axis=1)
+        force = np.lib.stride_tricks.sliding_window_view(thruster_thrust(rows[:, PWM], self.config['thrust_per_us'], self.config['thrust_deadband']), 2 * s + 1, axis=0) @ self.value_filter
+
+        for axis, (column, body, _, restoring) in IDENTIFIED_AXES.items():
+            signal = rows[:, column] if axis == 'depth' else np.radians(rows[:, column])
+            windows = np.lib.stride_tricks.sliding_window_view(signal, 2 * s + 1)
+            now = windows @ self.value_filter
+            velocity = windows @ self.rate_filter
+            acceleration = windows @ self.acceleration_filter
+
+            thrusters = self.thrusters[axis]
+            features = [force[:, thrusters] * self.geometry[body, thrusters], -velocity[:, None], -(velocity * np.abs(velocity))[:, None]]
+            if restoring:
+                features.append(-np.sin(now)[:, None])
+            features.append(np.ones((len(now), 1)))
+            X = np.hstack(features)[window]
+            y = acceleration[window]
+
+            self.normal[axis] += X.T @ X
+            self.moment[axis] += X.T @ y
+            self.energy[axis] += y @ y
+            self.total[axis] += y.sum()
+            self.samples[axis] += len(y)
+
+    def source_rate(self):
+        # Rate of the slowest stream, resampling above it only repeats samples
+        rates = [self.stream_intervals[stream] / self.stream_seconds[stream] for stream in STREAMS if self.stream_seconds[stream] > 0]
+        return min(rates) if rates else math.nan
+
+    def fit(self):
+        # Parameters of every axis and how much of the acceleration they explain. When the
+        # thrusters of an axis always run in the same proportion (the four vertical thrusters
+        # under DPRController span three directions), their gains cannot be told apart and
+        # one gain is fitted for all of them. Values that are not physical are listed in
+        # problems, the models below leave those axes out.
+        self.flush()
+        source_rate = self.source_rate()
+        result = {}
+        for axis, (_, body, _, restoring) in IDENTIFIED_AXES.items():
+            n = self.samples[axis]
+            thrusters = self.thrusters[axis]
+            normal, moment = self.normal[axis], self.moment[axis]
+            if n <= normal.shape[0]:
+                result[axis] = None
+                continue
+
+            # A thruster that never ran has no gain and no column
+            excited = np.diag(normal)[:len(thrusters)] > 0
+            columns = np.concatenate([excited, np.ones(normal.shape[0] - len(thrusters), dtype=bool)])
+            normal, moment = normal[np.ix_(columns, columns)], moment[columns]
+            gain_count = int(excited.sum())
+
+            shared = False
+            condition = scaled_condition(normal)
+            if condition > MAX_CONDITION and gain_count > 1:
+                # Sum the thruster columns into one
+                merge = np.zeros((len(moment), len(moment) - gain_count + 1))
+                merge[:gain_count, 0] = 1
+                merge[gain_count:, 1:] = np.eye(len(moment) - gain_count)
+                normal, moment = merge.T @ normal @ merge, merge.T @ moment
+                condition = scaled_condition(normal)
+                shared = True
+
+            theta = np.linalg.lstsq(normal, moment, rcond=None)[0]
+            residual = self.energy[axis] - 2 * theta @ moment + theta @ normal @ theta
+            variance = self.energy[axis] - self.total[axis] ** 2 / n
+            gains = np.full(10, np.nan)
+            gains[thrusters[excited]] = theta[0] if shared else theta[:gain_count]
+            rest = theta[1:] if shared else theta[gain_count:]
+            fit = {
+                'gains': gains,
+                'damping': rest[0],
+                'quadratic_damping': rest[1],
+                'stiffness': rest[2] if restoring else 0.0,
+                'offset': rest[-1],
+                'samples': n,
+                'r2': 1 - residual / variance if variance > 0 else math.nan,
+                'condition': condition,
+                'shared_gain': shared,
+            }
+            fit['problems'] = self.problems(fit, body, restoring, source_rate)
+            result[axis] = fit
+        return result
+
+    def problems(self, fit, body, restoring, source_rate):
+        problems = []
+        if fit['condition'] > MAX_CONDITION:
+            problems.append(f'not identifiable, condition {fit["condition"]:.1e}')
+        gains = fit['gains'][~np.isnan(fit['gains'])]
+        if np.any(gains <= 0):
+            problems.append('thruster gain <= 0')
+        elif gains.size:
+            rigid = ([self.config['mass']] * 3 + list(self.config['inertia']))[body]
+            if 1 / gains.mean() < rigid:
+                problems.append('added mass < 0')
+        if fit['damping'] < 0:
+            problems.append('linear damping < 0')
+        if fit['quadratic_damping'] < 0:
+            problems.append('quadratic damping < 0')
+        if restoring and fit['stiffness'] < 0:
+            problems.append('restoring stiffness < 0')
+        if self.rate > 1.05 * source_rate:
+            problems.append(f'grid rate {self.rate:g} Hz above the source rate {source_rate:.1f} Hz')
+        return problems
+
+def scaled_condition(normal):
+    # Condition number of the normal equations with every column scaled to unit length
+    scale = np.sqrt(np.diag(normal))
+    if np.any(scale == 0):
+        return math.inf
+    eigenvalues = np.linalg.eigvalsh(normal / np.outer(scale, scale))
+    return eigenvalues[-1] / eigenvalues[0] if eigenvalues[0] > 0 else math.inf
+
+def simulator_model(result, simulator_config=None):
+    # Simulator parameters of a fit. Thrust and mass only show up as their ratio, so the
+    # thrust per us stays and the added mass takes the difference, thruster gains are
+    # relative to the mean of their axis.
+    config = dict(SIMULATOR_DEFAULTS, **(simulator_config or {}))
+    added_mass = list(config['added_mass'])
+    linear_drag = list(config['linear_drag'])
+    quadratic_drag = list(config['quadratic_drag'])
+    rigid = [config['mass']] * 3 + list(config['inertia'])
+    thruster_gains = np.zeros(10)
+    thruster_count = np.zeros(10)
+    lift = []
+    model = {}
+    for axis, fit in result.items():
+        if fit is None or fit['problems']:
+            continue
+        _, body, _, restoring = IDENTIFIED_AXES[axis]
+        gains = fit['gains']
+        identified = ~np.isnan(gains)
+        mean_gain = gains[identified].mean()
+        if mean_gain <= 0:
+            continue
+        mass = 1 / mean_gain
+        added_mass[body] = mass - rigid[body]
+        linear_drag[body] = fit['damping'] * mass
+        quadratic_drag[body] = fit['quadratic_damping'] * mass
+        thruster_gains[identified] += gains[identified] / mean_gain
+        thruster_count[identified] += 1
+        if restoring:
+            lift.append(fit['stiffness'] * mass)
+        if axis == 'depth':
+            model['buoyancy'] = config['mass'] * GRAVITY + fit['offset'] * mass
+
+    model['added_mass'] = added_mass
+    model['linear_drag'] = linear_drag
+    model['quadratic_drag'] = quadratic_drag
+    model['thruster_gains'] = np.where(thruster_count > 0, thruster_gains / np.maximum(thruster_count, 1), 1.0).tolist()
+    if lift:
+        model['metacentric_height'] = float(np.mean(lift) / model.get('buoyancy', config['buoyancy']))
+    return {key: ([float(v) for v in value] if isinstance(value, list) else float(value)) for key, value in model.items()}
+
+def control_model(result, simulator_config=None):
+    # mpc_model_gain and mpc_model_damping of node_control: error acceleration per unit of the
+    # depth, pitch and roll outputs as DPRController turns them into thrust, and the damping
+    config = dict(SIMULATOR_DEFAULTS, **(simulator_config or {}))
+    geometry = thruster_geometry(config['lever_x'], config['lever_y'], config['yaw_arm'])
+    dpr = DPRController(0.5, 0.5)
+    thrust = np.zeros(10)
+    model_gain = []
+    model_damping = []
+    for axis, (output_depth, output_pitch, output_roll) in zip(('depth', 'pitch', 'roll'), np.eye(3)):
+        fit = result.get(axis)
+        if fit is None or fit['problems']:
+            return {}
+        _, body, _, _ = IDENTIFIED_AXES[axis]
+        # node_control feeds DPRController (depth, pitch, -roll), vertical PWM is 1 us per unit
+        split_to_thrusters(np.zeros(4), dpr.control(output_depth, output_pitch, -output_roll), thrust)
+        force = PWM_SCALE * thrust * config['thrust_per_us']
+        acceleration = np.nansum(fit['gains'] * geometry[body] * force)
+        # The depth error is set point - depth, the angle errors are angle - set point in degrees
+        error_acceleration = -acceleration if axis == 'depth' else math.degrees(acceleration)
+        model_gain.append(float(-error_acceleration))
+        model_damping.append(float(fit['damping']))
+    return {'mpc_model_gain': model_gain, 'mpc_model_damping': model_damping}
@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+import numpy as np
+from .clock import ManualClock
+from .control import ControlCore, ControlOutputs
+from .guidance import GuidanceCore, GuidanceOutputs
+from .navigation import NavigationCore
+from .perception import select_object
+from .simulator import Simulator
+
+# Move modes of node_control, logged by index
+MOVES = ['stop', 'forward', 'left', 'right', 'last', 'yaw_left', 'yaw_right', 'camera', 'surface']
+
+class MissionControlOutputs(ControlOutputs):
+    def __init__(self, mission):
+        self.mission = mission
+
+    def pwm(self, pwm):
+        self.mission.simulator.set_pwm(pwm)
+
+    def dive(self, dive):
+        self.mission.guidance.set_dive(dive)
+
+class MissionGuidanceOutputs(GuidanceOutputs):
+    def __init__(self, mission):
+        self.mission = mission
+
+    def is_start(self, is_start):
+        # Subscribers of is_start in the order of node_pipeline: accumulator, navigation, control
+        mission = self.mission
+        if is_start:
+            mission.navigation.set_sensor(*mission.sensor)
+        mission.navigation.set_is_start(is_start)
+        mission.control.set_is_start(is_start)
+
+    def set_point(self, set_point):
+        self.mission.navigation.set_set_point(set_point.depth, set_point.pitch, set_point.roll, set_point.yaw)
+        self.mission.control.set_set_point(set_point.depth, set_point.pitch, set_point.roll, set_point.yaw)
+
+    def move(self, move):
+        self.mission.control.set_move(move)
+
+    def tau(self, tau):
+        self.mission.control.set_tau(tau)
+
+    def constrain_pwm(self, constrain_pwm):
+        self.mission.control.set_constrain_pwm(constrain_pwm)
+
+# node_guidance_last, node_accumulator, node_navigation and node_control against the
+# simulator, without ROS and as fast as the CPU allows
+class SimulatedMission():
+    def __init__(self, control_config=None, simulator_config=None, delay=4, duration=-1, arming_duration=1, rate=10, dt=0.01, seed=0, steps=None):
+        # Arduino is_start rate of the guidance loop and the physics step
+        self.rate = rate
+        self.dt = dt
+        self.clock = ManualClock()
+        self.simulator = Simulator(simulator_config, seed)
+
+        self.control = ControlCore(dict(control_config or {}, arming_duration=arming_duration), self.clock, MissionControlOutputs(self))
+        self.navigation = NavigationCore(self.clock, self.publish_error)
+        self.guidance = GuidanceCore(delay, duration, self.clock, MissionGuidanceOutputs(self), steps=steps)
+        # Depth, pitch, roll and yaw of the accumulator
+        self.sensor = (0.0, 0.0, 0.0, 0.0)
+
+        # Physics steps per is_start message and per control tick
+        self.steps = max(int(round(1.0 / self.rate / self.dt)), 1)
+        self.control_steps = int(round(1.0 / self.control.param_control_rate / self.dt)) if self.control.param_control_rate > 0 else 0
+        self.step_count = 0
+
+    def publish_error(self, error, is_stable, now):
+        # The sensor is read at the same instant
+        self.control.set_error(error.depth, error.pitch, error.roll, error.yaw, now)
+
+    def update_sensors(self):
+        simulator = self.simulator
+        depth = simulator.depth()
+        roll, pitch, yaw = simulator.angles()
+        self.sensor = (depth, pitch, roll, yaw)
+
+        if self.control.uses_arduino_sensor:
+            self.control.set_arduino_sensor(depth, simulator.load_voltage())
+
+        _, _, object_type, x_difference = select_object(simulator.detections())
+        self.control.set_object_difference(object_type, x_difference)
+        self.guidance.set_object_difference(object_type, x_difference)
+        self.guidance.set_bucket(simulator.bucket_detected())
+
+    def advance(self):
+        # Physics and the control loop up to the next is_start message
+        for _ in range(self.steps):
+            self.simulator.step(self.dt)
+            self.clock.advance(self.dt)
+            self.step_count += 1
+            if self.control_steps and self.step_count % self.control_steps == 0:
+                self.control.tick()
+        self.update_sensors()
+
+    def run(self, duration):
+        # Log of every guidance tick: time, position, attitude (degrees), body velocity,
+        # error, set point (depth, yaw), PWM and move index
+        ticks = int(round(duration * self.rate))
+        log = SimpleNamespace(
+            time=np.zeros(ticks),
+            position=np.zeros((ticks, 3)),
+            attitude=np.zeros((ticks, 3)),
+            velocity=np.zeros((ticks, 6)),
+            error=np.zeros((ticks, 4)),
+            set_point=np.zeros((ticks, 2)),
+            pwm=np.zeros((ticks, 10)),
+            move=np.zeros(ticks, dtype=np.int8),
+        )
+
+        for tick in range(ticks):
+            self.advance()
+            self.guidance.set_is_start(True)
+
+            log.time[tick] = self.clock()
+            log.position[tick] = self.simulator.position
+            log.attitude[tick] = np.degrees(self.simulator.attitude)
+            log.velocity[tick] = self.simulator.velocity
+            error = self.navigation.error
+            log.error[tick] = (error.depth, error.pitch, error.roll, error.yaw)
+            log.set_point[tick] = (self.guidance.set_point.depth, self.guidance.set_point.yaw)
+            log.pwm[tick] = self.simulator.pwm
+            log.move[tick] = MOVES.index(self.control.move) if self.control.move in MOVES else -1
+        return log
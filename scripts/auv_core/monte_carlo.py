@@ -0,0 +1,124 @@
+import math
+import numpy as np
+from .mission import SimulatedMission
+from .simulator import SIMULATOR_DEFAULTS
+
+# Spread of the scenarios, every run draws a current, sensor noise, buoyancy and start heading
+MONTE_CARLO_DEFAULTS = {
+    'max_current': 0.1, # m/s, any direction
+    'depth_noise': [0.0, 0.02], # m
+    'angle_noise': [0.0, 1.0], # degrees
+    'buoyancy_std': 5.0, # N around the buoyancy of the simulator
+    'heading_range': 10.0, # degrees around the start yaw of the simulator
+}
+
+# Columns of the result of every run: seed, the scenario and the outcome of the mission
+SCENARIO_FIELDS = ['current_speed', 'current_direction', 'depth_noise', 'angle_noise', 'buoyancy', 'heading']
+OUTCOME_FIELDS = ['gate', 'time_to_gate', 'bucket', 'time_to_bucket', 'x', 'y', 'depth', 'max_pitch', 'max_roll']
+FIELDS = ['seed'] + SCENARIO_FIELDS + OUTCOME_FIELDS
+
+def sample_scenarios(runs, seed=0, spread=None, simulator_config=None):
+    spread = dict(MONTE_CARLO_DEFAULTS, **(spread or {}))
+    simulator_config = dict(SIMULATOR_DEFAULTS, **(simulator_config or {}))
+    rng = np.random.default_rng(seed)
+
+    scenarios = np.empty((runs, len(SCENARIO_FIELDS)))
+    scenarios[:, 0] = rng.uniform(0, spread['max_current'], runs)
+    scenarios[:, 1] = rng.uniform(-180, 180, runs)
+    scenarios[:, 2] = rng.uniform(*spread['depth_noise'], runs)
+    scenarios[:, 3] = rng.uniform(*spread['angle_noise'], runs)
+    scenarios[:, 4] = rng.normal(simulator_config['buoyancy'], spread['buoyancy_std'], runs)
+    scenarios[:, 5] = simulator_config['initial_attitude'][2] + rng.uniform(-1, 1, runs) * spread['heading_range']
+    return scenarios
+
+def scenario_config(simulator_config, scenario):
+    current_speed, current_direction, depth_noise, angle_noise, buoyancy, heading = scenario.tolist()
+    config = dict(SIMULATOR_DEFAULTS, **(simulator_config or {}))
+    direction = math.radians(current_direction)
+    roll, pitch, _ = config['initial_attitude']
+    return dict(
+        config,
+        current=[current_speed * math.cos(direction), current_speed * math.sin(direction), 0.0],
+        depth_noise=depth_noise,
+        angle_noise=angle_noise,
+        buoyancy=buoyancy,
+        initial_attitude=[roll, pitch, heading],
+    )
+
+def evaluate(log, simulator):
+    # Outcome of one mission from its log, NaN where the gate or the bucket was never reached
+    position = log.position
+    outcome = dict.fromkeys(OUTCOME_FIELDS, math.nan)
+    outcome['gate'] = outcome['bucket'] = 0.0
+    start = np.array(simulator.param_initial_position, dtype=float)
+
+    for class_name, center, size in simulator.objects:
+        horizontal = position[:, :2] - center[:2]
+        if class_name == 'Gate':
+            # Gate plane across the line from the start, passed inside the frame when the
+            # vehicle first crosses it
+            normal = center[:2] - start[:2]
+            normal /= max(np.linalg.norm(normal), 1e-9)
+            along = horizontal @ normal
+            crossed = np.flatnonzero((along[:-1] < 0) & (along[1:] >= 0))
+            if crossed.size:
+                i = crossed[0] + 1
+                lateral = abs(horizontal[i, 0] * normal[1] - horizontal[i, 1] * normal[0])
+                vertical = abs(position[i, 2] - center[2])
+                outcome['time_to_gate'] = log.time[i]
+                outcome['gate'] = float(lateral < size[0] / 2 and vertical < size[1] / 2)
+        elif class_name == 'Bucket':
+            inside = np.flatnonzero(np.hypot(horizontal[:, 0], horizontal[:, 1]) < simulator.param_bucket_radius)
+            if inside.size:
+                outcome['bucket'] = 1.0
+                outcome['time_to_bucket'] = log.time[inside[0]]
+
+    outcome['x'], outcome['y'], outcome['depth'] = position[-1].tolist()
+    outcome['max_pitch'] = np.abs(log.attitude[:, 1]).max()
+    outcome['max_roll'] = np.abs(log.attitude[:, 0]).max()
+    return [outcome[field] for field in OUTCOME_FIELDS]
+
+# Settings shared by the runs of a worker process, set once by init_worker instead of
+# being pickled with every scenario
+worker = {}
+
+def init_worker(simulator_config, control_config, steps, duration, mission_options):
+    worker.update(
+        simulator_config=simulator_config,
+        control_config=control_config,
+        steps=steps,
+        duration=duration,
+        mission_options=mission_options,
+    )
+
+def run_scenario(task):
+    seed, scenario = task
+    mission = SimulatedMission(
+        worker['control_config'],
+        scenario_config(worker['simulator_config'], scenario),
+        seed=seed,
+        steps=worker['steps'],
+        **worker['mission_options'],
+    )
+    log = mission.run(worker['duration'])
+    return [seed] + scenario.tolist() + evaluate(log, mission.simulator)
+
+def summarize(results, percentiles=(5, 50, 95)):
+    # Success rates and distributions of a (runs, FIELDS) array
+    column = {field: results[:, i] for i, field in enumerate(FIELDS)}
+    gate = column['gate'] > 0
+    bucket = column['bucket'] > 0
+    final = np.column_stack([column['x'], column['y'], column['depth']])
+    return {
+        'runs': len(results),
+        'success_rate': np.mean(gate & bucket),
+        'gate_rate': np.mean(gate),
+        'bucket_rate': np.mean(bucket),
+        'time_to_gate': np.nanpercentile(np.where(gate, column['time_to_gate'], np.nan), percentiles) if gate.any() else np.full(len(percentiles), np.nan),
+        'time_to_bucket': np.nanpercentile(column['time_to_bucket'], percentiles) if bucket.any() else np.full(len(percentiles), np.nan),
+        'final_mean': final.mean(axis=0),
+        'final_std': final.std(axis=0),
+        'final_percentiles': np.percentile(final, percentiles, axis=0),
+        'max_pitch': np.percentile(column['max_pitch'], percentiles),
+        'max_roll': np.percentile(column['max_roll'], percentiles),
+    }
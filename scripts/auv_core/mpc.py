@@ -0,0 +1,122 @@
+import os
+import numpy as np
+
+def dpr_model(A, gain, damping, period):
+    # Error (depth, pitch, roll) and its rate driven by the four vertical thrusts.
+    # node_control feeds DPRController (depth, pitch, -roll), so the roll row is flipped
+    # to get the controller outputs of the thrusts.
+    outputs = np.diag([1.0, 1.0, -1.0]) @ A
+
+    Ad = np.eye(6)
+    Ad[:3, 3:] = period * np.eye(3)
+    Ad[3:, 3:] = np.diag(1 - period * np.asarray(damping, dtype=float))
+
+    # A positive output reduces the error of its axis, as with the PID outputs
+    Bd = np.zeros((6, A.shape[1]))
+    Bd[3:] = -period * np.diag(np.asarray(gain, dtype=float)) @ outputs
+    return Ad, Bd, outputs
+
+def condense(Ad, Bd, state_weight, input_weight, horizon):
+    # Stacked predictions X = Phi x0 + Gamma U, cost U' H U + 2 x0' F' U
+    n, m = Bd.shape
+    powers = [np.linalg.matrix_power(Ad, k) for k in range(horizon + 1)]
+    Phi = np.vstack(powers[1:])
+    Gamma = np.zeros((horizon * n, horizon * m))
+    for k in range(horizon):
+        for j in range(k + 1):
+            Gamma[k * n:(k + 1) * n, j * m:(j + 1) * m] = powers[k - j] @ Bd
+
+    Q = np.kron(np.eye(horizon), np.diag(state_weight))
+    R = np.kron(np.eye(horizon), np.diag(input_weight))
+    H = Gamma.T @ Q @ Gamma + R
+    F = Gamma.T @ Q @ Phi
+    return H, F
+
+class DPRPredictiveController(): # Depth Pitch Roll MPC
+    def __init__(self, A, gain, damping, period, horizon, state_weight, input_weight, iterations, cache=None, tolerance=0.5):
+        A = np.array(A, dtype=float)
+        self.horizon = horizon
+        self.iterations = iterations
+        self.tolerance = tolerance
+        self.Ad, self.Bd, self.outputs = dpr_model(A, gain, damping, period)
+        m = A.shape[1]
+        weights = (np.broadcast_to(state_weight, 6), np.broadcast_to(input_weight, m))
+
+        # Everything the matrices depend on, a cache file made with other values is rebuilt
+        key = np.concatenate([A.ravel(), np.broadcast_to(gain, 3), np.broadcast_to(damping, 3), [period, horizon], *weights])
+        matrices = None
+        if cache and os.path.exists(cache):
+            with np.load(cache) as data:
+                if data['key'].shape == key.shape and np.allclose(data['key'], key):
+                    matrices = data['H'], data['F'], data['gain']
+
+        if matrices is None:
+            H, F = condense(self.Ad, self.Bd, *weights, horizon)
+            matrices = H, F, -np.linalg.solve(H, F)
+            if cache:
+                np.savez(cache, key=key, H=H, F=F, gain=matrices[2])
+        self.H, self.F, self.gain = matrices
+
+        # Projected gradient step, 1 / largest eigenvalue of H
+        self.step_size = 1 / np.linalg.eigvalsh(self.H)[-1]
+
+        # Preallocated buffers, thrust of every step of the horizon in DPRController column order
+        self.state = np.zeros(6)
+        self.linear = np.zeros(self.H.shape[0])
+        self.gradient = np.zeros(self.H.shape[0])
+        self.inputs = np.zeros(self.H.shape[0])
+        self.previous = np.zeros(self.H.shape[0])
+        self.momentum = np.zeros(self.H.shape[0])
+        self.lower = np.zeros((horizon, m))
+        self.upper = np.zeros((horizon, m))
+        self.thrust = np.zeros(m)
+        self.output = np.zeros(3)
+
+        # Iterations and largest thrust change of the last iteration of the last solve
+        self.iterations_used = 0
+        self.residual = 0.0
+
+    def control(self, error, rate, lower, upper):
+        self.state[:3] = error
+        self.state[3:] = rate
+        self.lower[:] = lower
+        self.upper[:] = upper
+        lower = self.lower.reshape(-1)
+        upper = self.upper.reshape(-1)
+
+        # Start from the unconstrained optimum, it is the answer when no limit is hit
+        np.dot(self.gain, self.state, out=self.inputs)
+        np.clip(self.inputs, lower, upper, out=self.inputs)
+
+        # Thrust limits: accelerated projected gradient steps on the box of PWM limits until
+        # no thrust moves by more than the tolerance. The momentum restarts when a step goes
+        # uphill, H is not well enough conditioned for plain gradient steps to converge in
+        # a few iterations.
+        np.dot(self.F, self.state, out=self.linear)
+        self.momentum[:] = self.inputs
+        t = 1.0
+        self.residual = 0.0
+        for i in range(self.iterations):
+            self.previous[:] = self.inputs
+            np.dot(self.H, self.momentum, out=self.gradient)
+            self.gradient += self.linear
+            self.gradient *= self.step_size
+            np.subtract(self.momentum, self.gradient, out=self.inputs)
+            np.clip(self.inputs, lower, upper, out=self.inputs)
+
+            np.subtract(self.inputs, self.previous, out=self.gradient)
+            self.residual = np.abs(self.gradient).max()
+            if self.residual <= self.tolerance:
+                break
+            if np.dot(self.gradient, self.momentum) > np.dot(self.gradient, self.inputs):
+                t = 1.0
+            t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+            np.multiply(self.gradient, (t - 1) / t_next, out=self.momentum)
+            self.momentum += self.inputs
+            t = t_next
+        self.iterations_used = i + 1 if self.iterations else 0
+
+        # Only the first step is applied
+        self.thrust[:] = self.inputs[:len(self.thrust)]
+        np.dot(self.outputs, self.thrust, out=self.output)
+        return self.thrust
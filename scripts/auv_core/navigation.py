@@ -0,0 +1,116 @@
+import threading
+from types import SimpleNamespace
+from .clock import monotonic_clock
+
+def run_later(delay, callback):
+    # Default scheduler of NavigationCore, node_navigation uses a one-shot rospy.Timer
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+def publish_nothing(error, is_stable, now):
+    pass
+
+def new_messages(error, is_stable):
+    return SimpleNamespace(**vars(error)), SimpleNamespace(**vars(is_stable))
+
+class NavigationCore():
+    def __init__(self, clock=monotonic_clock, publish=publish_nothing, schedule=run_later, publish_mode='is_start', max_rate=0, messages=new_messages):
+        self.clock = clock
+        # publish(error, is_stable, now) sends both, schedule(delay, callback) calls back later
+        self.publish = publish
+        self.schedule = schedule
+        # messages(error, is_stable) builds new messages from the containers for every
+        # publish, a subscriber holding a message never sees it change
+        self.messages = messages
+
+        self.error = SimpleNamespace(roll=0, pitch=0, yaw=0, sway=0, depth=0)
+        self.is_stable = SimpleNamespace(roll=False, pitch=False, yaw=False, sway=False, depth=False)
+        self.set_point = SimpleNamespace(roll=0, pitch=0, yaw=0, sway=0, depth=0)
+
+        # is_start: publish the error on the next is_start, sensor: publish it as soon as a sensor
+        # reading arrives, at most max_rate times per second (0 for no cap)
+        self.publish_mode = publish_mode
+        self.max_rate = max_rate
+
+        # A capped error waits for the next slot, newer errors replace it (coalesced). The
+        # containers are only filled and read into messages under the lock, the timer thread never
+        # publishes half of a sensor reading. Reentrant, set_sensor publishes while holding it.
+        self.lock = threading.RLock()
+        self.last_publish_time = None
+        self.is_pending = False
+        self.coalesced = 0
+
+    def generate_is_stable(self, thresh, error):
+        return -(thresh) <= error <= thresh
+
+    def calculate_orientation_error(self, current, target):
+        error = (target - current) % 2
+        if error > 1:
+            error -= 2
+        return error
+
+    def calculate_heading_error(self, current, target):
+        return (current - target + 180) % 360 - 180
+
+    def set_set_point(self, depth, pitch, roll, yaw, sway=0):
+        with self.lock:
+            self.set_point.depth = depth
+            self.set_point.pitch = pitch
+            self.set_point.roll = roll
+            self.set_point.yaw = yaw
+            self.set_point.sway = sway
+
+    def set_sensor(self, depth, pitch, roll, yaw, sway=0):
+        with self.lock:
+            # Calculate Error Value
+            error_roll = self.calculate_heading_error(roll, self.set_point.roll)
+            error_pitch = self.calculate_heading_error(pitch, self.set_point.pitch)
+            error_yaw = self.calculate_heading_error(yaw, self.set_point.yaw)
+            error_sway = self.calculate_heading_error(sway, self.set_point.sway)
+            error_depth = self.set_point.depth - depth
+
+            # Determine Stable Position
+            self.is_stable.roll = self.generate_is_stable(0, error_roll)
+            self.is_stable.pitch = self.generate_is_stable(0, error_pitch)
+            self.is_stable.yaw = self.generate_is_stable(0, error_yaw)
+            self.is_stable.sway = self.generate_is_stable(0, error_sway)
+            self.is_stable.depth = self.generate_is_stable(0.05, error_depth)
+
+            # Validate Error Value
+            self.error.roll = 0 if self.is_stable.roll else error_roll
+            self.error.pitch = 0 if self.is_stable.pitch else error_pitch
+            self.error.yaw = 0 if self.is_stable.yaw else error_yaw
+            self.error.sway = 0 if self.is_stable.sway else error_sway
+            self.error.depth = 0 if self.is_stable.depth else error_depth
+
+            if self.publish_mode == 'sensor':
+                self.publish_capped()
+
+    def publish_capped(self):
+        with self.lock:
+            now = self.clock()
+            wait = 0 if self.max_rate <= 0 or self.last_publish_time is None else self.last_publish_time + 1.0 / self.max_rate - now
+            if wait <= 0:
+                self.publish_error(now)
+                return
+            if self.is_pending:
+                self.coalesced += 1
+                return
+            self.is_pending = True
+            self.schedule(wait, self.publish_pending)
+
+    def publish_pending(self):
+        with self.lock:
+            self.is_pending = False
+            self.publish_error(self.clock())
+
+    def publish_error(self, now):
+        with self.lock:
+            self.last_publish_time = now
+            error, is_stable = self.messages(self.error, self.is_stable)
+        self.publish(error, is_stable, now)
+
+    def set_is_start(self, is_start):
+        if is_start and self.publish_mode == 'is_start':
+            self.publish_error(self.clock())
@@ -0,0 +1,56 @@
+# Center x-coordinate of the 640 px camera frame
+FRAME_CENTER_X = 640 // 2
+
+# Command and minimum probability of each class of node_accumulator
+OBJECT_COMMANDS = {
+    'Obstacle': ('Avoid', 0.87),
+    'Bucket': ('Drop', 0.0),
+    'Gate': ('Centering', 0.88),
+}
+
+def select_object(bounding_boxes, frame_center_x=FRAME_CENTER_X):
+    # Command of every accepted box in order, largest accepted object and the gate closest
+    # to the frame center with its x difference ("None" and 0 without a gate)
+    commands = []
+    largest = 0
+    largest_object = "None"
+    gate_difference = None
+
+    for bbox in bounding_boxes:
+        command = OBJECT_COMMANDS.get(bbox.class_name)
+        if command is None or bbox.probability < command[1]:
+            continue
+        commands.append(command[0])
+
+        bbox_area = (bbox.x_max - bbox.x_min) * (bbox.y_max - bbox.y_min)
+        if bbox_area > largest:
+            largest = bbox_area
+            largest_object = bbox.class_name
+
+        if bbox.class_name == "Gate":
+            # Calculate the center x-coordinate of the bounding box
+            x_difference = (bbox.x_min + bbox.x_max) // 2 - frame_center_x
+            if gate_difference is None or abs(x_difference) < abs(gate_difference):
+                gate_difference = x_difference
+
+    if gate_difference is None:
+        return commands, largest_object, "None", 0
+    return commands, largest_object, "Gate", gate_difference
+
+# Fields of the WitMotion heading line, e.g. "Magx:12,Magy:-3,Magz:40,Yaw:91.5"
+HEADING_FIELDS = {
+    'Magx': ('mag_x', int),
+    'Magy': ('mag_y', int),
+    'Magz': ('mag_z', int),
+    'Yaw': ('yaw', float),
+}
+
+def update_heading(line, heading):
+    # Set the fields of the heading in place, yields after each field as node_heading
+    # publishes the heading once per field
+    for data in line.split(','):
+        data_name, data_value = data.split(':')
+        field = HEADING_FIELDS.get(data_name)
+        if field is not None:
+            setattr(heading, field[0], field[1](data_value))
+        yield heading
@@ -0,0 +1,120 @@
+import numpy as np
+
+class PIDBank():
+    def __init__(self, kp, ki, kd, output_limit, derivative_filter=0.0, wrap=None):
+        self.kp = np.array(kp, dtype=float)
+        self.ki = np.array(ki, dtype=float)
+        self.kd = np.array(kd, dtype=float)
+        # One limit or one per axis, None for no limit
+        self.output_max = np.broadcast_to(np.array(np.inf if output_limit is None else output_limit, dtype=float), self.kp.shape).copy()
+        self.output_min = -self.output_max
+
+        # Time constant of the first order derivative filter, 0 disables it
+        self.derivative_filter = derivative_filter
+
+        # Period of angle axes (360 for heading) so the derivative does not jump on wrap around
+        self.wrap = None if wrap is None else np.array(wrap, dtype=float)
+        self.wrapped = None if wrap is None else self.wrap > 0
+
+        self.proportional = np.zeros(self.kp.shape)
+        self.integral = np.zeros(self.kp.shape)
+        self.derivative = np.zeros(self.kp.shape)
+        self.output = np.zeros(self.kp.shape)
+
+        self.signal = np.zeros(self.kp.shape)
+        self.last_signal = np.zeros(self.kp.shape)
+        self.rate = np.zeros(self.kp.shape)
+        self.step = np.zeros(self.kp.shape)
+        self.free = np.zeros(self.kp.shape, dtype=bool)
+        self.last_time = None
+
+    def reset(self):
+        self.integral[:] = 0
+        self.derivative[:] = 0
+        self.last_time = None
+
+    def set_gains(self, kp, ki, kd):
+        self.kp[:] = kp
+        self.ki[:] = ki
+        self.kd[:] = kd
+
+    def update(self, error, stamp, setpoint=None):
+        # All axes share one timestamp, a repeated or older stamp only updates the proportional term
+        dt = 0.0 if self.last_time is None else stamp - self.last_time
+
+        # Derivative on measurement: setpoint is the set point part of the error, so
+        # error - setpoint only follows the measurement and set point steps give no kick
+        np.copyto(self.signal, error)
+        if setpoint is not None:
+            self.signal -= setpoint
+
+        np.multiply(self.kp, error, out=self.proportional)
+
+        if dt > 0:
+            np.subtract(self.signal, self.last_signal, out=self.rate)
+            if self.wrap is not None:
+                self.rate[self.wrapped] = (self.rate[self.wrapped] + self.wrap[self.wrapped] / 2) % self.wrap[self.wrapped] - self.wrap[self.wrapped] / 2
+            self.rate /= dt
+            self.rate -= self.derivative
+            self.rate *= dt / (self.derivative_filter + dt)
+            self.derivative += self.rate
+
+            # The integral runs on -ki like the PID class of node_control. Conditional
+            # integration: hold the integral of an axis that is saturated and whose error
+            # would push it further into saturation.
+            np.multiply(self.ki, error, out=self.step)
+            self.step *= -dt
+            np.add(self.proportional, self.integral, out=self.output)
+            self.output += self.step
+            self.output += self.kd * self.derivative
+            self.free[:] = ((self.output < self.output_max) | (self.step < 0)) & ((self.output > self.output_min) | (self.step > 0))
+            self.integral[self.free] += self.step[self.free]
+
+        if dt > 0 or self.last_time is None:
+            self.last_time = stamp
+            np.copyto(self.last_signal, self.signal)
+
+        np.add(self.proportional, self.integral, out=self.output)
+        self.output += self.kd * self.derivative
+        return np.clip(self.output, self.output_min, self.output_max, out=self.output)
+
+class CascadedDepthController():
+    def __init__(self, position_gain, max_velocity, velocity_kp, velocity_ki, output_limit):
+        self.position_gain = position_gain
+        self.max_velocity = max_velocity
+        self.velocity_kp = velocity_kp
+        self.velocity_ki = velocity_ki
+        self.output_limit = output_limit
+
+        self.velocity_set_point = 0.0
+        self.integral = 0.0
+        self.output = 0.0
+        self.last_time = None
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_time = None
+
+    def set_position_error(self, error):
+        # Outer loop: position error to a limited vertical velocity set point
+        self.velocity_set_point = min(max(self.position_gain * error, -self.max_velocity), self.max_velocity)
+        return self.velocity_set_point
+
+    def update(self, velocity, stamp):
+        # Inner loop: PI on the velocity error at the depth sensor rate
+        dt = 0.0 if self.last_time is None else stamp - self.last_time
+        if dt <= 0 and self.last_time is not None:
+            return self.output
+        self.last_time = stamp
+
+        error = self.velocity_set_point - velocity
+        proportional = self.velocity_kp * error
+        step = self.velocity_ki * error * dt
+
+        # Conditional integration, hold the integral while it would deepen saturation
+        output = proportional + self.integral + step
+        if -self.output_limit < output < self.output_limit or output * step < 0:
+            self.integral += step
+
+        self.output = min(max(proportional + self.integral, -self.output_limit), self.output_limit)
+        return self.output
@@ -0,0 +1,68 @@
+import numpy as np
+
+class DoubleBuffer():
+    def __init__(self, size):
+        self.slots = [np.zeros(size), np.zeros(size)]
+        self.stamps = [0.0, 0.0]
+        self.index = 0
+        self.version = 0
+
+    def write(self, values, stamp):
+        # Fill the back slot, then publish it by flipping the index
+        back = 1 - self.index
+        self.slots[back][:] = values
+        self.stamps[back] = stamp
+        self.index = back
+        self.version += 1
+
+    def read(self, out):
+        # Copy the front slot, retry when a write finished while copying
+        while True:
+            version = self.version
+            index = self.index
+            out[:] = self.slots[index]
+            stamp = self.stamps[index]
+            if version == self.version:
+                return version, stamp
+
+class PeriodStats():
+    def __init__(self, period, window=200):
+        self.period = period
+        self.periods = np.zeros(window)
+        self.latenesses = np.zeros(window)
+        self.count = 0
+        self.overruns = 0
+
+    def add(self, period, lateness):
+        # Ring buffer of the last periods and of how late each tick started
+        index = self.count % len(self.periods)
+        self.periods[index] = period
+        self.latenesses[index] = lateness
+        self.count += 1
+        if period > 1.5 * self.period:
+            self.overruns += 1
+
+    def summary(self):
+        # Mean period, max period, period jitter (standard deviation) and mean lateness
+        periods = self.periods[:min(self.count, len(self.periods))]
+        latenesses = self.latenesses[:len(periods)]
+        if len(periods) == 0:
+            return 0.0, 0.0, 0.0, 0.0
+        return periods.mean(), periods.max(), periods.std(), latenesses.mean()
+
+class LatencyWindow():
+    def __init__(self, window=1000):
+        self.latencies = np.zeros(window)
+        self.count = 0
+
+    def add(self, latency):
+        self.latencies[self.count % len(self.latencies)] = latency
+        self.count += 1
+
+    def summary(self):
+        # p50, p95, p99 and max of the last latencies
+        latencies = self.latencies[:min(self.count, len(self.latencies))]
+        if len(latencies) == 0:
+            return 0.0, 0.0, 0.0, 0.0
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return p50, p95, p99, latencies.max()
@@ -0,0 +1,259 @@
+import math
+from types import SimpleNamespace
+import numpy as np
+from .allocation import ThrusterAllocator, VERTICAL, PWM_SIGN
+
+GRAVITY = 9.81
+
+# Vehicle of the simulator, see config/simulator.yaml
+SIMULATOR_DEFAULTS = {
+    'mass': 25.0, # kg
+    'inertia': [0.6, 1.2, 1.2], # kg m^2 about x, y, z
+    # Added mass of surge, sway, heave (kg) and roll, pitch, yaw (kg m^2)
+    'added_mass': [8.0, 12.0, 20.0, 0.3, 0.6, 0.5],
+    # Drag of the same axes, force = -(linear + quadratic * |velocity|) * velocity
+    'linear_drag': [10.0, 15.0, 20.0, 2.0, 3.0, 2.0],
+    'quadratic_drag': [60.0, 80.0, 100.0, 1.0, 2.0, 1.0],
+    # Buoyancy a little above the weight, acting this far above the center of gravity
+    'buoyancy': 250.0, # N
+    'metacentric_height': 0.02, # m
+    # Water surface above the start depth and hull height, buoyancy drops as the hull leaves the water
+    'surface_level': 0.3, # m
+    'hull_height': 0.3, # m
+    # Lever arms of the vertical thrusters (x, y) and of the horizontal thrusters about z
+    'lever_x': 0.3,
+    'lever_y': 0.2,
+    'yaw_arm': 0.25,
+    # Thrust per us away from 1500 outside the deadband, about 40 N at 1900 us
+    'thrust_per_us': 0.1,
+    'thrust_deadband': 25,
+    # Thrust of every thruster relative to the nominal one, see scripts/identify_model.py
+    'thruster_gains': [1.0] * 10,
+    # Battery sag from the current drawn by the thrusters
+    'battery_voltage': 25.0,
+    'battery_resistance': 0.05, # ohm
+    'current_per_newton': 0.25, # A per N of thrust
+    'depth_noise': 0.005, # m
+    'angle_noise': 0.2, # degrees
+    # Water current in the world frame, drag acts on the velocity relative to the water
+    'current': [0.0, 0.0, 0.0], # m/s
+    # Start pose, depth is positive up as the depth sensor after pre calibration
+    'initial_position': [0.0, 0.0, 0.0],
+    'initial_attitude': [0.0, 0.0, -101.0], # roll, pitch, yaw in degrees, facing the first heading of the mission
+    # Camera along the body x axis
+    'camera_width': 640,
+    'camera_height': 480,
+    'camera_fov': 80.0, # degrees
+    'camera_range': 8.0, # m
+    # Objects that the fake detector reports, class, position (m) and size (width, height in m),
+    # placed on the path of the node_guidance_last mission
+    'objects': [
+        {'class_name': 'Gate', 'position': [-2.0, -10.0, -0.6], 'size': [1.5, 1.0]},
+        {'class_name': 'Bucket', 'position': [-12.4, -66.0, -1.5], 'size': [0.6, 0.4]},
+    ],
+    # Horizontal distance from the bucket that triggers the bucket sensor
+    'bucket_radius': 1.0,
+}
+
+# Body axes (surge, sway, heave, roll, pitch, yaw) of the controller wrench axes
+# (Fx, Fy, Fz, Mx, My, Mz) and their signs. Surge is Fy (move forward sets Fy), the
+# signs make a positive angle error turn the vehicle back as node_control expects.
+WRENCH_AXES = np.array([1, 0, 2, 3, 4, 5])
+WRENCH_SIGNS = np.array([1, 1, 1, 1, -1, -1], dtype=float)
+
+def thruster_geometry(lever_x, lever_y, yaw_arm):
+    # Body wrench per newton of every thruster. Directions and signs come from the
+    # unified allocator, lever arms from the vehicle.
+    B = ThrusterAllocator(1, 1, 1).matrix
+    G = np.zeros((6, 10))
+    G[:3] = B[:3]
+    G[:3, VERTICAL] = np.sign(B[:3, VERTICAL])
+    G[3] = np.sign(B[3]) * lever_y
+    G[4] = np.sign(B[4]) * lever_x
+    G[5] = np.sign(B[5]) * yaw_arm
+    body = np.zeros((6, 10))
+    body[WRENCH_AXES] = G * WRENCH_SIGNS[:, None]
+    return body
+
+def thruster_thrust(pwm, thrust_per_us, deadband, out=None):
+    # Nominal thrust of the thrusters along their direction from PWM (one row or many), the
+    # sign of the PWM mapping is undone
+    command = PWM_SIGN * (np.asarray(pwm) - 1500)
+    magnitude = np.maximum(np.abs(command) - deadband, 0)
+    return np.multiply(np.sign(command), magnitude * thrust_per_us, out=out)
+
+def rotation(roll, pitch, yaw):
+    # Body to world, z up, yaw then pitch then roll
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    return np.array([
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ])
+
+def quaternion(roll, pitch, yaw):
+    # (x, y, z, w) of the same rotation, as the IMU reports it
+    cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+    cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+    cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+    return (
+        sr * cp * cy - cr * sp * sy,
+        cr * sp * cy + sr * cp * sy,
+        cr * cp * sy - sr * sp * cy,
+        cr * cp * cy + sr * sp * sy,
+    )
+
+class Simulator():
+    def __init__(self, config=None, seed=0):
+        self.config = dict(SIMULATOR_DEFAULTS, **(config or {}))
+        for key, value in self.config.items():
+            setattr(self, 'param_' + key, value)
+        self.rng = np.random.default_rng(seed)
+
+        inertia = np.array(self.param_inertia, dtype=float)
+        added_mass = np.array(self.param_added_mass, dtype=float)
+        self.mass_linear = self.param_mass + added_mass[:3]
+        self.mass_angular = inertia + added_mass[3:]
+        self.mass = np.concatenate([self.mass_linear, self.mass_angular])
+        self.linear_drag = np.array(self.param_linear_drag, dtype=float)
+        self.quadratic_drag = np.array(self.param_quadratic_drag, dtype=float)
+        self.weight = self.param_mass * GRAVITY
+        self.current = np.array(self.param_current, dtype=float)
+        self.thruster_gains = np.array(self.param_thruster_gains, dtype=float)
+        self.geometry = thruster_geometry(self.param_lever_x, self.param_lever_y, self.param_yaw_arm)
+
+        self.objects = [(obj['class_name'], np.array(obj['position'], dtype=float), obj['size']) for obj in self.param_objects]
+        self.focal = self.param_camera_width / 2 / math.tan(math.radians(self.param_camera_fov) / 2)
+
+        self.reset()
+
+    def reset(self):
+        self.time = 0.0
+        # World position (z up), attitude (roll, pitch, yaw in radians) and body velocity
+        self.position = np.array(self.param_initial_position, dtype=float)
+        self.attitude = np.radians(np.array(self.param_initial_attitude, dtype=float))
+        self.velocity = np.zeros(6)
+        self.pwm = np.full(10, 1500.0)
+        self.force = np.zeros(10)
+        self.wrench = np.zeros(6)
+        self.acceleration = np.zeros(6)
+        self.relative = np.zeros(6)
+        self.R = rotation(*self.attitude)
+
+    def set_pwm(self, pwm):
+        self.pwm[:] = pwm
+
+    def thruster_forces(self):
+        thruster_thrust(self.pwm, self.param_thrust_per_us, self.param_thrust_deadband, self.force)
+        self.force *= self.thruster_gains
+        return self.force
+
+    def step(self, dt):
+        # Thruster wrench in one product, the rest in scalars, which is several times faster
+        # than numpy on vectors of three
+        np.dot(self.geometry, self.thruster_forces(), out=self.wrench)
+        X, Y, Z, K, M, N = self.wrench.tolist()
+        u, v, w, p, q, r = self.velocity.tolist()
+        mu, mv, mw = self.mass_linear.tolist()
+        mp, mq, mr = self.mass_angular.tolist()
+
+        # Weight and buoyancy in the body frame, buoyancy acts above the center of gravity
+        ux, uy, uz = self.R[2].tolist()
+        submerged = min(max((self.param_surface_level - self.position[2]) / self.param_hull_height + 0.5, 0.0), 1.0)
+        buoyancy = self.param_buoyancy * submerged
+        net = buoyancy - self.weight
+        lift = self.param_metacentric_height * buoyancy
+        X += net * ux
+        Y += net * uy
+        Z += net * uz
+        K -= lift * uy
+        M += lift * ux
+
+        # Coriolis and centripetal terms of the rigid body and its added mass (Kirchhoff),
+        # -omega x (M v) and -omega x (I omega) - v x (M v)
+        X -= q * mw * w - r * mv * v
+        Y -= r * mu * u - p * mw * w
+        Z -= p * mv * v - q * mu * u
+        K -= q * mr * r - r * mq * q + v * mw * w - w * mv * v
+        M -= r * mp * p - p * mr * r + w * mu * u - u * mw * w
+        N -= p * mq * q - q * mp * p + u * mv * v - v * mu * u
+
+        # Drag on the velocity relative to the water, the current in the body frame is R^T c
+        relative = self.relative
+        relative[:] = self.velocity
+        if self.current.any():
+            relative[:3] -= self.R.T.dot(self.current)
+        np.subtract((X, Y, Z, K, M, N), (self.linear_drag + self.quadratic_drag * np.abs(relative)) * relative, out=self.acceleration)
+        self.acceleration /= self.mass
+        # Semi-implicit Euler, the new velocity moves the pose
+        self.velocity += self.acceleration * dt
+        u, v, w, p, q, r = self.velocity.tolist()
+
+        roll, pitch, yaw = self.attitude.tolist()
+        (r00, r01, r02), (r10, r11, r12), (r20, r21, r22) = self.R.tolist()
+        self.position[0] += (r00 * u + r01 * v + r02 * w) * dt
+        self.position[1] += (r10 * u + r11 * v + r12 * w) * dt
+        self.position[2] += (r20 * u + r21 * v + r22 * w) * dt
+
+        sin_roll, cos_roll = math.sin(roll), math.cos(roll)
+        cos_pitch = max(math.cos(pitch), 1e-6)
+        roll += (p + (q * sin_roll + r * cos_roll) * math.tan(pitch)) * dt
+        pitch += (q * cos_roll - r * sin_roll) * dt
+        yaw += (q * sin_roll + r * cos_roll) / cos_pitch * dt
+        yaw = (yaw + math.pi) % (2 * math.pi) - math.pi
+        self.attitude[:] = (roll, pitch, yaw)
+        self.R = rotation(roll, pitch, yaw)
+        self.time += dt
+
+    def run(self, duration, dt):
+        for _ in range(int(round(duration / dt))):
+            self.step(dt)
+
+    # Sensors
+    def depth(self):
+        return self.position[2] + self.rng.normal(0, self.param_depth_noise)
+
+    def angles(self):
+        # Roll, pitch and yaw in degrees, yaw in [-180, 180)
+        angles = np.degrees(self.attitude) + self.rng.normal(0, self.param_angle_noise, 3)
+        angles[2] = (angles[2] + 180) % 360 - 180
+        return angles
+
+    def orientation(self):
+        return quaternion(*self.attitude)
+
+    def load_voltage(self):
+        current = np.sum(np.abs(self.force)) * self.param_current_per_newton
+        return self.param_battery_voltage - self.param_battery_resistance * current
+
+    def detections(self):
+        # Bounding boxes of the objects in front of the camera, x grows to the right
+        boxes = []
+        for class_name, position, size in self.objects:
+            forward, left, up = self.R.T @ (position - self.position)
+            if forward < 0.3 or forward > self.param_camera_range:
+                continue
+            center_x = self.param_camera_width / 2 - self.focal * left / forward
+            center_y = self.param_camera_height / 2 - self.focal * up / forward
+            half_width = self.focal * size[0] / forward / 2
+            half_height = self.focal * size[1] / forward / 2
+            if not (0 <= center_x < self.param_camera_width and 0 <= center_y < self.param_camera_height):
+                continue
+            boxes.append(SimpleNamespace(
+                class_name=class_name,
+                # Confidence drops with the distance
+                probability=float(0.99 - 0.1 * forward / self.param_camera_range),
+                x_min=int(max(center_x - half_width, 0)),
+                y_min=int(max(center_y - half_height, 0)),
+                x_max=int(min(center_x + half_width, self.param_camera_width - 1)),
+                y_max=int(min(center_y + half_height, self.param_camera_height - 1)),
+            ))
+        return boxes
+
+    def bucket_detected(self):
+        for class_name, position, _ in self.objects:
+            if class_name == 'Bucket' and np.hypot(*(position[:2] - self.position[:2])) < self.param_bucket_radius:
+                return True
+        return False
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+from .clock import monotonic_clock
+
+# Index of a recorded run, the fields, row count and string codes of every channel
+INDEX = 'index.json'
+
+logger = logging.getLogger(__name__)
+
+class TelemetryChannel():
+    # Rows of one topic. Callbacks append rows to a preallocated ring and the writer thread
+    # moves them to one memory-mapped column file per field. A full ring drops the row
+    # instead of waiting for the writer.
+    def __init__(self, directory, name, fields, capacity, ring_size, clock=monotonic_clock):
+        self.directory = os.path.join(directory, name)
+        self.name = name
+        self.clock = clock
+        self.dtype = np.dtype([('time', 'f8')] + list(fields))
+        os.makedirs(self.directory, exist_ok=True)
+
+        # head is only moved by append and tail only by write, so neither needs a lock
+        self.ring = np.zeros(ring_size, self.dtype)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        # Strings of the categorical fields by code, e.g. the move mode. New codes are added
+        # by the callbacks while the writer thread reads them for the index.
+        self.codes = {}
+        self.codes_lock = threading.Lock()
+
+        self.count = 0
+        self.capacity = max(int(capacity), 1)
+        self.columns = {field: np.memmap(self.path(field), self.dtype[field], 'w+', shape=(self.capacity,)) for field in self.dtype.names}
+
+    def path(self, field):
+        return os.path.join(self.directory, field + '.bin')
+
+    def code(self, field, text):
+        value = self.codes.get(field, {}).get(text)
+        if value is None:
+            with self.codes_lock:
+                codes = self.codes.setdefault(field, {})
+                value = codes.setdefault(text, len(codes))
+        return value
+
+    def append(self, *values):
+        head = self.head
+        if head - self.tail >= len(self.ring):
+            self.dropped += 1
+            return False
+        self.ring[head % len(self.ring)] = (self.clock(),) + values
+        self.head = head + 1
+        return True
+
+    def resize(self, capacity):
+        for field in self.dtype.names:
+            self.columns[field].flush()
+            del self.columns[field]
+            with open(self.path(field), 'r+b') as file:
+                file.truncate(capacity * self.dtype[field].itemsize)
+            if capacity > 0:
+                self.columns[field] = np.memmap(self.path(field), self.dtype[field], 'r+', shape=(capacity,))
+        self.capacity = capacity
+
+    def write(self):
+        # Move the rows appended since the last write to the columns, in at most two
+        # pieces when they wrap around the end of the ring
+        head = self.head
+        rows = head - self.tail
+        if rows == 0:
+            return 0
+        if self.count + rows > self.capacity:
+            self.resize(max(2 * self.capacity, self.count + rows))
+
+        size = len(self.ring)
+        start = self.tail % size
+        first = min(rows, size - start)
+        for field in self.dtype.names:
+            column = self.columns[field]
+            ring = self.ring[field]
+            column[self.count:self.count + first] = ring[start:start + first]
+            column[self.count + first:self.count + rows] = ring[:rows - first]
+        self.count += rows
+        self.tail = head
+        return rows
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+    def close(self):
+        # Files end at the last row
+        self.write()
+        self.resize(self.count)
+
+    def index(self):
+        with self.codes_lock:
+            codes = {field: sorted(codes, key=codes.get) for field, codes in self.codes.items()}
+        return {
+            'fields': {field: self.dtype[field].str for field in self.dtype.names},
+            'count': self.count,
+            'dropped': self.dropped,
+            'codes': codes,
+        }
+
+class TelemetryRecorder():
+    # Channels of one run in a directory, written by a thread of their own
+    def __init__(self, directory, clock=monotonic_clock, flush_period=0.2, index_period=2.0):
+        self.directory = directory
+        self.clock = clock
+        self.flush_period = flush_period
+        self.index_period = index_period
+        os.makedirs(directory, exist_ok=True)
+
+        self.channels = {}
+        self.errors = 0
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='telemetry', daemon=True)
+
+    def add_channel(self, name, fields, rate, duration, ring_duration=5.0):
+        # Columns for the duration at the expected rate, a ring for the rows of ring_duration
+        channel = TelemetryChannel(self.directory, name, fields, rate * duration, max(int(rate * ring_duration), 64), self.clock)
+        self.channels[name] = channel
+        return channel
+
+    def start(self):
+        self.write_index()
+        self.thread.start()
+
+    def write(self):
+        return sum(channel.write() for channel in self.channels.values())
+
+    def write_index(self):
+        # Replaced in one step, a reader never sees half an index
+        index = {
+            'start_time': self.start_time,
+            'channels': {name: channel.index() for name, channel in self.channels.items()},
+        }
+        path = os.path.join(self.directory, INDEX)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(index, file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def run(self):
+        # A failed write (disk full, a file gone) is logged and tried again, the callbacks
+        # keep filling the rings and drop rows once they are full
+        last_index = time.monotonic()
+        while not self.stop_event.wait(self.flush_period):
+            try:
+                self.write()
+                if time.monotonic() - last_index >= self.index_period:
+                    for channel in self.channels.values():
+                        channel.flush()
+                    self.write_index()
+                    last_index = time.monotonic()
+            except Exception:
+                self.errors += 1
+                logger.exception('Telemetry write failed')
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        for channel in self.channels.values():
+            channel.close()
+        self.write_index()
+
+def load_telemetry(directory):
+    # Every channel of a run as read-only arrays on the column files, nothing is read
+    # until it is used. codes[field][value] gives the string of a categorical field.
+    with open(os.path.join(directory, INDEX)) as file:
+        index = json.load(file)
+
+    run = {}
+    for name, channel in index['channels'].items():
+        count = channel['count']
+        data = SimpleNamespace(count=count, dropped=channel['dropped'], codes={field: np.array(codes) for field, codes in channel['codes'].items()})
+        for field, dtype in channel['fields'].items():
+            path = os.path.join(directory, name, field + '.bin')
+            setattr(data, field, np.memmap(path, np.dtype(dtype), 'r', shape=(count,)) if count else np.zeros(0, np.dtype(dtype)))
+        run[name] = data
+    return run
@@ -0,0 +1,146 @@
+import math
+from types import SimpleNamespace
+import numpy as np
+from .gain_schedule import AXES
+from .mission import SimulatedMission
+
+# Step responses of the tuner, the set point of one axis steps while the vehicle holds
+# the others. Yaw is only controlled while moving, so its step is taken going forward.
+STEP_TESTS = [
+    {'axis': 'depth', 'move': 'stop', 'step': -0.5}, # m
+    {'axis': 'pitch', 'move': 'stop', 'step': 10.0}, # degrees
+    {'axis': 'roll', 'move': 'stop', 'step': 10.0},
+    {'axis': 'yaw', 'move': 'forward', 'step': 30.0},
+]
+
+# Weights of the cost of a step response, overshoot and steady state error as a fraction
+# of the step, settling time as a fraction of the window and the mean squared thruster
+# command change as a fraction of 400 us
+COST_WEIGHTS = {
+    'overshoot': 1.0,
+    'settling': 1.0,
+    'error': 2.0,
+    'effort': 0.5,
+}
+
+# Band around the step that counts as settled
+SETTLING_BAND = 0.05
+
+def measure(simulator, axis):
+    # True value of an axis, without the sensor noise
+    if axis == 'depth':
+        return simulator.position[2]
+    roll, pitch, yaw = np.degrees(simulator.attitude).tolist()
+    return {'pitch': pitch, 'roll': roll, 'yaw': yaw}[axis]
+
+def step_response(mission, test, depth=-0.5, delay=2.0, hold=3.0, window=10.0):
+    # Pre calibration for the delay, the initial set point for the hold and the step for
+    # the window, the response is sampled at the is_start rate
+    outputs = mission.guidance.outputs
+    simulator = mission.simulator
+    axis = test['axis']
+    set_point = SimpleNamespace(depth=depth, pitch=0.0, roll=0.0, yaw=math.degrees(simulator.attitude[2]), sway=0)
+    start = getattr(set_point, axis)
+    mission.control.set_move(test['move'])
+
+    step_tick = int(round((delay + hold) * mission.rate))
+    ticks = step_tick + int(round(window * mission.rate))
+    response = np.zeros(ticks - step_tick)
+    effort = np.zeros(ticks - step_tick)
+    for tick in range(ticks):
+        if tick == step_tick:
+            setattr(set_point, axis, start + test['step'])
+            hold_pwm = simulator.pwm.copy()
+        mission.advance()
+        outputs.set_point(set_point)
+        outputs.is_start(tick >= delay * mission.rate)
+        if tick >= step_tick:
+            value = measure(simulator, axis)
+            if axis == 'yaw':
+                value = (value - start + 180) % 360 - 180 + start
+            response[tick - step_tick] = value
+            # Thruster command on top of the one that held the vehicle before the step
+            effort[tick - step_tick] = np.mean(((simulator.pwm - hold_pwm) / 400) ** 2)
+    return start, response, effort
+
+def response_metrics(start, step, response, effort, rate):
+    # Progress from 0 at the start to 1 at the new set point
+    progress = (response - start) / step
+    outside = np.flatnonzero(np.abs(progress - 1) > SETTLING_BAND)
+    tail = progress[-max(len(progress) // 10, 1):]
+    return {
+        'overshoot': max(float(progress.max()) - 1, 0.0),
+        'settling': (outside[-1] + 1 if outside.size else 0) / len(progress),
+        'settling_time': (outside[-1] + 1 if outside.size else 0) / rate,
+        'error': abs(float(tail.mean()) - 1),
+        'effort': float(effort.mean()),
+    }
+
+def gains_config(gains):
+    # (3, 4) array of kp, ki, kd per axis to the pid_gains parameter of node_control
+    return {axis: [float(value) for value in gains[:, i]] for i, axis in enumerate(AXES)}
+
+# Settings shared by the evaluations of a worker process, set once by init_worker
+worker = {}
+
+def init_worker(simulator_config, control_config, tests, weights, mission_options, seed):
+    worker.update(
+        simulator_config=simulator_config,
+        control_config=control_config,
+        tests=tests,
+        weights=dict(COST_WEIGHTS, **(weights or {})),
+        mission_options=mission_options,
+        seed=seed,
+    )
+
+def evaluate_gains(gains):
+    # Cost of one candidate, the sum over the step tests. Every candidate sees the same
+    # sensor noise so the costs compare gains and not luck.
+    config = dict(worker['control_config'], pid_gains=gains_config(gains))
+    weights = worker['weights']
+    cost = 0.0
+    metrics = []
+    for test in worker['tests']:
+        mission = SimulatedMission(config, worker['simulator_config'], seed=worker['seed'], **worker['mission_options'])
+        start, response, effort = step_response(mission, test)
+        metric = response_metrics(start, test['step'], response, effort, mission.rate)
+        cost += sum(weights[key] * metric[key] for key in weights)
+        metrics.append(metric)
+    if not math.isfinite(cost):
+        cost = math.inf
+    return cost, metrics
+
+class CrossEntropyTuner():
+    # Gains are searched in log space, every generation samples candidates around the mean,
+    # the best ones (elites) give the mean and spread of the next generation
+    def __init__(self, gains, tuned, spread=0.5, candidates=32, elites=6, seed=0, floor=0.1):
+        self.log_mean = np.log(np.maximum(np.array(gains, dtype=float), floor))
+        self.log_std = np.where(tuned, spread, 0.0)
+        self.tuned = np.asarray(tuned, dtype=bool)
+        self.fixed = np.array(gains, dtype=float)
+        self.candidates = candidates
+        self.elites = elites
+        self.floor = floor
+        self.rng = np.random.default_rng(seed)
+
+        self.best_gains = self.fixed.copy()
+        self.best_cost = math.inf
+
+    def sample(self):
+        samples = np.exp(self.log_mean + self.log_std * self.rng.standard_normal((self.candidates,) + self.log_mean.shape))
+        # Gains that are not tuned keep their value, a zero ki stays zero
+        samples[:, ~self.tuned] = self.fixed[~self.tuned]
+        # The mean itself is always a candidate
+        samples[0] = np.where(self.tuned, np.exp(self.log_mean), self.fixed)
+        return samples
+
+    def update(self, samples, costs):
+        costs = np.asarray(costs)
+        order = np.argsort(costs)
+        if costs[order[0]] < self.best_cost:
+            self.best_cost = costs[order[0]]
+            self.best_gains = samples[order[0]].copy()
+
+        elite = np.log(np.maximum(samples[order[:self.elites]], self.floor))
+        self.log_mean = np.where(self.tuned, elite.mean(axis=0), self.log_mean)
+        self.log_std = np.where(self.tuned, np.maximum(elite.std(axis=0), 0.02), 0.0)
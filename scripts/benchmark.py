@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+from auv_core import ControlCore, ManualClock, NavigationCore
+from auv_core.allocation import DPRController, SSYController
+from auv_core.control import PID
+from auv_core.mpc import DPRPredictiveController
+from auv_core.perception import select_object, update_heading
+from auv_core.pid import PIDBank
+
+# Each benchmark makes its objects once and returns the call that is timed. Inputs cycle
+# through a fixed random sequence so every run does the same work.
+
+def random_inputs(scale, count=1000):
+    return itertools.cycle([tuple(row) for row in (np.random.default_rng(0).normal(size=(count, len(scale))) * scale).tolist()])
+
+def bench_pid():
+    pid = PID(1800, 0, 200)
+    errors = random_inputs([0.5])
+    return lambda: pid(*next(errors))
+
+def bench_pid_bank():
+    bank = PIDBank([1800, 40, 15, 10], [0, 0, 0, 0], [200, 7, 0, 1], 500, 0.05, wrap=[0, 0, 0, 360])
+    clock = ManualClock()
+    set_point = np.array([-0.25, 0, 0, 101])
+    errors = itertools.cycle(np.random.default_rng(0).normal(size=(1000, 4)) * [0.5, 20, 20, 90])
+    return lambda: bank.update(next(errors), clock.advance(0.02), set_point)
+
+def bench_dpr_control():
+    dpr = DPRController(0.5, 0.5)
+    outputs = random_inputs([500, 300, 300])
+    return lambda: dpr.control(*next(outputs))
+
+def bench_dpr_pid():
+    # Depth, pitch and roll through the PID bank and DPRController, what ~dpr_mode:=mpc replaces
+    bank = PIDBank([1800, 40, 15], [0, 0, 0], [200, 7, 0], 500)
+    dpr = DPRController(0.5, 0.5)
+    clock = ManualClock()
+    errors = itertools.cycle(np.random.default_rng(0).normal(size=(1000, 3)) * [0.5, 20, 20])
+
+    def call():
+        depth, pitch, roll = bank.update(next(errors), clock.advance(0.1))
+        dpr.control(depth, pitch, -roll)
+    return call
+
+def bench_dpr_mpc():
+    dpr = DPRController(0.5, 0.5)
+    mpc = DPRPredictiveController(dpr.A, [0.002, 0.05, 0.05], [1.0, 2.0, 2.0], 0.1, 20, [1e4, 1, 1, 1e2, 0.1, 0.1], 1e-4, 100)
+    errors = itertools.cycle(np.random.default_rng(0).normal(size=(1000, 3)) * [0.5, 20, 20])
+    lower = np.full(4, -500.0)
+    upper = np.full(4, 500.0)
+    solves = {'calls': 0, 'iterations': 0, 'residual': 0.0}
+
+    def call():
+        mpc.control(next(errors), 0, lower, upper)
+        solves['calls'] += 1
+        solves['iterations'] += mpc.iterations_used
+        solves['residual'] = max(solves['residual'], mpc.residual)
+    call.stats = lambda: {'iterations': solves['iterations'] / solves['calls'], 'max_residual': solves['residual']}
+    return call
+
+def bench_ssy_control():
+    ssy = SSYController(1)
+    outputs = random_inputs([2, 2, 3])
+    return lambda: ssy.control(*next(outputs))
+
+def bench_pwm_mapping():
+    # Thrust to PWM of all ten thrusters and the surge yaw and depth pitch roll selection
+    core = ControlCore(clock=ManualClock())
+    core.set_move('forward')
+    core.set_constrain_pwm(1400)
+    core.control_depth_pitch_roll(100, 5, -5)
+    core.control_surge_sway_yaw(0, 2.5, 0.5)
+
+    def call():
+        core.update_pwm()
+        core.surge_yaw()
+        core.depth_pitch_roll()
+    return call
+
+def bench_control_step():
+    # One error and one is_start through ControlCore, PID to PWM sent
+    clock = ManualClock(2.0)
+    core = ControlCore(clock=clock)
+    core.set_move('forward')
+    errors = random_inputs([0.5, 20, 20, 90])
+
+    def call():
+        clock.advance(0.02)
+        core.set_error(*next(errors))
+        core.set_is_start(True)
+    return call
+
+def bench_navigation_error():
+    navigation = NavigationCore(ManualClock())
+    navigation.set_set_point(-0.25, 0, 0, -101)
+    readings = random_inputs([0.5, 20, 20, 180])
+    return lambda: navigation.set_sensor(*next(readings))
+
+def bench_accumulator_bboxes():
+    # A busy frame, gates, a bucket and obstacles with some below the probability thresholds
+    rng = np.random.default_rng(0)
+    boxes = []
+    for class_name in ['Gate', 'Gate', 'Gate', 'Bucket', 'Obstacle', 'Obstacle', 'Obstacle', 'Flare']:
+        x_min, y_min = rng.integers(0, 500, size=2).tolist()
+        width, height = rng.integers(20, 140, size=2).tolist()
+        boxes.append(SimpleNamespace(class_name=class_name, probability=float(rng.uniform(0.8, 1.0)), x_min=x_min, y_min=y_min, x_max=x_min + width, y_max=y_min + height))
+    return lambda: select_object(boxes)
+
+def bench_heading_parser():
+    heading = SimpleNamespace(mag_x=0, mag_y=0, mag_z=0, yaw=0.0)
+    line = 'Magx:-123,Magy:456,Magz:-789,Yaw:91.52'
+
+    def call():
+        for _ in update_heading(line, heading):
+            pass
+    return call
+
+BENCHMARKS = {
+    'pid': bench_pid,
+    'pid_bank': bench_pid_bank,
+    'dpr_control': bench_dpr_control,
+    'dpr_pid': bench_dpr_pid,
+    'dpr_mpc': bench_dpr_mpc,
+    'ssy_control': bench_ssy_control,
+    'pwm_mapping': bench_pwm_mapping,
+    'control_step': bench_control_step,
+    'navigation_error': bench_navigation_error,
+    'accumulator_bboxes': bench_accumulator_bboxes,
+    'heading_parser': bench_heading_parser,
+}
+
+def measure(call, number, repeat):
+    for _ in range(min(number, 1000)):
+        call()
+
+    # Best and median time per call over the repeats
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        times.append((time.perf_counter() - start) / number)
+
+    # Blocks still allocated after the calls (growth per call, not every allocation) and
+    # the peak of temporary memory during them, which is what the calls allocate and free
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_size = tracemalloc.get_traced_memory()[0]
+    start_blocks = sys.getallocatedblocks()
+    for _ in range(number):
+        call()
+    blocks = sys.getallocatedblocks() - start_blocks
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'best_us': min(times) * 1e6,
+        'median_us': float(np.median(times)) * 1e6,
+        'retained_blocks_per_call': blocks / number,
+        'retained_bytes': size - start_size,
+        'peak_bytes': peak - start_size,
+    }
+    # Figures of the work done per call, e.g. solver iterations
+    if hasattr(call, 'stats'):
+        result.update(call.stats())
+    return result
+
+def compare(results, baseline, tolerance):
+    # Regressions of the best time and of the memory against the baseline results
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['best_us'] / base['best_us']
+        result['baseline_ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(f'{name}: {result["best_us"]:.2f} us per call, baseline {base["best_us"]:.2f} us ({ratio:.2f}x)')
+        # Growth of a few blocks per thousand calls is noise from the interpreter
+        retained = base.get('retained_blocks_per_call', base.get('blocks_per_call', 0))
+        if result['retained_blocks_per_call'] > retained + 0.01:
+            regressions.append(f'{name}: {result["retained_blocks_per_call"]:.3f} blocks kept per call, baseline {retained:.3f}')
+        if result['peak_bytes'] > base['peak_bytes'] * (1 + tolerance) + 4096:
+            regressions.append(f'{name}: peak {result["peak_bytes"]} bytes, baseline {base["peak_bytes"]} bytes')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the control, navigation and perception hot paths, no ROS needed')
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('-n', '--number', type=int, default=10000, help='calls per repeat')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write the results to this JSON file, e.g. to make a baseline')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare against, exits with 1 on a regression')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.3, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(bench(), args.number, args.repeat)
+        result = results[name]
+        print(f'{name:20s} {result["best_us"]:8.2f} us best {result["median_us"]:8.2f} us median {result["retained_blocks_per_call"]:6.3f} kept blocks/call {result["peak_bytes"]:8d} B peak' + ''.join(f' {key} {result[key]:.3g}' for key in ('iterations', 'max_residual') if key in result))
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline['results'], args.tolerance)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'number': args.number,
+                'repeat': args.repeat,
+                'results': results,
+            }, file, indent=2)
+
+    if regressions:
+        print(f'\n{len(regressions)} REGRESSIONS against {args.baseline}', file=sys.stderr)
+        for regression in regressions:
+            print('  ' + regression, file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import logging
+import rospy
+from rospy.msg import args_kwds_to_message
+
+class LocalPublisher():
+    def __init__(self, name, data_class, callbacks, mirror=None):
+        self.name = name
+        self.data_class = data_class
+        self.callbacks = callbacks
+        self.mirror = mirror
+
+    def publish(self, *args, **kwds):
+        # Messages are handed over by reference, subscribers must not modify them
+        message = args_kwds_to_message(self.data_class, args, kwds)
+        for callback in self.callbacks:
+            try:
+                callback(message)
+            except Exception:
+                rospy.logerr('Error in %s callback', self.name, exc_info=True)
+        if self.mirror is not None:
+            self.mirror.publish(message)
+
+    def get_num_connections(self):
+        return len(self.callbacks) + (self.mirror.get_num_connections() if self.mirror is not None else 0)
+
+class LocalBus():
+    def __init__(self, topics, mirrored=()):
+        # Topics in the list connect the components with direct calls, the others stay on ROS.
+        # Mirrored local topics are also published on ROS for nodes outside the process.
+        self.topics = {rospy.resolve_name(topic) for topic in topics}
+        self.mirrored = {rospy.resolve_name(topic) for topic in mirrored}
+        self.callbacks = {topic: [] for topic in self.topics}
+
+    def Publisher(self, name, data_class, *args, **kwargs):
+        topic = rospy.resolve_name(name)
+        if topic not in self.topics:
+            return rospy.Publisher(name, data_class, *args, **kwargs)
+        mirror = rospy.Publisher(name, data_class, *args, **kwargs) if topic in self.mirrored else None
+        return LocalPublisher(topic, data_class, self.callbacks[topic], mirror)
+
+    def Subscriber(self, name, data_class, callback, *args, **kwargs):
+        topic = rospy.resolve_name(name)
+        if topic not in self.topics:
+            return rospy.Subscriber(name, data_class, callback, *args, **kwargs)
+        # Callbacks run in the publishing thread, in the order they subscribed
+        self.callbacks[topic].append(callback)
+
+def log_to_rosout(name='auv_core', level=logging.INFO):
+    # The cores log through Python logging. Called after init_node, their records take the
+    # handlers of rospy.loginfo: the console, the node log file and /rosout.
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in logging.getLogger('rosout').handlers:
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
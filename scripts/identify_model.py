@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+import numpy as np
+import yaml
+from auv_core.identification import SystemIdentification, control_model, imu_angles, simulator_model
+from auv_core.telemetry import load_telemetry
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
+
+# Logs are handed over in batches of this many rows, bags in windows of this many seconds
+# of every stream
+BATCH = 512
+WINDOW = 1.0
+
+CONTROL_HEADER = """# Model of node_control identified by scripts/identify_model.py, loaded with
+# <rosparam command="load" file="$(find robotic_sas_auv_ros)/config/model_identified.yaml" ns="node_control"/>
+"""
+
+SIMULATOR_HEADER = """# Vehicle of node_simulator identified by scripts/identify_model.py, see config/simulator.yaml
+"""
+
+def load_yaml(path):
+    if path is None:
+        return {}
+    with open(path) as file:
+        return yaml.safe_load(file) or {}
+
+def read_bag(path, identification, topics):
+    # rosbag is only needed for bags, the messages are read one by one in time order
+    import rosbag
+
+    streams = {topic: stream for stream, topic in topics.items()}
+    batches = {stream: ([], []) for stream in topics}
+
+    def add_batches():
+        for stream, (stamps, batch) in batches.items():
+            if stamps:
+                identification.add(stream, stamps, batch)
+                stamps.clear()
+                batch.clear()
+
+    window_end = -np.inf
+    with rosbag.Bag(path) as bag:
+        for topic, msg, t in bag.read_messages(topics=list(streams)):
+            stamp = t.to_sec()
+            if stamp >= window_end:
+                add_batches()
+                window_end = stamp + WINDOW
+            stream = streams[topic]
+            if stream == 'pwm':
+                values = [getattr(msg, 'thruster_%d' % (i + 1)) for i in range(10)]
+            elif stream == 'depth':
+                values = msg.depth
+            elif stream == 'attitude':
+                values = imu_angles(msg.orientation.x, msg.orientation.y, msg.orientation.z, msg.orientation.w)
+            else:
+                values = msg.data
+
+            stamps, batch = batches[stream]
+            stamps.append(stamp)
+            batch.append(values)
+    add_batches()
+
+def read_mission_log(path, identification):
+    # Log of scripts/simulate_mission.py, true depth and attitude at the is_start rate
+    with np.load(path) as log:
+        stamps = log['time']
+        for start in range(0, len(stamps), BATCH):
+            piece = slice(start, start + BATCH)
+            identification.add('pwm', stamps[piece], log['pwm'][piece])
+            identification.add('depth', stamps[piece], log['position'][piece, 2])
+            identification.add('attitude', stamps[piece], log['attitude'][piece, :2])
+            identification.add('yaw', stamps[piece], log['attitude'][piece, 2])
+
+def read_telemetry(path, identification, window=10.0):
+    # Run of node_recorder, /filterYaw is not recorded, the yaw of the sensor topic is used.
+    # The columns are read a window of time at a time in the order the streams arrived.
+    run = load_telemetry(path)
+    pwm, imu, arduino_sensor, sensor = run['pwm_actuator'], run['imu'], run['arduino_sensor'], run['sensor']
+    channels = [pwm, imu, arduino_sensor, sensor]
+    if any(channel.count == 0 for channel in channels):
+        return
+    start = min(channel.time[0] for channel in channels)
+    end = max(channel.time[-1] for channel in channels)
+    for low in np.arange(start, end + window, window):
+        pieces = [slice(*np.searchsorted(channel.time, [low, low + window])) for channel in channels]
+        rows = pieces[0]
+        identification.add('pwm', pwm.time[rows], np.column_stack([getattr(pwm, 'thruster_%d' % (i + 1))[rows] for i in range(10)]))
+        rows = pieces[1]
+        identification.add('attitude', imu.time[rows], np.column_stack(imu_angles(imu.qx[rows], imu.qy[rows], imu.qz[rows], imu.qw[rows])))
+        rows = pieces[2]
+        identification.add('depth', arduino_sensor.time[rows], arduino_sensor.depth[rows])
+        rows = pieces[3]
+        identification.add('yaw', sensor.time[rows], sensor.yaw[rows])
+
+def stream_rate(stamps):
+    return (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 and stamps[-1] > stamps[0] else np.inf
+
+def source_rate(path, topics):
+    # Rate of the slowest stream of a log, read from the stamps or the bag index only
+    if path.endswith('.npz'):
+        with np.load(path) as log:
+            return stream_rate(log['time'])
+    if os.path.isdir(path):
+        run = load_telemetry(path)
+        return min(stream_rate(run[name].time) for name in ('pwm_actuator', 'imu', 'arduino_sensor', 'sensor'))
+    import rosbag
+    with rosbag.Bag(path) as bag:
+        info = bag.get_type_and_topic_info().topics
+    return min((info[topic].frequency for topic in topics.values() if topic in info and info[topic].frequency), default=np.inf)
+
+def write_yaml(path, header, data):
+    with open(path, 'w') as file:
+        file.write(header)
+        yaml.safe_dump(data, file, default_flow_style=None, sort_keys=False)
+    print(f'written to {path}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit heave, pitch, roll and yaw dynamics and thruster gains from recorded runs')
+    parser.add_argument('logs', nargs='+', help='rosbag files, run directories of node_recorder or .npz logs of simulate_mission.py')
+    parser.add_argument('--rate', type=float, help='rate of the resampled grid, at most and by default the rate of the slowest stream, Hz')
+    parser.add_argument('--span', type=int, default=2, help='rows on each side of the derivative window')
+    parser.add_argument('--chunk-size', type=int, default=4096, help='rows per chunk, bounds the memory in use')
+    parser.add_argument('--max-age', type=float, default=0.2, help='rows where a stream is older than this are left out, s')
+    parser.add_argument('--pwm-topic', default='/nuc/pwm_actuator')
+    parser.add_argument('--imu-topic', default='/imu')
+    parser.add_argument('--sensor-topic', default='/rosserial/sensor')
+    parser.add_argument('--yaw-topic', default='/filterYaw')
+    parser.add_argument('--simulator', default=os.path.join(CONFIG_DIR, 'simulator.yaml'), help='vehicle the fit starts from, lever arms and thrust per us are kept')
+    parser.add_argument('--simulator-output', help='write the simulator configuration with the identified model to this file')
+    parser.add_argument('--control-output', help='write mpc_model_gain and mpc_model_damping of node_control to this file')
+    args = parser.parse_args()
+
+    simulator_config = load_yaml(args.simulator)
+    topics = {'pwm': args.pwm_topic, 'attitude': args.imu_topic, 'depth': args.sensor_topic, 'yaw': args.yaw_topic}
+
+    start = time.perf_counter()
+    # Above the rate of the slowest stream the grid only repeats its samples and the
+    # derivatives of the repeated rows are zero
+    rate = min(source_rate(path, topics) for path in args.logs)
+    if not np.isfinite(rate):
+        parser.error('the logs have no samples to fit')
+    if args.rate is not None and args.rate > rate:
+        print(f'--rate {args.rate:g} Hz is above the rate of the slowest stream, {rate:.1f} Hz is used')
+    elif args.rate is not None:
+        rate = args.rate
+
+    # Every log is a run of its own, the fit is over all of them
+    identification = SystemIdentification(simulator_config, rate, args.span, args.chunk_size, args.max_age)
+    for path in args.logs:
+        identification.new_run()
+        if path.endswith('.npz'):
+            read_mission_log(path, identification)
+        elif os.path.isdir(path):
+            read_telemetry(path, identification)
+        else:
+            read_bag(path, identification, topics)
+    result = identification.fit()
+    print(f'{len(args.logs)} logs at {rate:.1f} Hz in {time.perf_counter() - start:.1f} s')
+
+    for axis, fit in result.items():
+        if fit is None:
+            print(f'{axis:6s} not enough samples')
+            continue
+        gains = ' '.join(f'{i + 1}:{gain:.4f}' for i, gain in enumerate(fit['gains']) if not np.isnan(gain))
+        print(f'{axis:6s} R2 {fit["r2"]:.3f} on {fit["samples"]} rows, damping {fit["damping"]:.3f} + {fit["quadratic_damping"]:.3f}|rate|, stiffness {fit["stiffness"]:.3f}, offset {fit["offset"]:.4f}')
+        print(f'       gain per thruster {gains}' + (' (one gain, the thrusters always ran together)' if fit['shared_gain'] else ''))
+        if fit['problems']:
+            print(f'       not exported: {", ".join(fit["problems"])}')
+
+    model = simulator_model(result, simulator_config)
+    control = control_model(result, simulator_config)
+    print('simulator', model)
+    print('node_control', control)
+
+    if args.simulator_output is not None and model:
+        write_yaml(args.simulator_output, SIMULATOR_HEADER, dict(simulator_config, **model))
+    if args.control_output is not None and control:
+        write_yaml(args.control_output, CONTROL_HEADER, control)
+    if (args.simulator_output is not None and not model) or (args.control_output is not None and not control):
+        print('nothing identified to write for some of the outputs, see above')
+
+if __name__ == '__main__':
+    main()
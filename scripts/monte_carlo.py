@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import yaml
+from auv_core.monte_carlo import FIELDS, MONTE_CARLO_DEFAULTS, init_worker, run_scenario, sample_scenarios, summarize
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
+
+def load_yaml(path):
+    if path is None:
+        return {}
+    with open(path) as file:
+        return yaml.safe_load(file) or {}
+
+def format_row(values):
+    return ' '.join(f'{value:8.2f}' for value in values)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the node_guidance_last mission many times against the simulator with random currents, sensor noise, buoyancy and start heading')
+    parser.add_argument('-n', '--runs', type=int, default=1000)
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='worker processes, all cores by default')
+    parser.add_argument('-d', '--duration', type=float, default=100, help='simulated seconds of every run')
+    parser.add_argument('--simulator', default=os.path.join(CONFIG_DIR, 'simulator.yaml'), help='vehicle and pool, see config/simulator.yaml')
+    parser.add_argument('--control', nargs='*', default=[], help='node_control parameter files, e.g. config/gain_schedule.yaml')
+    parser.add_argument('--mission', help='YAML file with mission_steps, the timed moves of node_guidance_last')
+    parser.add_argument('--spread', help='YAML file overriding the spread of the scenarios: ' + ', '.join(MONTE_CARLO_DEFAULTS))
+    parser.add_argument('--delay', type=float, default=4, help='/nuc/delay')
+    parser.add_argument('--arming-duration', type=float, default=1, help='/nuc/arming_duration')
+    parser.add_argument('--rate', type=float, default=10, help='/nuc/rate, is_start messages per second')
+    parser.add_argument('--dt', type=float, default=0.01, help='physics step')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the scenarios, run i uses seed + i')
+    parser.add_argument('-o', '--output', help='save the scenario and outcome of every run to this .npz file')
+    args = parser.parse_args()
+
+    control_config = {}
+    for path in args.control:
+        control_config.update(load_yaml(path))
+    simulator_config = load_yaml(args.simulator)
+    steps = load_yaml(args.mission).get('mission_steps') if args.mission else None
+    mission_options = dict(delay=args.delay, arming_duration=args.arming_duration, rate=args.rate, dt=args.dt)
+
+    scenarios = sample_scenarios(args.runs, args.seed, load_yaml(args.spread), simulator_config)
+    tasks = [(args.seed + i, scenario) for i, scenario in enumerate(scenarios)]
+
+    # Runs are independent, a few per task keeps the pickling overhead low
+    start = time.perf_counter()
+    results = np.empty((args.runs, len(FIELDS)))
+    chunksize = max(args.runs // (args.processes * 8), 1)
+    initargs = (simulator_config, control_config, steps, args.duration, mission_options)
+    with Pool(args.processes, init_worker, initargs) as pool:
+        for i, row in enumerate(pool.imap_unordered(run_scenario, tasks, chunksize)):
+            results[i] = row
+    elapsed = time.perf_counter() - start
+    # Back in the order of the seeds
+    results = results[np.argsort(results[:, 0])]
+
+    summary = summarize(results)
+    print(f'{args.runs} runs of {args.duration:.0f} s in {elapsed:.1f} s on {args.processes} processes')
+    print(f'success {summary["success_rate"]:.1%}, gate {summary["gate_rate"]:.1%}, bucket {summary["bucket_rate"]:.1%}')
+    print(f'{"":16s} {"p5":>8s} {"p50":>8s} {"p95":>8s}')
+    print(f'{"time to gate":16s} {format_row(summary["time_to_gate"])}')
+    print(f'{"time to bucket":16s} {format_row(summary["time_to_bucket"])}')
+    print(f'{"|pitch| max":16s} {format_row(summary["max_pitch"])}')
+    print(f'{"|roll| max":16s} {format_row(summary["max_roll"])}')
+    print(f'{"final x y depth":16s} mean {format_row(summary["final_mean"])}  std {format_row(summary["final_std"])}')
+
+    if args.output is not None:
+        np.savez(args.output, fields=np.array(FIELDS), results=results)
+
+if __name__ == '__main__':
+    main()
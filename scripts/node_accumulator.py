@@ -5,9 +5,10 @@ from std_msgs.msg import Bool, Float32, String
 from sensor_msgs.msg import Imu
 from robotic_sas_auv_ros.msg import ArduinoSensor, Sensor, ObjectDifference, ObjectDetection, Heading
 from nav_msgs.msg import Odometry
+from auv_core.perception import select_object
 
 class Subscriber():
-    def __init__(self):
+    def __init__(self, bus=rospy):
         self.is_pre_calibrating = False
 
         self.offset_roll = 0
@@ -17,23 +18,25 @@ class Subscriber():
         self.perintah = "tes"
 
         self.sensor = Sensor()
+        # Receive stamp of each input, the sensor message carries the oldest one
+        self.input_stamps = {}
         self.object_detection = ObjectDetection()
         self.object_difference = ObjectDifference()
 
         # Publisher
-        self.pub_sensor = rospy.Publisher('sensor', Sensor, queue_size=10)
-        self.pub_object_difference = rospy.Publisher('object_difference', ObjectDifference, queue_size=10)
-        self.pub_perintah = rospy.Publisher('perintah', String, queue_size=10)
-        self.pub_largest_object = rospy.Publisher('largest_object', String, queue_size=10)
+        self.pub_sensor = bus.Publisher('sensor', Sensor, queue_size=10)
+        self.pub_object_difference = bus.Publisher('object_difference', ObjectDifference, queue_size=10)
+        self.pub_perintah = bus.Publisher('perintah', String, queue_size=10)
+        self.pub_largest_object = bus.Publisher('largest_object', String, queue_size=10)
 
         # Subscriber
-        rospy.Subscriber('is_start', Bool, self.callback_is_start)
-        rospy.Subscriber('/imu', Imu, self.callback_imu)
-        rospy.Subscriber('/witmotion/heading', Heading, self.callback_heading)
-        rospy.Subscriber('/camera/odom/sample', Odometry, self.callback_odometry)
-        rospy.Subscriber('/rosserial/sensor', ArduinoSensor, self.callback_arduino_sensor)
-        rospy.Subscriber('/filterYaw', Float32, self.callback_filterYaw)
-        rospy.Subscriber('/nuc/object_detection', ObjectDetection, self.object_detection_callback)
+        bus.Subscriber('is_start', Bool, self.callback_is_start)
+        bus.Subscriber('/imu', Imu, self.callback_imu)
+        bus.Subscriber('/witmotion/heading', Heading, self.callback_heading)
+        bus.Subscriber('/camera/odom/sample', Odometry, self.callback_odometry)
+        bus.Subscriber('/rosserial/sensor', ArduinoSensor, self.callback_arduino_sensor)
+        bus.Subscriber('/filterYaw', Float32, self.callback_filterYaw)
+        bus.Subscriber('/nuc/object_detection', ObjectDetection, self.object_detection_callback)
 
     def pre_calibrate(self):
         # Set offset values in order to set the initial sensor value to zero
@@ -52,6 +55,7 @@ class Subscriber():
     # Collect Arduino Sensor Data
     def callback_arduino_sensor(self, data: ArduinoSensor):
         self.sensor.depth = data.depth 
+        self.input_stamps['depth'] = rospy.Time.now()
 
     # Collect Realsense Position Datas
     def callback_odometry(self, data: Odometry):
@@ -64,6 +68,7 @@ class Subscriber():
         self.sensor.roll = 180/math.pi*(math.atan2(2.0*(data.orientation.y*data.orientation.z + data.orientation.w*data.orientation.x), data.orientation.w*data.orientation.w - data.orientation.x*data.orientation.x - data.orientation.y*data.orientation.y + data.orientation.z*data.orientation.z))
         self.sensor.pitch = 180/math.pi*(math.asin(-2.0*(data.orientation.x*data.orientation.z - data.orientation.w*data.orientation.y)))
         # self.sensor.yaw = 180/math.pi*(math.atan2(2.0*(data.orientation.x*data.orientation.y + data.orientation.w*data.orientation.z), data.orientation.w*data.orientation.w + data.orientation.x*data.orientation.x - data.orientation.y*data.orientation.y - data.orientation.z*data.orientation.z))
+        self.input_stamps['imu'] = rospy.Time.now() if data.header.stamp.is_zero() else data.header.stamp
 
     # Collect Heading Date
     def callback_heading(self, data: Heading):
@@ -72,56 +77,25 @@ class Subscriber():
 
     def callback_filterYaw(self, data: Float32):
         self.sensor.yaw = data.data
+        self.input_stamps['yaw'] = rospy.Time.now()
 
     def object_detection_callback(self, data):
 
+        # Camera frame stamp and trace id go on to node_control
+        self.object_difference.header.stamp = data.header.stamp
+        self.object_difference.trace_id = data.trace_id
         self.object_difference.object_type = "None"
         self.object_difference.x_difference = 0
-        self.largest = 0
-        self.largest_object = "None"
-        self.x_gate_list = []
-
-        # Center x-coordinate of the frame
-        frame_center_x = 640 // 2
         # rospy.loginfo("Received object detection message")
-        for bbox in data.bounding_boxes:
-            # Calculate the center x-coordinate of the bounding box
-            center_x = (bbox.x_min + bbox.x_max) // 2
-            x_difference = center_x - frame_center_x
-            bbox_area = (bbox.x_max - bbox.x_min) * (bbox.y_max - bbox.y_min)
-
-            if bbox.class_name == "Obstacle" and bbox.probability >= 0.87 :
-                self.perintah = "Avoid"
-                self.pub_perintah.publish(self.perintah)
-                if bbox_area > self.largest:
-                    self.largest = bbox_area
-                    self.largest_object = "Obstacle"
-
-            if bbox.class_name == "Bucket":
-                self.perintah = "Drop"
-                self.pub_perintah.publish(self.perintah)
-                if bbox_area > self.largest:
-                    self.largest = bbox_area
-                    self.largest_object = "Bucket"
-
-            if bbox.class_name == "Gate" and bbox.probability >= 0.88:
-                self.perintah = "Centering"
-                self.pub_perintah.publish(self.perintah)
-                self.x_gate_list.append((bbox, x_difference))
-                if bbox_area > self.largest:
-                    self.largest = bbox_area
-                    self.largest_object = "Gate"
-
-        # If two gates detected, select the one with the smallest x_difference
-        if len(self.x_gate_list) > 1:
-            self.x_gate_list.sort(key=lambda x: abs(x[1]))
-            selected_gate = self.x_gate_list[0]
-            self.object_difference.object_type = selected_gate[0].class_name
-            self.object_difference.x_difference = selected_gate[1]
-        elif self.x_gate_list:
-            selected_gate = self.x_gate_list[0]
-            self.object_difference.object_type = selected_gate[0].class_name
-            self.object_difference.x_difference = selected_gate[1]
+        commands, self.largest_object, object_type, x_difference = select_object(data.bounding_boxes)
+        for command in commands:
+            self.perintah = command
+            self.pub_perintah.publish(self.perintah)
+
+        # If two gates detected, the one with the smallest x_difference
+        if object_type != "None":
+            self.object_difference.object_type = object_type
+            self.object_difference.x_difference = x_difference
 
         if self.largest_object == "Obstacle":
             self.pub_largest_object.publish("Obstacle")
@@ -137,6 +111,8 @@ class Subscriber():
 
         # Condition for pre calibrating
         if data.data:
+            self.sensor.trace_id += 1
+            self.sensor.header.stamp = min(self.input_stamps.values()) if self.input_stamps else rospy.Time.now()
             self.pub_sensor.publish(self.sensor)
         else:
             self.pre_calibrate()
@@ -1,375 +1,163 @@
 #!/usr/bin/env python3
 
 import rospy
-import time
-from std_msgs.msg import Bool, Int32, String
-from robotic_sas_auv_ros.msg import Error, Actuator, IsStable, ObjectDifference
+from std_msgs.msg import Bool, Float32, Int32, String, UInt16
+from robotic_sas_auv_ros.msg import ArduinoSensor, Error, Actuator, ActuatorCompact, LoopTiming, ObjectDifference, SetPoint, Trace
 import numpy as np
-
-class DPRController: # Depth Pitch Roll
-    def __init__(self, Lx, Ly):
-        self.Lx = Lx
-        self.Ly = Ly
-
-        # Control matrix A
-        self.A = np.array([
-            [ Ly, -Ly,  Ly, -Ly],  # Roll contributions
-            [ Lx,  Lx, -Lx, -Lx],  # Pitch contributions 
-            [  1,   1,   1,   1]   # Depth contributions
-        ])
-
-    def control(self, control_depth, control_pitch, control_roll):
-        desired_control = np.array([control_depth, control_pitch, control_roll])
-        
-        T = np.linalg.pinv(self.A).dot(desired_control)
-
-        return T
-
-class SSYController:
-    def __init__(self, d):
-        self.d = d
-        self.sqrt2 = np.sqrt(2)
-
-        self.M = np.array([
-            [-1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, -1/self.sqrt2],
-            [1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2],
-            [d/2, -d/2, -d/2, d/2],
-            [1, -1, 1, -1]  # Kontribusi untuk momen yaw
-        ])
-
-    def control(self, Fx, Fy, tau):
-        # Vektor gaya yang diinginkan
-        F = np.array([Fx, Fy, 0, tau])  # tau dimasukkan ke koordinat keempat
-        
-        # Menghitung thrust yang diperlukan menggunakan pseudo-inverse matriks
-        T = np.dot(np.linalg.pinv(self.M), F)
-
-        return T
-
-class PID():
-    def __init__(self, kp, ki, kd):
-        self.kp = kp
-        self.ki = ki
-        self.kd = kd
-        self.integral_max = 80
-
-        self.proportional = 0
-        self.integral = 0
-        self.derivative = 0
-
-        self.start_time = rospy.get_time()
-        self.last_time = 0
-        self.last_error = 0
-
-    def __call__(self, error):
-        dt = rospy.get_time() - (self.last_time if self.last_time is not None else self.start_time)
-        d_error = error - self.last_error
-
-        self.proportional = self.kp * error
-        self.integral += -self.ki * error * dt
-        self.derivative = self.kd * d_error / dt
-
-        # if self.integral > self.integral_max:
-        #     self.integral = self.integral_max
-        # elif self.integral < -self.integral_max:
-        #     self.integral = -self.integral_max
-
-        self.last_error = error
-        self.last_time = rospy.get_time()
-
-        return self.proportional + self.integral + self.derivative
-
-class ThrusterMovement():
-    def __init__(self):
-        self.pwm_actuator = Actuator()
-        self.pwm_actuator.thruster_1 = 1500
-        self.pwm_actuator.thruster_2 = 1500
-        self.pwm_actuator.thruster_3 = 1500
-        self.pwm_actuator.thruster_4 = 1500
-        self.pwm_actuator.thruster_5 = 1500
-        self.pwm_actuator.thruster_6 = 1500
-        self.pwm_actuator.thruster_7 = 1500
-        self.pwm_actuator.thruster_8 = 1500
-        self.pwm_actuator.thruster_9 = 1500
-        self.pwm_actuator.thruster_10 = 1500
-
-        self.pub_pwm_actuator = rospy.Publisher('pwm_actuator', Actuator, queue_size=10)
-
-    def go_surface(self, pwm_thruster_1, pwm_thruster_2, pwm_thruster_3, pwm_thruster_4, pwm_thruster_9, pwm_thruster_10):
-        self.pwm_actuator.thruster_1 = pwm_thruster_1
-        self.pwm_actuator.thruster_2 = pwm_thruster_2
-        self.pwm_actuator.thruster_3 = pwm_thruster_3
-        self.pwm_actuator.thruster_4 = pwm_thruster_4
-        self.pwm_actuator.thruster_9 = pwm_thruster_9
-        self.pwm_actuator.thruster_10 = pwm_thruster_10
-
-    def surge_sway_yaw(self, pwm_thruster_1, pwm_thruster_2, pwm_thruster_3, pwm_thruster_4, pwm_thruster_9, pwm_thruster_10):
-        self.pwm_actuator.thruster_1 = pwm_thruster_1
-        self.pwm_actuator.thruster_2 = pwm_thruster_2
-        self.pwm_actuator.thruster_3 = pwm_thruster_3
-        self.pwm_actuator.thruster_4 = pwm_thruster_4
-        self.pwm_actuator.thruster_9 = pwm_thruster_9
-        self.pwm_actuator.thruster_10 = pwm_thruster_10
-
-    def depth_pitch_roll(self, pwm_thruster_5, pwm_thruster_6, pwm_thruster_7, pwm_thruster_8):
-        self.pwm_actuator.thruster_5 = pwm_thruster_5
-        self.pwm_actuator.thruster_6 = pwm_thruster_6
-        self.pwm_actuator.thruster_7 = pwm_thruster_7
-        self.pwm_actuator.thruster_8 = pwm_thruster_8
-
-    def stop(self):
-        self.pwm_actuator.thruster_1 = 1500
-        self.pwm_actuator.thruster_2 = 1500
-        self.pwm_actuator.thruster_3 = 1500
-        self.pwm_actuator.thruster_4 = 1500
-        self.pwm_actuator.thruster_5 = 1500
-        self.pwm_actuator.thruster_6 = 1500
-        self.pwm_actuator.thruster_7 = 1500
-        self.pwm_actuator.thruster_8 = 1500
-        self.pwm_actuator.thruster_9 = 1500
-        self.pwm_actuator.thruster_10 = 1500
-
-    def publish(self):
-        print('Publish PWM')
-        print(self.pwm_actuator)
-        self.pub_pwm_actuator.publish(self.pwm_actuator)
-
-class Subscriber():
-    def __init__(self):
-        self.is_start = False
-        self.move = "stop"
-        self.boot_time = 0
-        self.start_time = 0
-        self.object_difference = ObjectDifference()
-        self.error = Error()
-        self.is_stable = IsStable()
-        self.ssyController = SSYController(1)
-        self.dprController = DPRController(0.5, 0.5)
-        self.movement = ThrusterMovement()
-        self.movement.stop()
-
-        self.param_delay = rospy.get_param('/nuc/delay')
-        self.param_arming_duration = rospy.get_param('/nuc/arming_duration')
-
-        self.pid_depth = PID(1800, 0, 200)
-        # self.pid_depth = PID(1700, 0, 200)
-
-        self.pid_roll = PID(15, 0, 0)
-
-        # self.pid_pitch = PID(15, 0, 7)
-        self.pid_pitch = PID(40, 0, 7)
-        
-        self.pid_sway = PID(6, 0, 0)
-        
-        self.pid_yaw = PID(10, 0, 1)
-
-        self.pid_camera = PID(1, 0, 0)
-
-        self.is_armed = False
-        self.is_pre_calibrating = False
-        self.dive = False
-
-        self.thrust_depth_pitch_roll = [0,0,0,0]
-        self.offset_depth_pitch_roll = [0,0,0,0]
-        self.thrust_surge_sway_yaw = [0,0,0,0]
-        self.offset_surge_sway_yaw = [0,0,0,0]
-
-        self.constrain_pwm_min = 0
-        self.constrain_pwm_max = 0
-
-        self.is_stable.depth = False
-        self.is_stable.yaw = False
-        self.is_stable.pitch = False
-        self.is_stable.roll = False
+from auv_core.control import CONTROL_DEFAULTS, ControlCore, ControlOutputs
+from bus import log_to_rosout
+
+# PWM step of ActuatorCompact, int8 * 4 covers 1500 +- 508
+COMPACT_PWM_STEP = 4
+
+class Subscriber(ControlOutputs):
+    def __init__(self, bus=rospy):
+        # Every parameter of the core is a private parameter of the node
+        config = {key: rospy.get_param('~' + key, default) for key, default in CONTROL_DEFAULTS.items()}
+        config['arming_duration'] = rospy.get_param('/nuc/arming_duration')
+        # float: Actuator on pwm_actuator, compact: ActuatorCompact on pwm_actuator_compact, both
+        self.param_actuator_format = rospy.get_param('~actuator_format', 'float')
+
+        # float: Actuator, compact: ActuatorCompact (14 instead of 40 bytes on the serial link), both
+        self.pwm_compact = np.zeros(10)
+        self.actuator_compact = ActuatorCompact()
+        self.actuator_compact.pwm = [0] * 10
+        if self.param_actuator_format != 'compact':
+            self.pub_pwm_actuator = rospy.Publisher('pwm_actuator', Actuator, queue_size=10)
+        if self.param_actuator_format != 'float':
+            self.pub_pwm_actuator_compact = rospy.Publisher('pwm_actuator_compact', ActuatorCompact, queue_size=10)
+
+        self.pub_dive = bus.Publisher('dive',Bool,queue_size=10)
+        self.pub_battery_compensation = bus.Publisher('battery_compensation', Float32, queue_size=10)
+
+        # Stamp and trace id of the sensor reading or camera frame behind the last PWM sent
+        self.trace = Trace()
+        self.pub_trace = bus.Publisher('actuator_trace', Trace, queue_size=10)
+
+        self.core = ControlCore(config, rospy.get_time, self)
+        self.movement = self.core.movement
 
         # Subscriber
-        rospy.Subscriber('constrain_pwm', Int32, self.callback_constrain_pwm)
-        rospy.Subscriber('error', Error, self.callback_error)
-        rospy.Subscriber('is_start', Bool, self.callback_is_start)
-        rospy.Subscriber('move', String, self.callback_move)
-        rospy.Subscriber('object_difference', ObjectDifference, self.callback_object_difference)
-
-        self.pub_dive = rospy.Publisher('dive',Bool,queue_size=10)
-
-    def constrain(self, value, _min, _max):
-        return min(max(value, _min), _max)
-    
-    def pre_calibrate(self):
-        self.offset_surge_sway_yaw[0] = self.thrust_surge_sway_yaw[0]
-        self.offset_surge_sway_yaw[1] = self.thrust_surge_sway_yaw[1]
-        self.offset_surge_sway_yaw[2] = self.thrust_surge_sway_yaw[2]
-        self.offset_surge_sway_yaw[3] = self.thrust_surge_sway_yaw[3]
-
-        self.offset_depth_pitch_roll[0] = self.thrust_depth_pitch_roll[0]
-        self.offset_depth_pitch_roll[1] = self.thrust_depth_pitch_roll[1]
-        self.offset_depth_pitch_roll[2] = self.thrust_depth_pitch_roll[2]
-        self.offset_depth_pitch_roll[3] = self.thrust_depth_pitch_roll[3]
-
-    def is_in_range(self, start_time, end_time):
-        return (self.boot_time > start_time and end_time is None) or (start_time) < self.boot_time < (end_time)
-
-    def get_offset(self, offset):
-        return offset if not self.is_pre_calibrating else 0
-    
-    def surface(self):
-        pwm_thruster_1 = 1500
-        pwm_thruster_2 = 1500
-        pwm_thruster_3 = 1500
-        pwm_thruster_4 = 1500
-        pwm_thruster_9 = 1500
-        pwm_thruster_10 = 1500
-        self.movement.go_surface(pwm_thruster_1, pwm_thruster_2, pwm_thruster_3, pwm_thruster_4, pwm_thruster_9, pwm_thruster_10)
-
-    def surge_yaw(self):
-        min_pwm = 1000
-        max_pwm = 2000
-    
-        pwm_thruster_1 = self.constrain(1500 - (self.thrust_surge_sway_yaw[1] * 500 - self.get_offset(self.offset_surge_sway_yaw[1])), min_pwm, max_pwm)
-        pwm_thruster_2 = self.constrain(1500 - (self.thrust_surge_sway_yaw[0] * 500 - self.get_offset(self.offset_surge_sway_yaw[0])), min_pwm, max_pwm)
-        pwm_thruster_3 = self.constrain(1500 - (self.thrust_surge_sway_yaw[3] * 500 - self.get_offset(self.offset_surge_sway_yaw[3])), min_pwm, max_pwm)
-        pwm_thruster_4 = self.constrain(1500 - (self.thrust_surge_sway_yaw[2] * 500 - self.get_offset(self.offset_surge_sway_yaw[2])), min_pwm, max_pwm)
-        pwm_thruster_9 = self.constrain(1500 - (self.thrust_surge_sway_yaw[1] * 500 - self.get_offset(self.offset_surge_sway_yaw[1])), self.constrain_pwm_min, self.constrain_pwm_max)
-        pwm_thruster_10 = self.constrain(1500 - (self.thrust_surge_sway_yaw[0] * 500 - self.get_offset(self.offset_surge_sway_yaw[0])), self.constrain_pwm_min, self.constrain_pwm_max)
-        
-        self.movement.surge_sway_yaw(pwm_thruster_1, pwm_thruster_2, pwm_thruster_3, pwm_thruster_4, pwm_thruster_9, pwm_thruster_10)
-
-    def sway_yaw(self):
-        min_pwm = 1000
-        max_pwm = 2000
-    
-        pwm_thruster_1 = self.constrain(1500 - (self.thrust_surge_sway_yaw[1] * 500 - self.get_offset(self.offset_surge_sway_yaw[1])), min_pwm, max_pwm)
-        pwm_thruster_2 = self.constrain(1500 - (self.thrust_surge_sway_yaw[0] * 500 - self.get_offset(self.offset_surge_sway_yaw[0])), min_pwm, max_pwm)
-        pwm_thruster_3 = self.constrain(1500 - (self.thrust_surge_sway_yaw[3] * 500 - self.get_offset(self.offset_surge_sway_yaw[3])), min_pwm, max_pwm)
-        pwm_thruster_4 = self.constrain(1500 - (self.thrust_surge_sway_yaw[2] * 500 - self.get_offset(self.offset_surge_sway_yaw[2])), min_pwm, max_pwm)
-        pwm_thruster_9 = 1500
-        #self.constrain(1500 - (self.thrust_surge_sway_yaw[0] * 500 - self.get_offset(self.offset_surge_sway_yaw[0])), self.constrain_pwm_min, self.constrain_pwm_max)
-        pwm_thruster_10 = 1500
-        #self.constrain(1500 - (self.thrust_surge_sway_yaw[1] * 500 - self.get_offset(self.offset_surge_sway_yaw[1])), self.constrain_pwm_min, self.constrain_pwm_max)
-        
-        self.movement.surge_sway_yaw(pwm_thruster_1, pwm_thruster_2, pwm_thruster_3, pwm_thruster_4, pwm_thruster_9, pwm_thruster_10)
-
-    def depth_pitch_roll(self):
-        min_pwm = 1000
-        max_pwm = 2000
-        pwm_thruster_5 = self.constrain(1500 + (self.thrust_depth_pitch_roll[2] - self.get_offset(self.offset_depth_pitch_roll[0])), min_pwm, max_pwm)
-        pwm_thruster_6 = self.constrain(1500 - (self.thrust_depth_pitch_roll[1] - self.get_offset(self.offset_depth_pitch_roll[1])), min_pwm, max_pwm)
-        pwm_thruster_7 = self.constrain(1500 + (self.thrust_depth_pitch_roll[0] - self.get_offset(self.offset_depth_pitch_roll[2])), min_pwm, max_pwm)
-        pwm_thruster_8 = self.constrain(1500 - (self.thrust_depth_pitch_roll[3] - self.get_offset(self.offset_depth_pitch_roll[3])), min_pwm, max_pwm)
-        self.movement.depth_pitch_roll(pwm_thruster_5, pwm_thruster_6, pwm_thruster_7,pwm_thruster_8)
-
-    def stabilize_depth_pitch_roll(self, error_depth, error_pitch, error_roll):
-        print("set depth")
-        self.thrust_depth_pitch_roll = self.dprController.control(self.pid_depth(error_depth), self.pid_pitch(error_pitch), -(self.pid_roll(error_roll)))
-
-    def stabilize_surge_yaw_camera(self, error):
-        rospy.loginfo("Stabilize with camera")
-        self.t_yaw = np.interp(self.pid_camera(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(0, 1, self.t_yaw)
-   
-    def stabilize_surge_yaw(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(0, 2.5, self.t_yaw)
-        # self.thrust_surge_sway_yaw = self.ssyController.control(0, 2, 0) # Tanpa Yaw (Darurat)
-
-    def stabilize_surge_yaw_last(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(0, 2.5, 0) # Tanpa Yaw (Darurat)
-    
-    def stabilize_sway_yaw_left(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(4, 1, self.t_yaw)
-
-    def stabilize_sway_yaw_right(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(-4, 1, self.t_yaw)
-
-    def stabilize_yaw_right(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(0, 0, 0.75)
-
-    def stabilize_yaw_left(self, error):
-        self.t_yaw = np.interp(self.pid_yaw(error), [-500, 500], [-3, 3])
-        self.thrust_surge_sway_yaw = self.ssyController.control(0, 0, -0.75)
+        bus.Subscriber('constrain_pwm', Int32, self.callback_constrain_pwm)
+        bus.Subscriber('error', Error, self.callback_error)
+        bus.Subscriber('is_start', Bool, self.callback_is_start)
+        bus.Subscriber('move', String, self.callback_move)
+        bus.Subscriber('object_difference', ObjectDifference, self.callback_object_difference)
+        bus.Subscriber('thruster_enable', UInt16, self.callback_thruster_enable)
+        bus.Subscriber('set_point', SetPoint, self.callback_set_point)
+        if self.core.param_forward_yaw == 'tau':
+            bus.Subscriber('tau', Float32, self.callback_tau)
+        if self.core.uses_arduino_sensor:
+            bus.Subscriber('/rosserial/sensor', ArduinoSensor, self.callback_arduino_sensor)
+
+        if self.core.param_control_rate > 0:
+            self.pub_loop_timing = bus.Publisher('control_timing', LoopTiming, queue_size=10)
+            rospy.Timer(rospy.Duration(1.0 / self.core.param_control_rate), self.callback_control_timer)
+            rospy.Timer(rospy.Duration(1.0), self.callback_timing_timer)
+
+    # Outputs of the core
+    def pwm(self, pwm):
+        if self.param_actuator_format != 'compact':
+            self.pub_pwm_actuator.publish(Actuator(*pwm.tolist()))
+        if self.param_actuator_format != 'float':
+            self.publish_compact(pwm)
+        self.publish_trace()
+
+    def dive(self, dive):
+        self.pub_dive.publish(dive)
+
+    def battery_compensation(self, gain):
+        self.pub_battery_compensation.publish(gain)
+
+    def publish_compact(self, pwm):
+        np.subtract(pwm, 1500, out=self.pwm_compact)
+        self.pwm_compact /= COMPACT_PWM_STEP
+        np.rint(self.pwm_compact, out=self.pwm_compact)
+        np.clip(self.pwm_compact, -127, 127, out=self.pwm_compact)
+
+        self.actuator_compact.seq = self.movement.sent & 0xffff
+        self.actuator_compact.stamp = int(self.movement.last_publish_time * 1000) & 0xffff
+        self.actuator_compact.pwm = self.pwm_compact.astype(int).tolist()
+        self.pub_pwm_actuator_compact.publish(self.actuator_compact)
+
+    def set_trace(self, stamp, trace_id, source):
+        self.trace.header.stamp = stamp
+        self.trace.trace_id = trace_id
+        self.trace.source = source
+
+    def publish_trace(self):
+        if not self.trace.header.stamp.is_zero():
+            self.pub_trace.publish(self.trace)
+
+    def log_movement(self):
+        rospy.loginfo_throttle(10, 'PWM ticks %d sent %d slewed %d' % (self.movement.ticks, self.movement.sent, self.movement.slewed))
 
     def callback_move(self, data: String):
-        self.move = data.data
+        self.core.set_move(data.data)
 
     def callback_object_difference(self, data: ObjectDifference):
-        self.object_difference.object_type = data.object_type
-        self.object_difference.x_difference = data.x_difference
-        if self.move == "camera":
-            self.stabilize_surge_yaw_camera(self.object_difference.x_difference)
+        if self.core.move == "camera":
+            self.set_trace(data.header.stamp, data.trace_id, 'camera')
+        self.core.set_object_difference(data.object_type, data.x_difference)
+
+    def callback_tau(self, data: Float32):
+        self.core.set_tau(data.data)
+
+    def callback_thruster_enable(self, data: UInt16):
+        self.core.set_thruster_enable(data.data)
+
+    # Collect Depth and Battery Voltage
+    def callback_arduino_sensor(self, data: ArduinoSensor):
+        self.core.set_arduino_sensor(data.depth, data.loadvoltage)
 
     # Collect Constrain PWM
     def callback_constrain_pwm(self, data: Int32):
-        self.constrain_pwm_min = data.data
-        self.constrain_pwm_max = (1500 - data.data)+1500
-        
+        self.core.set_constrain_pwm(data.data)
+
+    # Collect SetPoint Data
+    def callback_set_point(self, data: SetPoint):
+        self.core.set_set_point(data.depth, data.pitch, data.roll, data.yaw)
+
     def callback_error(self, data: Error):
-        self.stabilize_depth_pitch_roll(data.depth, data.pitch, data.roll)
-        if self.move == "left":
-            self.stabilize_sway_yaw_left(data.yaw)
-        elif self.move == "right":
-            self.stabilize_sway_yaw_right(data.yaw)
-        elif self.move == "forward":
-            self.stabilize_surge_yaw(data.yaw)
-        elif self.move == "last":
-            self.stabilize_surge_yaw_last(data.yaw)
-        elif self.move == "yaw_right":
-            self.stabilize_yaw_right(data.yaw)
-        elif self.move == "yaw_left":
-            self.stabilize_yaw_left(data.yaw)
-        
-    def stabilize(self):
-
-        if not self.is_start:
-            self.start_time = rospy.get_time()
-            self.is_start = True
-
-        self.boot_time = rospy.get_time() - self.start_time
-
-        if self.is_in_range(1,5):
-            rospy.loginfo("Set Depth")
-        if self.move == "forward" or self.move == "camera" or self.move == "last":
-            #print("Surge Yaw")
-            self.surge_yaw()
-        elif self.move == "left" or self.move == "right" or self.move == "yaw_right" or self.move == "yaw_left":
-            self.depth_pitch_roll()
-            self.sway_yaw()
-        elif self.move == "surface":
-            self.surface()
-
-        self.depth_pitch_roll()
-            
+        if self.core.move != "camera":
+            self.set_trace(data.header.stamp, data.trace_id, 'sensor')
+        stamp = None if data.header.stamp.is_zero() else data.header.stamp.to_sec()
+        self.core.set_error(data.depth, data.pitch, data.roll, data.yaw, stamp)
+
     def callback_is_start(self, data: Bool):
-        self.is_pre_calibrating = not data.data
-
-        # Wait for a secs to await sensor value changes / spikes after pre calibrating
-        if not self.is_pre_calibrating and self.start_time + self.param_arming_duration > rospy.get_time():
-            rospy.loginfo('READY TO DIVE...')
-            self.pub_dive.publish(True)
-            return
-        self.pub_dive.publish(False)
-
-        # Condition for pre calibrating
-        if data.data:
-            self.stabilize()
+        self.core.set_is_start(data.data)
+        self.log_movement()
+
+    def callback_control_timer(self, event):
+        if event.last_real is not None:
+            self.core.tick((event.current_real - event.last_real).to_sec(), (event.current_real - event.current_expected).to_sec())
         else:
-            self.start_time = rospy.get_time()
-            self.pre_calibrate()
-            self.movement.stop()
+            self.core.tick()
+        self.log_movement()
+
+    def callback_timing_timer(self, event):
+        loop_stats = self.core.loop_stats
+        period_mean, period_max, jitter, lateness = loop_stats.summary()
+        timing = LoopTiming()
+        timing.rate = 1.0 / period_mean if period_mean > 0 else 0
+        timing.period_mean = period_mean
+        timing.period_max = period_max
+        timing.jitter = jitter
+        timing.lateness = lateness
+        timing.ticks = loop_stats.count
+        timing.overruns = loop_stats.overruns
+        self.pub_loop_timing.publish(timing)
 
-        self.movement.publish()
-    
     def spin(self):
         rospy.spin()
 
 def main():
     rospy.init_node('node_control', anonymous=True)
+    log_to_rosout()
 
     subscriber = Subscriber()
 
     subscriber.spin()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
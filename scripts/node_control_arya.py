@@ -5,47 +5,8 @@ import time
 from std_msgs.msg import Bool, Int32, String
 from robotic_sas_auv_ros.msg import Error, Actuator, IsStable, ObjectDifference
 import numpy as np
+from auv_core.allocation import DPRController, SSYController
 
-class DPRController: # Depth Pitch Roll
-    def __init__(self, Lx, Ly):
-        self.Lx = Lx
-        self.Ly = Ly
-
-        # Control matrix A
-        self.A = np.array([
-            [ Ly, -Ly,  Ly, -Ly],  # Roll contributions
-            [ Lx,  Lx, -Lx, -Lx],  # Pitch contributions 
-            [  1,   1,   1,   1]   # Depth contributions
-        ])
-
-    def control(self, control_depth, control_pitch, control_roll):
-        desired_control = np.array([control_depth, control_pitch, control_roll])
-        
-        T = np.linalg.pinv(self.A).dot(desired_control)
-
-        return T
-
-class SSYController:
-    def __init__(self, d):
-        self.d = d
-        self.sqrt2 = np.sqrt(2)
-
-        self.M = np.array([
-            [-1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, -1/self.sqrt2],
-            [1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2, 1/self.sqrt2],
-            [d/2, -d/2, -d/2, d/2],
-            [1, -1, 1, -1]  # Kontribusi untuk momen yaw
-        ])
-
-    def control(self, Fx, Fy, tau):
-        # Vektor gaya yang diinginkan
-        F = np.array([Fx, Fy, 0, tau])  # tau dimasukkan ke koordinat keempat
-        
-        # Menghitung thrust yang diperlukan menggunakan pseudo-inverse matriks
-        T = np.dot(np.linalg.pinv(self.M), F)
-
-        return T
-    
 class PID():
     def __init__(self, kp, ki, kd):
         self.kp = kp
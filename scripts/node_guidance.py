@@ -119,6 +119,7 @@ class Subscriber():
         #     return
         
         # Start AUV mission
+        self.set_point.header.stamp = rospy.Time.now()
         self.pub_set_point.publish(self.set_point)
         self.pub_is_start.publish(True)
 
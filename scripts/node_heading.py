@@ -3,6 +3,7 @@
 import rospy
 import serial
 from robotic_sas_auv_ros.msg import Heading
+from auv_core.perception import update_heading
 
 def main():
     param_port = rospy.get_param('/witmotion/port_heading')
@@ -24,17 +25,7 @@ def main():
             data_str = ser.readline().decode('utf-8').strip()
             rospy.loginfo(data_str)
 
-            for data in data_str.split(','):
-                data_name, data_value = data.split(':')                
-                if data_name == 'Magx':
-                    heading.mag_x = int(data_value)
-                if data_name == 'Magy':
-                    heading.mag_y = int(data_value)
-                if data_name == 'Magz':
-                    heading.mag_z = int(data_value)
-                if data_name == 'Yaw':
-                    heading.yaw = float(data_value)
-
+            for heading in update_heading(data_str, heading):
                 pub_heading.publish(heading)
 
             rate.sleep()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import rospy
+import numpy as np
+from robotic_sas_auv_ros.msg import Error, LatencyStats, Sensor, Trace
+from auv_core.scheduler import LatencyWindow
+
+# accumulator: oldest input to the sensor message, navigation: sensor to error,
+# control: error to PWM, end_to_end: oldest input to PWM, camera: camera frame to PWM
+STAGES = ('accumulator', 'navigation', 'control', 'end_to_end', 'camera')
+
+class Subscriber():
+    def __init__(self):
+        self.param_window = rospy.get_param('~window', 1000)
+        self.param_history = rospy.get_param('~history', 256)
+        self.param_rate = rospy.get_param('~rate', 1.0)
+
+        self.windows = {stage: LatencyWindow(self.param_window) for stage in STAGES}
+
+        # Arrival time of the sensor and error message of each trace id, in rings indexed by trace id
+        self.sensor_ids = np.full(self.param_history, -1)
+        self.sensor_times = np.zeros(self.param_history)
+        self.error_ids = np.full(self.param_history, -1)
+        self.error_times = np.zeros(self.param_history)
+
+        # Publisher
+        self.pub_latency = rospy.Publisher('latency', LatencyStats, queue_size=10)
+
+        # Subscriber
+        rospy.Subscriber('sensor', Sensor, self.callback_sensor)
+        rospy.Subscriber('error', Error, self.callback_error)
+        rospy.Subscriber('actuator_trace', Trace, self.callback_trace)
+
+        rospy.Timer(rospy.Duration(1.0 / self.param_rate), self.callback_timer)
+
+    def arrival(self, ids, times, trace_id):
+        index = trace_id % len(ids)
+        return times[index] if ids[index] == trace_id else None
+
+    def record(self, ids, times, trace_id, now):
+        index = trace_id % len(ids)
+        ids[index] = trace_id
+        times[index] = now
+
+    def callback_sensor(self, data: Sensor):
+        now = rospy.get_time()
+        if data.header.stamp.is_zero():
+            return
+        self.windows['accumulator'].add(now - data.header.stamp.to_sec())
+        self.record(self.sensor_ids, self.sensor_times, data.trace_id, now)
+
+    def callback_error(self, data: Error):
+        now = rospy.get_time()
+        if data.header.stamp.is_zero():
+            return
+        sensor_time = self.arrival(self.sensor_ids, self.sensor_times, data.trace_id)
+        if sensor_time is not None:
+            self.windows['navigation'].add(now - sensor_time)
+        self.record(self.error_ids, self.error_times, data.trace_id, now)
+
+    def callback_trace(self, data: Trace):
+        now = rospy.get_time()
+        if data.source == 'camera':
+            self.windows['camera'].add(now - data.header.stamp.to_sec())
+            return
+
+        error_time = self.arrival(self.error_ids, self.error_times, data.trace_id)
+        if error_time is not None:
+            self.windows['control'].add(now - error_time)
+        self.windows['end_to_end'].add(now - data.header.stamp.to_sec())
+
+    def callback_timer(self, event):
+        for stage in STAGES:
+            window = self.windows[stage]
+            if window.count == 0:
+                continue
+            latency = LatencyStats()
+            latency.stage = stage
+            latency.p50, latency.p95, latency.p99, latency.max = window.summary()
+            latency.count = window.count
+            self.pub_latency.publish(latency)
+
+    def spin(self):
+        rospy.spin()
+
+def main():
+    rospy.init_node('node_latency', anonymous=True)
+
+    subscriber = Subscriber()
+
+    subscriber.spin()
+
+if __name__ == '__main__':
+    main()
@@ -1,78 +1,79 @@
 #!/usr/bin/env python3
 
 import rospy
-from std_msgs.msg import Bool
+from std_msgs.msg import Bool, Float32
 from robotic_sas_auv_ros.msg import Sensor, SetPoint, IsStable, Error, ObjectDetection
+from auv_core.navigation import NavigationCore
+from bus import log_to_rosout
+
 class Subscriber():
-    def __init__(self):
+    def __init__(self, bus=rospy):
         self.is_object_detected = False
 
-        self.error = Error()
-        self.set_point = SetPoint()
-        self.is_stable = IsStable()
+        # Stamp and trace id of the sensor reading behind the error
+        self.stamp = rospy.Time()
+        self.trace_id = 0
+
+        # is_start: publish the error on the next is_start, sensor: publish it as soon as a sensor
+        # message arrives, at most max_rate times per second (0 for no cap)
+        self.param_publish_mode = rospy.get_param('~publish_mode', 'is_start')
+        self.param_max_rate = rospy.get_param('~max_rate', 0)
+
+        self.core = NavigationCore(rospy.get_time, self.publish_error, self.schedule, self.param_publish_mode, self.param_max_rate, self.messages)
 
         # Publisher
-        self.pub_error = rospy.Publisher('error', Error, queue_size=10)
-        self.pub_is_stable = rospy.Publisher('is_stable', IsStable, queue_size=10)
+        self.pub_error = bus.Publisher('error', Error, queue_size=10)
+        self.pub_is_stable = bus.Publisher('is_stable', IsStable, queue_size=10)
+        # Age of the sensor reading behind each published error
+        self.pub_error_staleness = bus.Publisher('error_staleness', Float32, queue_size=10)
 
         # Subscriber
-        rospy.Subscriber('sensor', Sensor, self.callback_sensor)
-        rospy.Subscriber('object_detection', ObjectDetection, self.callback_object_detection)
-        rospy.Subscriber('set_point', SetPoint, self.callback_set_point)
-        rospy.Subscriber('is_start', Bool, self.callback_is_start)
-
-    def generate_is_stable(self, thresh, error):
-        return -(thresh) <= error <= thresh
-
-    def calculate_orientation_error(self, current, target):
-        error = (target - current) % 2
-        if error > 1:
-            error -= 2
-        return error
-    
-    def calculate_heading_error(self, current, target):
-        return (current - target + 180) % 360 - 180
+        bus.Subscriber('sensor', Sensor, self.callback_sensor)
+        bus.Subscriber('object_detection', ObjectDetection, self.callback_object_detection)
+        bus.Subscriber('set_point', SetPoint, self.callback_set_point)
+        bus.Subscriber('is_start', Bool, self.callback_is_start)
 
     # Collect SetPoint Data
     def callback_set_point(self, data: SetPoint):
-        self.set_point = data
+        self.core.set_set_point(data.depth, data.pitch, data.roll, data.yaw, data.sway)
 
     # Collect Sensor Data
     def callback_sensor(self, data: Sensor):
-        # Calculate Error Value
-        error_roll = self.calculate_heading_error(data.roll, self.set_point.roll)
-        error_pitch = self.calculate_heading_error(data.pitch, self.set_point.pitch)
-        error_yaw = self.calculate_heading_error(data.yaw, self.set_point.yaw)
-        error_sway = self.calculate_heading_error(data.sway, self.set_point.sway)
-        error_depth = self.set_point.depth - data.depth
-
-        # Determine Stable Position
-        self.is_stable.roll = self.generate_is_stable(0, error_roll)
-        self.is_stable.pitch = self.generate_is_stable(0, error_pitch)
-        self.is_stable.yaw = self.generate_is_stable(0, error_yaw)
-        self.is_stable.sway = self.generate_is_stable(0, error_sway)
-        self.is_stable.depth = self.generate_is_stable(0.05, error_depth)
-
-        # Validate Error Value
-        self.error.roll = 0 if self.is_stable.roll else error_roll
-        self.error.pitch = 0 if self.is_stable.pitch else error_pitch
-        self.error.yaw = 0 if self.is_stable.yaw else error_yaw
-        self.error.sway = 0 if self.is_stable.sway else error_sway
-        self.error.depth = 0 if self.is_stable.depth else error_depth
+        # The error keeps the stamp and trace id of the sensor reading it comes from, set
+        # under the lock of the core so a publish never mixes two readings
+        with self.core.lock:
+            self.stamp = data.header.stamp
+            self.trace_id = data.trace_id
+            self.core.set_sensor(data.depth, data.pitch, data.roll, data.yaw, data.sway)
+
+    def messages(self, error, is_stable):
+        # Called under the lock of the core, every publish gets messages of its own
+        message = Error(trace_id=self.trace_id, roll=error.roll, pitch=error.pitch, yaw=error.yaw, sway=error.sway, depth=error.depth)
+        message.header.stamp = self.stamp
+        return message, IsStable(roll=is_stable.roll, pitch=is_stable.pitch, yaw=is_stable.yaw, sway=is_stable.sway, depth=is_stable.depth)
+
+    def schedule(self, delay, callback):
+        rospy.Timer(rospy.Duration(delay), lambda event: callback(), oneshot=True)
+
+    def publish_error(self, error, is_stable, now):
+        self.pub_is_stable.publish(is_stable)
+        self.pub_error.publish(error)
+        if not error.header.stamp.is_zero():
+            self.pub_error_staleness.publish(now - error.header.stamp.to_sec())
+        rospy.loginfo_throttle(10, 'Errors coalesced %d' % self.core.coalesced)
 
     def callback_object_detection(self, data: ObjectDetection):
         self.is_object_detected = len(data.bounding_boxes) > 0
 
     def callback_is_start(self, data: Bool):
-        if data.data:
-            self.pub_is_stable.publish(self.is_stable)
-            self.pub_error.publish(self.error)
+        self.core.set_is_start(data.data)
 
     def spin(self):
         rospy.spin()
 
 def main():
     rospy.init_node('node_navigation', anonymous=True)
+    log_to_rosout()
 
     subscriber = Subscriber()
 
@@ -35,11 +35,15 @@ cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 frame_center_x = 640 // 2
 frame_center_y = 480 // 2
 
+frame_id = 0
+
 while not rospy.is_shutdown():
     start_time = time.time()
     
     # Capture frame from camera
     ret, frame = cap.read()
+    frame_stamp = rospy.Time.now()
+    frame_id += 1
 
     if not ret:
         print("Can't receive frame (stream end?). Exiting ...")
@@ -54,8 +58,10 @@ while not rospy.is_shutdown():
     # Perform object detection using YOLOv8
     results = model(frame)
 
-    # Create ObjectDetection message
+    # Create ObjectDetection message, stamped with the capture time of the frame
     obj_det_msg = ObjectDetection()
+    obj_det_msg.header.stamp = frame_stamp
+    obj_det_msg.trace_id = frame_id
     
     # Draw bounding boxes and labels on the frame and publish the results to ROS
     for result in results:
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import rospy
+import node_accumulator
+import node_navigation
+import node_control
+import node_guidance_last
+from bus import LocalBus, log_to_rosout
+
+# Topics between guidance, accumulator, navigation and control
+LOCAL_TOPICS = ['is_start', 'sensor', 'error', 'set_point', 'is_stable', 'move', 'movement', 'dive', 'constrain_pwm', 'object_difference', 'tau']
+
+class Pipeline():
+    def __init__(self):
+        # Local topics that other processes still need, e.g. sensor for the GUI or
+        # sensor and error for node_latency
+        self.param_mirror_topics = rospy.get_param('~mirror_topics', ['sensor'])
+
+        self.bus = LocalBus(LOCAL_TOPICS, self.param_mirror_topics)
+
+        # Callbacks of a topic run in this order, so one is_start from guidance goes
+        # through sensor, error and PWM before it returns
+        self.accumulator = node_accumulator.Subscriber(self.bus)
+        self.navigation = node_navigation.Subscriber(self.bus)
+        self.control = node_control.Subscriber(self.bus)
+        self.guidance = node_guidance_last.Subscriber(self.bus)
+
+    def spin(self):
+        rospy.spin()
+
+def main():
+    rospy.init_node('node_pipeline', anonymous=True)
+    log_to_rosout()
+
+    pipeline = Pipeline()
+
+    pipeline.spin()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import rospy
+from std_msgs.msg import String
+from sensor_msgs.msg import Imu
+from robotic_sas_auv_ros.msg import Actuator, ArduinoSensor, Error, ObjectDifference, Sensor, SetPoint
+from auv_core.telemetry import TelemetryRecorder
+from bus import log_to_rosout
+
+# Columns of every channel besides the receive time, and the expected message rate (Hz)
+# that the column files are preallocated for
+CHANNELS = {
+    'sensor': ([('stamp', 'f8'), ('trace_id', 'u4'), ('depth', 'f4'), ('roll', 'f4'), ('pitch', 'f4'), ('yaw', 'f4')], 20),
+    'error': ([('stamp', 'f8'), ('trace_id', 'u4'), ('depth', 'f4'), ('roll', 'f4'), ('pitch', 'f4'), ('yaw', 'f4')], 20),
+    'set_point': ([('depth', 'f4'), ('roll', 'f4'), ('pitch', 'f4'), ('yaw', 'f4')], 10),
+    'pwm_actuator': ([('thruster_%d' % (i + 1), 'f4') for i in range(10)], 50),
+    'move': ([('move', 'i2')], 10),
+    'imu': ([('stamp', 'f8'), ('qx', 'f4'), ('qy', 'f4'), ('qz', 'f4'), ('qw', 'f4'), ('wx', 'f4'), ('wy', 'f4'), ('wz', 'f4'), ('ax', 'f4'), ('ay', 'f4'), ('az', 'f4')], 100),
+    'arduino_sensor': ([('depth', 'f4'), ('loadvoltage', 'f4'), ('current_mA', 'f4')], 20),
+    'object_difference': ([('stamp', 'f8'), ('trace_id', 'u4'), ('object_type', 'i2'), ('x_difference', 'i2')], 30),
+}
+
+class Subscriber():
+    def __init__(self, bus=rospy):
+        self.param_directory = rospy.get_param('~directory', os.path.expanduser('~/auv_logs'))
+        # Seconds of every channel preallocated at the start, the files grow past it if needed
+        self.param_duration = rospy.get_param('~duration', 1800)
+        self.param_flush_period = rospy.get_param('~flush_period', 0.2)
+
+        directory = os.path.join(self.param_directory, time.strftime('%Y%m%d_%H%M%S'))
+        self.recorder = TelemetryRecorder(directory, rospy.get_time, self.param_flush_period)
+        self.channels = {name: self.recorder.add_channel(name, fields, rate, self.param_duration) for name, (fields, rate) in CHANNELS.items()}
+        self.recorder.start()
+        rospy.on_shutdown(self.recorder.close)
+        rospy.loginfo('Recording to %s' % directory)
+
+        # Subscriber
+        bus.Subscriber('sensor', Sensor, self.callback_sensor)
+        bus.Subscriber('error', Error, self.callback_error)
+        bus.Subscriber('set_point', SetPoint, self.callback_set_point)
+        bus.Subscriber('pwm_actuator', Actuator, self.callback_pwm_actuator)
+        bus.Subscriber('move', String, self.callback_move)
+        bus.Subscriber('/imu', Imu, self.callback_imu)
+        bus.Subscriber('/rosserial/sensor', ArduinoSensor, self.callback_arduino_sensor)
+        bus.Subscriber('object_difference', ObjectDifference, self.callback_object_difference)
+
+        rospy.Timer(rospy.Duration(10), self.callback_status)
+
+    # Callbacks only copy the fields into the ring of their channel
+    def callback_sensor(self, data: Sensor):
+        self.channels['sensor'].append(data.header.stamp.to_sec(), data.trace_id, data.depth, data.roll, data.pitch, data.yaw)
+
+    def callback_error(self, data: Error):
+        self.channels['error'].append(data.header.stamp.to_sec(), data.trace_id, data.depth, data.roll, data.pitch, data.yaw)
+
+    def callback_set_point(self, data: SetPoint):
+        self.channels['set_point'].append(data.depth, data.roll, data.pitch, data.yaw)
+
+    def callback_pwm_actuator(self, data: Actuator):
+        self.channels['pwm_actuator'].append(
+            data.thruster_1, data.thruster_2, data.thruster_3, data.thruster_4, data.thruster_5,
+            data.thruster_6, data.thruster_7, data.thruster_8, data.thruster_9, data.thruster_10)
+
+    def callback_move(self, data: String):
+        channel = self.channels['move']
+        channel.append(channel.code('move', data.data))
+
+    def callback_imu(self, data: Imu):
+        orientation, rate, acceleration = data.orientation, data.angular_velocity, data.linear_acceleration
+        self.channels['imu'].append(
+            data.header.stamp.to_sec(), orientation.x, orientation.y, orientation.z, orientation.w,
+            rate.x, rate.y, rate.z, acceleration.x, acceleration.y, acceleration.z)
+
+    def callback_arduino_sensor(self, data: ArduinoSensor):
+        self.channels['arduino_sensor'].append(data.depth, data.loadvoltage, data.current_mA)
+
+    def callback_object_difference(self, data: ObjectDifference):
+        channel = self.channels['object_difference']
+        channel.append(data.header.stamp.to_sec(), data.trace_id, channel.code('object_type', data.object_type), data.x_difference)
+
+    def callback_status(self, event):
+        dropped = sum(channel.dropped for channel in self.channels.values())
+        rows = sum(channel.count for channel in self.channels.values())
+        rospy.loginfo('Recorded %d rows, dropped %d, %d failed writes' % (rows, dropped, self.recorder.errors))
+
+    def spin(self):
+        rospy.spin()
+
+def main():
+    rospy.init_node('node_recorder', anonymous=True)
+    log_to_rosout()
+
+    subscriber = Subscriber()
+
+    subscriber.spin()
+
+if __name__ == '__main__':
+    main()
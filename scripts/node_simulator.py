@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import rospy
+import time
+from std_msgs.msg import Bool, Float32
+from sensor_msgs.msg import Imu
+from rosgraph_msgs.msg import Clock
+from robotic_sas_auv_ros.msg import Actuator, ArduinoSensor, BoundingBox, ObjectDetection
+from auv_core.simulator import SIMULATOR_DEFAULTS, Simulator
+
+# Stands in for the vehicle: takes the PWM of node_control and publishes what the IMU,
+# Arduino, yaw filter and object detection would. Run it with /use_sim_time, it publishes /clock.
+class Subscriber():
+    def __init__(self):
+        config = {key: rospy.get_param('~' + key, default) for key, default in SIMULATOR_DEFAULTS.items()}
+        self.param_seed = rospy.get_param('~seed', 0)
+        # Physics step and simulated seconds per wall second, 0 runs as fast as possible
+        self.param_dt = rospy.get_param('~dt', 0.01)
+        self.param_real_time_factor = rospy.get_param('~real_time_factor', 1.0)
+        self.param_sensor_rate = rospy.get_param('~sensor_rate', 50)
+        self.param_camera_rate = rospy.get_param('~camera_rate', 10)
+        # Start switch of the Arduino, published at /nuc/rate while it is on
+        self.param_is_start = rospy.get_param('~is_start', True)
+        self.param_rate = rospy.get_param('/nuc/rate', 10)
+
+        self.simulator = Simulator(config, self.param_seed)
+        self.imu = Imu()
+        self.arduino_sensor = ArduinoSensor()
+        self.object_detection = ObjectDetection()
+
+        # Publisher
+        self.pub_clock = rospy.Publisher('/clock', Clock, queue_size=10)
+        self.pub_imu = rospy.Publisher('/imu', Imu, queue_size=10)
+        self.pub_arduino_sensor = rospy.Publisher('/rosserial/sensor', ArduinoSensor, queue_size=10)
+        self.pub_filter_yaw = rospy.Publisher('/filterYaw', Float32, queue_size=10)
+        self.pub_is_start = rospy.Publisher('/rosserial/is_start', Bool, queue_size=10)
+        self.pub_bucket_detected = rospy.Publisher('/rosserial/bucket_detected', Bool, queue_size=10)
+        self.pub_object_detection = rospy.Publisher('/nuc/object_detection', ObjectDetection, queue_size=10)
+
+        # Subscriber
+        rospy.Subscriber('pwm_actuator', Actuator, self.callback_pwm_actuator)
+
+    def callback_pwm_actuator(self, data: Actuator):
+        self.simulator.set_pwm([getattr(data, 'thruster_%d' % (i + 1)) for i in range(10)])
+
+    def publish_sensors(self, stamp):
+        x, y, z, w = self.simulator.orientation()
+        self.imu.header.stamp = stamp
+        self.imu.orientation.x = x
+        self.imu.orientation.y = y
+        self.imu.orientation.z = z
+        self.imu.orientation.w = w
+        self.pub_imu.publish(self.imu)
+
+        self.arduino_sensor.depth = self.simulator.depth()
+        self.arduino_sensor.loadvoltage = self.simulator.load_voltage()
+        self.pub_arduino_sensor.publish(self.arduino_sensor)
+
+        self.pub_filter_yaw.publish(self.simulator.angles()[2])
+
+    def publish_detections(self, stamp):
+        self.object_detection.header.stamp = stamp
+        self.object_detection.trace_id += 1
+        self.object_detection.bounding_boxes = [BoundingBox(box.class_name, box.probability, box.x_min, box.y_min, box.x_max, box.y_max) for box in self.simulator.detections()]
+        self.pub_object_detection.publish(self.object_detection)
+        self.pub_bucket_detected.publish(self.simulator.bucket_detected())
+
+    def spin(self):
+        dt = self.param_dt
+        sensor_steps = max(int(round(1.0 / self.param_sensor_rate / dt)), 1)
+        camera_steps = max(int(round(1.0 / self.param_camera_rate / dt)), 1)
+        is_start_steps = max(int(round(1.0 / self.param_rate / dt)), 1)
+
+        # Wall clock pacing, rospy sleeps would wait for the clock this node publishes
+        wall_start = time.monotonic()
+        step = 0
+        while not rospy.is_shutdown():
+            self.simulator.step(dt)
+            step += 1
+            stamp = rospy.Time.from_sec(self.simulator.time)
+            self.pub_clock.publish(Clock(stamp))
+
+            if step % sensor_steps == 0:
+                self.publish_sensors(stamp)
+            if step % camera_steps == 0:
+                self.publish_detections(stamp)
+            if self.param_is_start and step % is_start_steps == 0:
+                self.pub_is_start.publish(True)
+
+            if self.param_real_time_factor > 0:
+                delay = wall_start + self.simulator.time / self.param_real_time_factor - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+def main():
+    rospy.init_node('node_simulator', anonymous=True)
+
+    subscriber = Subscriber()
+
+    subscriber.spin()
+
+if __name__ == '__main__':
+    main()
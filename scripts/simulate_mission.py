@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+import numpy as np
+import yaml
+from auv_core.mission import MOVES, SimulatedMission
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
+
+def load_yaml(path):
+    if path is None:
+        return {}
+    with open(path) as file:
+        return yaml.safe_load(file) or {}
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the node_guidance_last mission against the simulator without ROS')
+    parser.add_argument('-d', '--duration', type=float, default=100, help='simulated seconds')
+    parser.add_argument('--simulator', default=os.path.join(CONFIG_DIR, 'simulator.yaml'), help='vehicle and pool, see config/simulator.yaml')
+    parser.add_argument('--control', nargs='*', default=[], help='node_control parameter files, e.g. config/gain_schedule.yaml')
+    parser.add_argument('--delay', type=float, default=4, help='/nuc/delay')
+    parser.add_argument('--mission-duration', type=float, default=-1, help='/nuc/duration')
+    parser.add_argument('--arming-duration', type=float, default=1, help='/nuc/arming_duration')
+    parser.add_argument('--rate', type=float, default=10, help='/nuc/rate, is_start messages per second')
+    parser.add_argument('--dt', type=float, default=0.01, help='physics step')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='save the log of every guidance tick to this .npz file')
+    args = parser.parse_args()
+
+    control_config = {}
+    for path in args.control:
+        control_config.update(load_yaml(path))
+
+    mission = SimulatedMission(control_config, load_yaml(args.simulator), args.delay, args.mission_duration, args.arming_duration, args.rate, args.dt, args.seed)
+    start = time.perf_counter()
+    log = mission.run(args.duration)
+    elapsed = time.perf_counter() - start
+
+    # Timeline of the move modes
+    changes = np.flatnonzero(np.diff(log.move, prepend=-2))
+    for i in changes:
+        x, y, z = log.position[i]
+        print(f'{log.time[i]:7.1f} s  {MOVES[log.move[i]]:10s} at x {x:6.2f} y {y:6.2f} depth {z:5.2f}')
+
+    x, y, z = log.position[-1]
+    print(f'\nend at x {x:.2f} y {y:.2f} depth {z:.2f}, bucket detected {mission.guidance.bucket_detected}')
+    print(f'depth {log.position[:, 2].min():.2f} to {log.position[:, 2].max():.2f} m, |pitch| max {np.abs(log.attitude[:, 1]).max():.1f}, |roll| max {np.abs(log.attitude[:, 0]).max():.1f} degrees')
+    print(f'{args.duration:.0f} s simulated in {elapsed:.2f} s, {args.duration / elapsed:.0f}x real time')
+
+    if args.output is not None:
+        np.savez(args.output, moves=np.array(MOVES), **vars(log))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import yaml
+from auv_core.control import ControlCore
+from auv_core.gain_schedule import AXES
+from auv_core.tuning import COST_WEIGHTS, STEP_TESTS, CrossEntropyTuner, evaluate_gains, gains_config, init_worker
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config')
+
+HEADER = """# PID gains [kp, ki, kd] of node_control found by scripts/tune_pid.py on the simulator, loaded with
+# <rosparam command="load" file="$(find robotic_sas_auv_ros)/config/pid_gains.yaml" ns="node_control"/>
+# With a gain schedule these replace its default gains for the axes named here, the gains
+# of its modes and depth bands still apply on top.
+"""
+
+def load_yaml(path):
+    if path is None:
+        return {}
+    with open(path) as file:
+        return yaml.safe_load(file) or {}
+
+def print_metrics(title, cost, metrics):
+    print(f'{title}: cost {cost:.3f}')
+    for test, metric in zip(STEP_TESTS, metrics):
+        print(f'    {test["axis"]:6s} overshoot {metric["overshoot"]:6.1%}  settling {metric["settling_time"]:5.1f} s  error {metric["error"]:6.1%}  effort {metric["effort"]:.3f}')
+
+def evaluate_gains_in(pool, candidates):
+    # Every candidate is one task, the step tests of a candidate run in the same process
+    return pool.map(evaluate_gains, list(candidates), chunksize=1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the depth, pitch, roll and yaw PID gains of node_control on simulated step responses')
+    parser.add_argument('-g', '--generations', type=int, default=15)
+    parser.add_argument('-c', '--candidates', type=int, default=32, help='candidates per generation')
+    parser.add_argument('-e', '--elites', type=int, default=6, help='best candidates that make the next generation')
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='worker processes, all cores by default')
+    parser.add_argument('--axes', nargs='*', default=list(AXES), choices=AXES, help='axes to tune, the others keep their gains')
+    parser.add_argument('--terms', default='pd', choices=['p', 'pd', 'pid'], help='gains to tune, ki stays as it is by default')
+    parser.add_argument('--spread', type=float, default=0.5, help='initial spread of the search, log of the gain')
+    parser.add_argument('--weights', help='YAML file overriding the cost weights: ' + ', '.join(COST_WEIGHTS))
+    parser.add_argument('--simulator', default=os.path.join(CONFIG_DIR, 'simulator.yaml'), help='vehicle and pool, see config/simulator.yaml')
+    parser.add_argument('--control', nargs='*', default=[], help='node_control parameter files, pid_gains of these is the starting point')
+    parser.add_argument('--rate', type=float, default=10, help='/nuc/rate, is_start messages per second')
+    parser.add_argument('--dt', type=float, default=0.01, help='physics step')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=os.path.join(CONFIG_DIR, 'pid_gains.yaml'))
+    args = parser.parse_args()
+
+    control_config = {}
+    for path in args.control:
+        control_config.update(load_yaml(path))
+    simulator_config = load_yaml(args.simulator)
+    mission_options = dict(arming_duration=1, rate=args.rate, dt=args.dt)
+
+    # Start from the gains node_control would use
+    core = ControlCore(control_config)
+    gains = np.array([core.pid_bank.kp, core.pid_bank.ki, core.pid_bank.kd])
+    tuned = np.zeros(gains.shape, dtype=bool)
+    for axis in args.axes:
+        tuned[[i for i, term in enumerate('pid') if term in args.terms], AXES.index(axis)] = True
+    tuner = CrossEntropyTuner(gains, tuned, args.spread, args.candidates, args.elites, args.seed)
+
+    start = time.perf_counter()
+    initargs = (simulator_config, control_config, STEP_TESTS, load_yaml(args.weights), mission_options, args.seed)
+    with Pool(args.processes, init_worker, initargs) as pool:
+        initial_cost, initial_metrics = evaluate_gains_in(pool, [gains])[0]
+        print_metrics('initial gains', initial_cost, initial_metrics)
+
+        for generation in range(args.generations):
+            samples = tuner.sample()
+            results = evaluate_gains_in(pool, samples)
+            tuner.update(samples, [cost for cost, _ in results])
+            print(f'generation {generation + 1:3d}: best {tuner.best_cost:.3f}  mean of this one {np.mean([cost for cost, _ in results if np.isfinite(cost)]):.3f}')
+
+        best_cost, best_metrics = evaluate_gains_in(pool, [tuner.best_gains])[0]
+    print_metrics('tuned gains', best_cost, best_metrics)
+    print(f'{args.generations * args.candidates} candidates in {time.perf_counter() - start:.1f} s on {args.processes} processes')
+
+    if best_cost >= initial_cost:
+        print('no candidate beat the initial gains, nothing written')
+        return
+    for axis, (kp, ki, kd) in gains_config(tuner.best_gains).items():
+        print(f'    {axis:6s} kp {kp:9.3f}  ki {ki:7.3f}  kd {kd:8.3f}')
+    with open(args.output, 'w') as file:
+        file.write(HEADER)
+        yaml.safe_dump({'pid_gains': gains_config(np.round(tuner.best_gains, 3))}, file, default_flow_style=None, sort_keys=False)
+    print(f'written to {args.output}')
+
+if __name__ == '__main__':
+    main()